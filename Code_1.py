@@ -4,22 +4,35 @@
 
 
 import os
-import win32com.client
+from office_convert import needs_conversion
  
-def convert_ppt_to_pptx(input_folder):
-    ppt_files = [f for f in os.listdir(input_folder) if f.lower().endswith('.ppt')]
+def open_powerpoint():
+    # Imported here so this module (and the CLI) loads without pywin32
+    import win32com.client
     powerpoint = win32com.client.Dispatch("PowerPoint.Application")
     powerpoint.Visible = 1
+    return powerpoint
+ 
+def convert_ppt_file(powerpoint, full_path, pptx_path):
+    presentation = powerpoint.Presentations.Open(full_path, WithWindow=False)
+    presentation.SaveAs(pptx_path, FileFormat=24)  # 24 = pptx format
+    presentation.Close()
+ 
+def convert_ppt_to_pptx(input_folder):
+    ppt_files = [f for f in os.listdir(input_folder) if f.lower().endswith('.ppt')]
+    powerpoint = open_powerpoint()
  
     for ppt_file in ppt_files:
         full_path = os.path.join(input_folder, ppt_file)
         pptx_path = os.path.join(input_folder, ppt_file[:-4] + '.pptx')
+        if not needs_conversion(full_path, pptx_path):
+            print(f"{ppt_file} already converted, skipping.")
+            continue
         print(f"Converting {ppt_file} to {pptx_path}...")
-        presentation = powerpoint.Presentations.Open(full_path, WithWindow=False)
-        presentation.SaveAs(pptx_path, FileFormat=24)  # 24 = pptx format
-        presentation.Close()
+        convert_ppt_file(powerpoint, full_path, pptx_path)
     powerpoint.Quit()
     print("All .ppt files converted to .pptx.")
  
 # Usage: Specify your folder
-convert_ppt_to_pptx(r"C:\Users\INPUT PPTS")
\ No newline at end of file
+if __name__ == "__main__":
+    convert_ppt_to_pptx(r"C:\Users\INPUT PPTS")
\ No newline at end of file
@@ -1,10 +1,22 @@
 # CODE 2
 #EXTRACT REVISION TABLE AND BALLOON DATA
 
+import io
 import os
-import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pptx import Presentation
-from pptx.enum.shapes import MSO_SHAPE_TYPE
+from extract_cache import cache_get, cache_put, content_hash, default_cache_path, evict_cache, file_content_hash, open_cache
+from pptx_xml import iter_slide_trees
+from manifest import write_revision_data
+from shape_index import balloon_match_inputs, build_slide_index, revision_table_rows
+from shape_locator import locate_edit_targets, locator_targets, make_locator
+from metrics import for_file, timed
+
+try:
+    import numpy as np
+except ImportError:  # balloon matching falls back to a pure-Python grid
+    np = None
 
 REV_HEADERS = [
     "RELEASE NUMBER", "REV LTR",
@@ -15,81 +27,222 @@ def is_revision_table(table):
     header = [cell.text.strip().upper() for cell in table.rows[0].cells]
     return header == REV_HEADERS
 
-def find_balloons_and_texts_recursive(shapes):
-    balloon_shapes = []
-    text_shapes = []
-    for sh in shapes:
-        if sh.shape_type == MSO_SHAPE_TYPE.AUTO_SHAPE:
-            try:
-                if sh.auto_shape_type in [9, 40, 56, 57]:
-                    balloon_shapes.append(sh)
-            except Exception:
-                pass
-        if sh.has_text_frame and sh.text.strip():
-            text_shapes.append(sh)
-        if sh.shape_type == MSO_SHAPE_TYPE.GROUP:
-            bs, ts = find_balloons_and_texts_recursive(sh.shapes)
-            balloon_shapes.extend(bs)
-            text_shapes.extend(ts)
-    return balloon_shapes, text_shapes
-
 def get_balloon_letters_flexible(slide):
-    balloon_shapes, text_shapes = find_balloons_and_texts_recursive(slide.shapes)
+    return get_balloon_letters_from_index(build_slide_index(slide.shapes._spTree, slide.shapes))
+
+def get_balloon_letters_from_index(index):
+    # Balloons and letters inside groups are compared in slide space
+    with timed("match"):
+        balloons, centers, letters = balloon_match_inputs(index)
+        return match_balloons(balloons, centers, letters)
+
+def match_balloons(balloons, centers, letters):
+    if not balloons:
+        return []
+    if not letters:
+        return [""] * len(balloons)
+    if np is not None:
+        return match_balloons_vectorized(balloons, centers, letters)
+    return match_balloons_grid(balloons, centers, letters)
+
+def match_balloons_vectorized(balloons, centers, letters, chunk_size=1024):
+    # Nearest letter strictly inside each balloon's radius; argmin returns the
+    # first index on ties, same as the original strict "<" scan
+    b = np.asarray(balloons, dtype=float)
+    t = np.asarray(centers, dtype=float)
     balloon_letters = []
-    for balloon in balloon_shapes:
-        bx, by, bw, bh = balloon.left, balloon.top, balloon.width, balloon.height
-        b_center = (bx + bw / 2, by + bh / 2)
+    for start in range(0, len(b), chunk_size):
+        block = b[start:start + chunk_size]
+        dx = block[:, 0:1] - t[:, 0]
+        dy = block[:, 1:2] - t[:, 1]
+        dist = np.sqrt(dx * dx + dy * dy)
+        dist[dist >= block[:, 2:3]] = np.inf
+        nearest = dist.argmin(axis=1)
+        found = np.isfinite(dist[np.arange(len(block)), nearest])
+        balloon_letters.extend(letters[j] if ok else "" for j, ok in zip(nearest, found))
+    return balloon_letters
+
+def match_balloons_grid(balloons, centers, letters):
+    # Pure-Python fallback: bucket letters into a grid whose cell is the
+    # largest balloon radius, so only the 3x3 neighbouring cells can match
+    cell = max(r for _, _, r in balloons)
+    if cell <= 0:
+        return [""] * len(balloons)
+    grid = {}
+    for j, (tx, ty) in enumerate(centers):
+        grid.setdefault((int(tx // cell), int(ty // cell)), []).append(j)
+    balloon_letters = []
+    for bx, by, r in balloons:
+        gx, gy = int(bx // cell), int(by // cell)
+        candidates = []
+        for ix in (gx - 1, gx, gx + 1):
+            for iy in (gy - 1, gy, gy + 1):
+                candidates.extend(grid.get((ix, iy), ()))
         nearest_letter, nearest_dist = "", float("inf")
-        for txt in text_shapes:
-            tx, ty, tw, th = txt.left, txt.top, txt.width, txt.height
-            t_center = (tx + tw / 2, ty + th / 2)
-            dist = ((b_center[0] - t_center[0]) ** 2 + (b_center[1] - t_center[1]) ** 2) ** 0.5
-            text = txt.text.strip()
-            # Accept single character (letter or number)
-            if len(text) == 1 and dist < min(bw, bh):
-                if dist < nearest_dist:
-                    nearest_letter = text
-                    nearest_dist = dist
+        # Visit in slide order so ties resolve exactly as before
+        for j in sorted(candidates):
+            tx, ty = centers[j]
+            dist = ((bx - tx) ** 2 + (by - ty) ** 2) ** 0.5
+            if dist < r and dist < nearest_dist:
+                nearest_letter = letters[j]
+                nearest_dist = dist
         balloon_letters.append(nearest_letter)
     return balloon_letters
 
-def extract_revision_data_multisheet(input_folder, excel_path):
-    # Dictionary to hold DataFrames per drawing
+def extract_drawing(ppt_source, engine="pptx"):
+    # Revision rows plus balloon letter for one drawing, as plain lists, and
+    # the Step 2 targets (revision table and balloon text shape ids).
+    # engine="xml" reads the slide parts directly instead of through python-pptx.
+    if engine == "xml":
+        with timed("load"):
+            sp_trees = list(iter_slide_trees(ppt_source))
+        with timed("index"):
+            slide_indexes = [build_slide_index(sp_tree) for sp_tree in sp_trees]
+    else:
+        if isinstance(ppt_source, (bytes, bytearray)):
+            ppt_source = io.BytesIO(ppt_source)
+        with timed("load"):
+            prs = Presentation(ppt_source)
+        with timed("index"):
+            slide_indexes = [build_slide_index(slide.shapes._spTree, slide.shapes) for slide in prs.slides]
+    sheet_rows = drawing_rows(slide_indexes)
+    with timed("locate"):
+        targets = locate_edit_targets(slide_indexes)
+    return sheet_rows, targets
+
+def drawing_rows(slide_indexes):
+    revision_rows = []
+    balloon_letters = []
+    for index in slide_indexes:
+        slide_letters = None
+        for rows in revision_table_rows(index, REV_HEADERS):
+            revision_rows.extend(rows)
+            if slide_letters is None:
+                slide_letters = get_balloon_letters_from_index(index)
+            balloon_letters = list(slide_letters)
+            while len(balloon_letters) < len(revision_rows):
+                balloon_letters.append("")
+            balloon_letters = balloon_letters[:len(revision_rows)]
+    sheet_rows = []
+    for row, balloon in zip(revision_rows, balloon_letters):
+        sheet_rows.append(row + [balloon])
+    return sheet_rows
+
+def extract_drawing_rows(ppt_source, engine="pptx"):
+    return extract_drawing(ppt_source, engine)[0]
+
+def extract_drawing_rows_safe(ppt_source, engine="pptx"):
+    # Worker entry point: never raises, so one bad file can't abort a batch
+    try:
+        return extract_drawing_rows(ppt_source, engine), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+def extract_drawing_safe(ppt_source, engine="pptx", digest=None):
+    # Like extract_drawing_rows_safe, plus the Step 2 locator for the file
+    # (bytes or path) so the hash is taken in the worker as well, unless the
+    # caller already has it
+    try:
+        sheet_rows, targets = extract_drawing(ppt_source, engine)
+        return sheet_rows, make_locator(targets, digest or content_hash(ppt_source)), None
+    except Exception as e:
+        return None, None, f"{type(e).__name__}: {e}"
+
+def list_pptx_files(input_folder):
+    return [f for f in sorted(os.listdir(input_folder)) if f.lower().endswith(".pptx")]
+
+def extract_revision_data_multisheet(input_folder, excel_path, engine="pptx", use_cache=False, cache_path=None):
+    # use_cache keeps results in a SQLite file keyed by each PPTX's content
+    # hash, so only new or changed drawings are parsed again
+    conn = open_cache(cache_path or default_cache_path(input_folder)) if use_cache else None
+    # Dictionary to hold rows per drawing
     per_drawing = {}
-    for ppt_file in sorted(os.listdir(input_folder)):
-        if ppt_file.lower().endswith(".pptx"):
-            ppt_path = os.path.join(input_folder, ppt_file)
-            prs = Presentation(ppt_path)
-            drawing_name = os.path.splitext(ppt_file)[0]
-            revision_rows = []
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if shape.has_table and is_revision_table(shape.table):
-                        table = shape.table
-                        for i in range(1, len(table.rows)):
-                            row_data = [cell.text.strip() for cell in table.rows[i].cells]
-                            revision_rows.append(row_data)
-                        balloon_letters = get_balloon_letters_flexible(slide)
-                        while len(balloon_letters) < len(revision_rows):
-                            balloon_letters.append("")
-                        balloon_letters = balloon_letters[:len(revision_rows)]
-            sheet_rows = []
-            for row, balloon in zip(revision_rows, balloon_letters):
-                sheet_rows.append(row + [balloon])
-            # Only create sheet if there is actual data
-            if sheet_rows:
-                columns = REV_HEADERS + ["Balloon Text"]
-                per_drawing[drawing_name] = pd.DataFrame(sheet_rows, columns=columns)
+    # Where Step 2 finds the table and balloons in each drawing
+    locators = {}
+    reused = 0
+    for ppt_file in list_pptx_files(input_folder):
+        ppt_path = os.path.join(input_folder, ppt_file)
+        drawing_name = os.path.splitext(ppt_file)[0]
+        with for_file(ppt_file, "extract"):
+            cached = None
+            with timed("hash"):
+                digest = file_content_hash(conn, ppt_path) if conn else content_hash(ppt_path)
+            if conn:
+                with timed("cache"):
+                    cached = cache_get(conn, digest, engine)
+            if cached is None:
+                sheet_rows, targets = extract_drawing(ppt_path, engine)
+                if conn:
+                    with timed("cache"):
+                        cache_put(conn, digest, engine, sheet_rows, targets)
+            else:
+                sheet_rows, targets = cached
+                reused += 1
+        # Only create sheet if there is actual data
+        if sheet_rows:
+            per_drawing[drawing_name] = sheet_rows
+            locators[drawing_name] = make_locator(targets, digest)
+    if conn:
+        evict_cache(conn)
+        conn.close()
+        print(f"Reused cached results for {reused} drawings.")
     # Write all sheets to one Excel file
-    with pd.ExcelWriter(excel_path) as writer:
-        for name, df in per_drawing.items():
-            # Sheet name max 31 chars
-            sheet_name = str(name)[:31]
-            df.to_excel(writer, index=False, sheet_name=sheet_name)
-    print(f"Extraction complete. Sheets created per PPT in: {excel_path}")
+    with for_file(None, "extract"), timed("excel_write"):
+        write_revision_data(per_drawing, excel_path, locators=locators)
+    print(f"Extraction complete. Revision data written to: {excel_path}")
+
+def extract_revision_data_multisheet_parallel(input_folder, excel_path, workers=None, engine="pptx", use_cache=False, cache_path=None):
+    # Same workbook as extract_revision_data_multisheet, but files are spread
+    # over a process pool. pool.map keeps input order, so sheet order is stable.
+    # With use_cache only cache misses are sent to the pool.
+    ppt_files = list_pptx_files(input_folder)
+    conn = open_cache(cache_path or default_cache_path(input_folder)) if use_cache else None
+    rows_by_file = {}
+    locators_by_file = {}
+    digests = {}
+    if conn:
+        for ppt_file in ppt_files:
+            digests[ppt_file] = file_content_hash(conn, os.path.join(input_folder, ppt_file))
+            cached = cache_get(conn, digests[ppt_file], engine)
+            if cached is not None:
+                rows_by_file[ppt_file] = cached[0]
+                locators_by_file[ppt_file] = make_locator(cached[1], digests[ppt_file])
+    pending = [f for f in ppt_files if f not in rows_by_file]
+    ppt_paths = [os.path.join(input_folder, f) for f in pending]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(ppt_paths) // (workers * 4))
+    failures = {}
+    # Phases inside the worker processes aren't recorded, only the pool as a whole
+    with for_file(None, "extract"), timed("workers"), ProcessPoolExecutor(max_workers=workers) as pool:
+        worker = partial(extract_drawing_safe, engine=engine)
+        results = pool.map(worker, ppt_paths, chunksize=chunksize)
+        for ppt_file, (sheet_rows, locator, error) in zip(pending, results):
+            if error:
+                failures[ppt_file] = error
+                print(f"Error extracting {ppt_file}: {error}")
+                continue
+            rows_by_file[ppt_file] = sheet_rows
+            locators_by_file[ppt_file] = locator
+            if conn:
+                cache_put(conn, digests[ppt_file], engine, sheet_rows, locator_targets(locator, digests[ppt_file]))
+    if conn:
+        evict_cache(conn)
+        conn.close()
+        print(f"Reused cached results for {len(ppt_files) - len(pending)} drawings.")
+    per_drawing = {}
+    locators = {}
+    for ppt_file in ppt_files:
+        if rows_by_file.get(ppt_file):
+            per_drawing[os.path.splitext(ppt_file)[0]] = rows_by_file[ppt_file]
+            locators[os.path.splitext(ppt_file)[0]] = locators_by_file[ppt_file]
+    with for_file(None, "extract"), timed("excel_write"):
+        write_revision_data(per_drawing, excel_path, locators=locators)
+    print(f"Extraction complete ({workers} workers, {len(failures)} failed). Revision data written to: {excel_path}")
+    return failures
 
 # Usage
-extract_revision_data_multisheet(
-    r"C:\Users\INPUT PPTS",
-    r"C:\Users\Extracted_excel.xlsx"
-)
\ No newline at end of file
+if __name__ == "__main__":
+    extract_revision_data_multisheet(
+        r"C:\Users\INPUT PPTS",
+        r"C:\Users\Extracted_excel.xlsx"
+    )
@@ -4,92 +4,280 @@
 
 
 import os
-import pandas as pd
+import shutil
+import zipfile
 from pptx import Presentation
+from pptx.opc.oxml import serialize_part_xml
+from pptx.oxml import parse_xml
+from pptx.shapes.shapetree import SlideShapes
+from pptx.text.text import _Paragraph
 from pptx.util import Pt
 from copy import deepcopy
+from pptx_xml import NS, P, rewrite_package, slide_part_names
+from manifest import read_revision_data
+from workbook_io import revision_edits
+from extract_cache import content_hash
+from shape_index import build_slide_index
+from metrics import for_file, timed
+from shape_locator import locator_slides, locator_targets, slide_edit_targets
 
 TABLE_FONT = "Arial Narrow"
 TABLE_SIZE = Pt(7)
 BALLOON_FONT = "Arial"
 BALLOON_SIZE = Pt(11)
-REVISION_HEADERS = [
-    "RELEASE NUMBER", "REV LTR", "REVISION DESCRIPTION", "BY", "DATE", "APPD"
-]
 
-def is_revision_table(headers):
-    normalized = [h.upper().replace(" ", "") for h in headers]
-    required = [h.upper().replace(" ", "") for h in REVISION_HEADERS]
-    return all(h in normalized for h in required)
+def rewrite_revision_rows(table, revision_data):
+    # Replace every row under the header in one pass. Each column gets a
+    # template cell built once from the header cell (text cleared, one
+    # TABLE_FONT/TABLE_SIZE paragraph); rows are clones of a template row and
+    # only the text is filled in, so no python-pptx proxies are built per row.
+    # The XML matches what cell.text + paragraph font settings produce.
+    tbl = table._tbl
+    header_tr = tbl.tr_lst[0]
+    for tr in tbl.tr_lst[1:]:
+        tbl.remove(tr)
+    header_tcs = header_tr.tc_lst
+    row_template = deepcopy(header_tr)
+    for tc in row_template.tc_lst:
+        tx_body = tc.get_or_add_txBody()
+        tx_body.clear_content()
+        para = _Paragraph(tx_body.add_p(), None)
+        para.font.name = TABLE_FONT
+        para.font.size = TABLE_SIZE
+    new_rows = []
+    for rev in revision_data:
+        tr = deepcopy(row_template)
+        for i, tc in enumerate(tr.tc_lst):
+            if i < len(rev):
+                fill_cell_text(tc, rev[i])
+            else:
+                # Columns without a value keep the header cell, as before
+                tr.replace(tc, deepcopy(header_tcs[i]))
+        new_rows.append(tr)
+    tbl.extend(new_rows)
 
-def clear_table_rows(table):
-    while len(table.rows) > 1:
-        table._tbl.remove(table.rows[1]._tr)
+def fill_cell_text(tc, val):
+    # Same split as TextFrame.text: "\n" starts a new paragraph and only the
+    # first paragraph carries the table font
+    text = str(val) if val is not None else ""
+    tx_body = tc.txBody
+    p_texts = text.split("\n")
+    tx_body.p_lst[0].append_text(p_texts[0])
+    for p_text in p_texts[1:]:
+        tx_body.add_p().append_text(p_text)
 
-def add_revision_rows(table, revision_data):
-    for rev in revision_data:
-        header_xml = table.rows[0]._tr
-        new_xml = deepcopy(header_xml)
-        table._tbl.append(new_xml)
-        new_row = table.rows[len(table.rows) - 1]
+def scan_edit_targets(slides_shapes):
+    # The first revision table and all single-letter balloon texts, as
+    # (slide index, shape) pairs, found through each slide's shape index so
+    # only the matching shapes get python-pptx proxies
+    table = None
+    balloons = []
+    for slide, shapes in enumerate(slides_shapes):
+        index = build_slide_index(shapes._spTree)
+        table_pos, balloon_pos = slide_edit_targets(index)
+        if table is None and table_pos is not None:
+            table = (slide, shapes._shape_factory(index["elms"][table_pos]))
+        balloons.extend((slide, shapes._shape_factory(index["elms"][i])) for i in balloon_pos)
+    return table, balloons
+
+def resolve_edit_targets(slides_shapes, targets):
+    # The shapes a locator points at, or None if any of them is missing.
+    # Slides the locator doesn't mention may be None (not parsed).
+    by_id = {}
+    for slide in locator_slides(targets):
+        if not 0 <= slide < len(slides_shapes) or slides_shapes[slide] is None:
+            return None
+        ids = {}
+        for elm in slides_shapes[slide]._spTree.iter_shape_elms():
+            if elm.shape_id in ids:
+                # Duplicate ids make the locator ambiguous
+                return None
+            ids[elm.shape_id] = elm
+        by_id[slide] = ids
+    table = None
+    if targets["table"]:
+        slide, shape_id = targets["table"]
+        elm = by_id[slide].get(shape_id)
+        if elm is None or elm.find("a:graphic/a:graphicData/a:tbl", NS) is None:
+            return None
+        table = (slide, slides_shapes[slide]._shape_factory(elm))
+    balloons = []
+    for slide, shape_id in targets["balloons"]:
+        elm = by_id[slide].get(shape_id)
+        if elm is None or elm.tag != P + "sp":
+            return None
+        balloons.append((slide, slides_shapes[slide]._shape_factory(elm)))
+    return table, balloons
+
+def find_edit_targets(slides_shapes, targets=None):
+    # targets come from a locator whose hash matched the file; fall back to
+    # a full scan when there are none or they no longer resolve
+    with timed("locate"):
+        found = resolve_edit_targets(slides_shapes, targets) if targets else None
+        return found or scan_edit_targets(slides_shapes)
+
+def apply_table_and_balloon_edits(slides_shapes, revision_data, balloon_letter, targets=None):
+    # slides_shapes holds one shape collection per slide. Returns the indices
+    # of slides whose XML was changed.
+    return apply_edits_to_targets(find_edit_targets(slides_shapes, targets), revision_data, balloon_letter)
+
+def apply_edits_to_targets(found, revision_data, balloon_letter):
+    return edit_revision_table(found, revision_data) | edit_balloons(found, balloon_letter)
+
+def edit_revision_table(found, revision_data):
+    table, _ = found
+    if not table:
+        return set()
+    index, shape = table
+    with timed("table_rebuild"):
+        rewrite_revision_rows(shape.table, revision_data)
+    return {index}
+
+def edit_balloons(found, balloon_letter):
+    _, balloons = found
+    modified = set()
+    if balloon_letter:
+        with timed("balloon_edit"):
+            for index, shape in balloons:
+                shape.text = str(balloon_letter)
+                para = shape.text_frame.paragraphs[0]
+                para.font.name = BALLOON_FONT
+                para.font.size = BALLOON_SIZE
+                modified.add(index)
+    return modified
+
+def table_matches(table, revision_data):
+    if len(table.rows) - 1 != len(revision_data):
+        return False
+    for r, rev in enumerate(revision_data, start=1):
+        cells = table.rows[r].cells
         for i, val in enumerate(rev):
-            if i < len(new_row.cells):
-                cell = new_row.cells[i]
-                cell.text = str(val) if val is not None else ""
-                para = cell.text_frame.paragraphs[0]
-                para.font.name = TABLE_FONT
-                para.font.size = TABLE_SIZE
-
-def update_table_and_balloon_for_all(multisheet_excel, ppt_folder, output_folder):
-    xl = pd.ExcelFile(multisheet_excel)
+            if i < len(cells) and cells[i].text != (str(val) if val is not None else ""):
+                return False
+    return True
+
+def edits_are_noop(slides_shapes, revision_data, balloon_letter, targets=None):
+    # True when apply_table_and_balloon_edits would leave every table cell
+    # and balloon text as it already is
+    return targets_are_current(find_edit_targets(slides_shapes, targets), revision_data, balloon_letter)
+
+def targets_are_current(found, revision_data, balloon_letter):
+    table, balloons = found
+    if table and not table_matches(table[1].table, revision_data):
+        return False
+    if balloon_letter:
+        for _, shape in balloons:
+            if shape.text != str(balloon_letter):
+                return False
+    return True
+
+def load_slide_shapes(zin, slide_names, indices=None):
+    # Parsed slide elements and their shape collections, without loading the
+    # rest of the package. With indices, other slides are left as None.
+    with timed("load"):
+        slide_elms = [
+            parse_xml(zin.read(name)) if indices is None or i in indices else None
+            for i, name in enumerate(slide_names)
+        ]
+    slides_shapes = [SlideShapes(elm.cSld.spTree, None) if elm is not None else None for elm in slide_elms]
+    return slide_elms, slides_shapes
+
+def load_edit_targets(zin, targets=None):
+    # With a locator only the slides it points at are parsed; everything is
+    # parsed and scanned when there is none or it doesn't resolve
+    slide_names = slide_part_names(zin)
+    if targets:
+        slide_elms, slides_shapes = load_slide_shapes(zin, slide_names, locator_slides(targets))
+        with timed("locate"):
+            found = resolve_edit_targets(slides_shapes, targets)
+        if found:
+            return slide_names, slide_elms, found
+    slide_elms, slides_shapes = load_slide_shapes(zin, slide_names)
+    with timed("locate"):
+        return slide_names, slide_elms, scan_edit_targets(slides_shapes)
+
+def drawing_is_current(pptx_source, revision_data, balloon_letter, targets=None):
+    with timed("noop_check"), zipfile.ZipFile(pptx_source) as zin:
+        _, _, found = load_edit_targets(zin, targets)
+        return targets_are_current(found, revision_data, balloon_letter)
+
+def update_pptx_full(pptx_path, output_path, revision_data, balloon_letter, targets=None):
+    with timed("load"):
+        prs = Presentation(pptx_path)
+    apply_table_and_balloon_edits([slide.shapes for slide in prs.slides], revision_data, balloon_letter, targets)
+    with timed("save"):
+        prs.save(output_path)
+
+def update_pptx_surgical(pptx_path, output_path, revision_data, balloon_letter, targets=None):
+    # Parse only the slide parts, edit them through the same python-pptx shape
+    # proxies, and rewrite just the changed slides. Media and every other part
+    # are copied compressed, so a big drawing is never fully inflated.
+    with zipfile.ZipFile(pptx_path) as zin:
+        slide_names, slide_elms, found = load_edit_targets(zin, targets)
+        modified = apply_edits_to_targets(found, revision_data, balloon_letter)
+        with timed("save"):
+            replacements = {slide_names[i]: serialize_part_xml(slide_elms[i]) for i in modified}
+            rewrite_package(zin, output_path, replacements)
+
+def update_drawing(pptx_path, output_path, sheet_rows, locator=None, surgical=False, unchanged="rewrite"):
+    # One drawing of update_table_and_balloon_for_all: its sheet rows and
+    # Step 1 locator (if any) in, "changed" or "unchanged" out
+    revision_data, balloon_letter = revision_edits(sheet_rows)
+    targets = None
+    if locator is not None:
+        with timed("hash"):
+            targets = locator_targets(locator, content_hash(pptx_path))
+    if unchanged != "rewrite" and drawing_is_current(pptx_path, revision_data, balloon_letter, targets):
+        if unchanged == "copy":
+            shutil.copyfile(pptx_path, output_path)
+        return "unchanged"
+    update_pptx = update_pptx_surgical if surgical else update_pptx_full
+    update_pptx(pptx_path, output_path, revision_data, balloon_letter, targets)
+    return "changed"
+
+def update_table_and_balloon_for_all(multisheet_excel, ppt_folder, output_folder, surgical=False, unchanged="rewrite"):
+    # surgical=True rewrites only the edited slide XML inside the zip instead
+    # of re-serializing the whole package with prs.save().
+    # unchanged decides what happens to drawings that already match their
+    # rows: "rewrite" (always edit and save), "copy" (pass the file through
+    # untouched) or "omit" (leave it out of the output folder).
+    # Workbook or .csv/.parquet manifest, both give {drawing: rows}. Step 1
+    # locators let drawings that haven't changed since skip the shape scan.
+    locators = {}
+    with for_file(None, "update"), timed("excel_read"):
+        per_drawing = read_revision_data(multisheet_excel, locators=locators)
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
+    counts = {"changed": 0, "unchanged": 0, "failed": 0, "skipped": 0}
     for ppt_file in sorted(os.listdir(ppt_folder)):
         if ppt_file.lower().endswith(".pptx"):
             ppt_name = os.path.splitext(ppt_file)[0]
             try:
-                if ppt_name not in xl.sheet_names:
+                if ppt_name not in per_drawing:
                     print(f"Sheet for {ppt_file} not found, skipping.")
+                    counts["skipped"] += 1
                     continue
-                df = xl.parse(ppt_name)
-                df = df.dropna(how='all')
-                if df.empty:
+                if not per_drawing[ppt_name]:
                     print(f"Sheet {ppt_name} is empty, skipping.")
+                    counts["skipped"] += 1
                     continue
-                revision_data = df[REVISION_HEADERS].values.tolist()
-                balloon_values = df["Balloon Text"].dropna()
-                # Always cast to string
-                balloon_letter = str(balloon_values.iloc[-1]) if not balloon_values.empty else ""
-                pptx_path = os.path.join(ppt_folder, ppt_file)
-                output_path = os.path.join(output_folder, ppt_file)
-                prs = Presentation(pptx_path)
-                revision_done = False
-                for slide in prs.slides:
-                    for shape in slide.shapes:
-                        if shape.has_table:
-                            headers = [cell.text.strip().upper() for cell in shape.table.rows[0].cells]
-                            if is_revision_table(headers) and not revision_done:
-                                clear_table_rows(shape.table)
-                                add_revision_rows(shape.table, revision_data)
-                                revision_done = True
-                for slide in prs.slides:
-                    for shape in slide.shapes:
-                        if shape.has_text_frame and shape.text.strip():
-                            txt = shape.text.strip()
-                            if (len(txt) == 1 and txt.isalpha()) or (len(txt) == 2 and txt[0].isalpha() and txt[1] == '.'):
-                                if balloon_letter:
-                                    shape.text = str(balloon_letter)
-                                    para = shape.text_frame.paragraphs[0]
-                                    para.font.name = BALLOON_FONT
-                                    para.font.size = BALLOON_SIZE
-                prs.save(output_path)
-                print(f"Updated: {ppt_file}")
+                with for_file(ppt_file, "update"):
+                    result = update_drawing(
+                        os.path.join(ppt_folder, ppt_file), os.path.join(output_folder, ppt_file),
+                        per_drawing[ppt_name], locators.get(ppt_name), surgical, unchanged
+                    )
+                print(f"{'Updated' if result == 'changed' else 'Unchanged'}: {ppt_file}")
+                counts[result] += 1
             except Exception as e:
                 print(f"Error updating {ppt_file}: {e}")
+                counts["failed"] += 1
+    print(f"{counts['changed']} changed, {counts['unchanged']} unchanged, {counts['failed']} failed, {counts['skipped']} skipped.")
+    return counts
 
 # Usage:
-update_table_and_balloon_for_all(
-    r"C:\Users\Extracted_excel.xlsx",
-    r"C:\Users\INPUT PPTS",
-    r"C:\Users\OUTPUT PPTS"
-)
+if __name__ == "__main__":
+    update_table_and_balloon_for_all(
+        r"C:\Users\Extracted_excel.xlsx",
+        r"C:\Users\INPUT PPTS",
+        r"C:\Users\OUTPUT PPTS"
+    )
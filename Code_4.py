@@ -2,6 +2,64 @@
 
 from pptx import Presentation
 import os
+from metrics import for_file, timed
+from shape_index import build_slide_index
+
+def add_bullet_point_to_shapes(shapes, new_text_line):
+    # shapes is one slide's shape collection. Only text shapes the shape
+    # index counts two or more non-empty paragraphs in are opened through
+    # python-pptx. Returns True if any shape got the new line.
+    with timed("index"):
+        index = build_slide_index(shapes._spTree)
+    modified = False
+    for i in range(len(index["id"])):
+        if not index["top"][i] or index["kind"][i] != "sp" or index["paragraphs"][i] < 2:
+            # Skip if not a bullet list
+            continue
+        text_frame = shapes._shape_factory(index["elms"][i]).text_frame
+        paragraphs = [p for p in text_frame.paragraphs if p.text.strip() != ""]
+        last_paragraph = paragraphs[-1]
+
+        # Determine font style from existing text
+        font_name = None
+        font_size = None
+        if last_paragraph.runs:
+            font_name = last_paragraph.runs[0].font.name
+            font_size = last_paragraph.runs[0].font.size
+
+        # Add empty paragraph to create a blank line gap
+        blank_para = text_frame.add_paragraph()
+        blank_para.text = " "
+
+        # Add new paragraph maintaining formatting
+        new_para = text_frame.add_paragraph()
+        new_para.text = f"{len(paragraphs) + 1}. {new_text_line}"
+        new_para.level = last_paragraph.level
+
+        # Apply previous formatting
+        if new_para.runs:
+            run = new_para.runs[0]
+            run.font.name = font_name if font_name else "Arial"
+            run.font.size = font_size
+
+        modified = True
+    return modified
+
+def add_bullet_point_to_file(file_path, output_path, new_text_line):
+    # Saves to output_path only if a bullet list was found; returns True then
+    with timed("load"):
+        prs = Presentation(file_path)
+    modified = False
+
+    with timed("bullet"):
+        for slide in prs.slides:
+            if add_bullet_point_to_shapes(slide.shapes, new_text_line):
+                modified = True
+
+    if modified:
+        with timed("save"):
+            prs.save(output_path)
+    return modified
 
 def add_bullet_point_to_pptx(input_folder, output_folder, new_text_line):
     if not os.path.exists(output_folder):
@@ -10,60 +68,22 @@ def add_bullet_point_to_pptx(input_folder, output_folder, new_text_line):
     for filename in os.listdir(input_folder):
         if not filename.endswith(".pptx"):
             continue
-       
-        file_path = os.path.join(input_folder, filename)
-        prs = Presentation(file_path)
-        modified = False
 
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if not shape.has_text_frame:
-                    continue
-               
-                text_frame = shape.text_frame
-                paragraphs = [p for p in text_frame.paragraphs if p.text.strip() != ""]
-               
-                if len(paragraphs) < 2:
-                    # Skip if not a bullet list
-                    continue
-               
-                last_paragraph = paragraphs[-1]
-
-                # Determine font style from existing text
-                font_name = None
-                font_size = None
-                if last_paragraph.runs:
-                    font_name = last_paragraph.runs[0].font.name
-                    font_size = last_paragraph.runs[0].font.size
-
-                # Add empty paragraph to create a blank line gap
-                blank_para = text_frame.add_paragraph()
-                blank_para.text = " "
-
-                # Add new paragraph maintaining formatting
-                new_para = text_frame.add_paragraph()
-                new_para.text = f"{len(paragraphs) + 1}. {new_text_line}"
-                new_para.level = last_paragraph.level
-
-                # Apply previous formatting
-                if new_para.runs:
-                    run = new_para.runs[0]
-                    run.font.name = font_name if font_name else "Arial"
-                    run.font.size = font_size
-
-                modified = True
+        file_path = os.path.join(input_folder, filename)
+        output_path = os.path.join(output_folder, f"updated_{filename}")
 
         # Save updates if any change was made
+        with for_file(filename, "bullet"):
+            modified = add_bullet_point_to_file(file_path, output_path, new_text_line)
         if modified:
-            output_path = os.path.join(output_folder, f"updated_{filename}")
-            prs.save(output_path)
             print(f"✅ Updated file saved: {output_path}")
         else:
             print(f"⚠️ No bullet text found in: {filename}")
 
 # Replace with your folders and text before running
-input_folder = r"C:\Users\OUTPUT PPTS"
-output_folder = r"C:\Users\Final"
-new_text = "    SERVICE PART PER SPEC 49-00362-000 - NON-SERVICEABLE ASSEMBLY."
+if __name__ == "__main__":
+    input_folder = r"C:\Users\OUTPUT PPTS"
+    output_folder = r"C:\Users\Final"
+    new_text = "    SERVICE PART PER SPEC 49-00362-000 - NON-SERVICEABLE ASSEMBLY."
 
-add_bullet_point_to_pptx(input_folder, output_folder, new_text)
+    add_bullet_point_to_pptx(input_folder, output_folder, new_text)
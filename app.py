@@ -1,217 +1,529 @@
 import streamlit as st
 import os
-import pandas as pd
 from pptx import Presentation
-from pptx.enum.shapes import MSO_SHAPE_TYPE
-from pptx.util import Pt
-from copy import deepcopy
+import io
 import tempfile
+import time
 import zipfile
 import platform
-import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from Code_2 import extract_drawing_safe
+from Code_3 import apply_table_and_balloon_edits, drawing_is_current
+from Code_4 import add_bullet_point_to_shapes
+from edit_script import apply_edit_ops, drawing_ops, edit_script_from_revision_data
+from extract_cache import content_hash
+from job_queue import FINISHED, cancel_job, get_job, log_job, mark_downloaded, purge_jobs, remove_job, submit_job, track_progress
+from manifest import data_format, read_revision_data, write_revision_data
+from memo_cache import cache_clear, cache_lookup, cache_stats, cache_store, new_cache
+from memory_budget import MB, budgeted, new_budget, new_run, open_each, release, reservation, reserve, run_report
+from revision_index import SEARCH_LIMIT, index_results, index_stats, open_index, search_revisions
+from metrics import for_file, prometheus_text, start_recording, stop_recording, summarize_phases, timed, write_jsonl
+from shape_locator import locator_targets
+from workbook_io import revision_edits
+
+# Results shared by every session of this server process, keyed by content
+# hash, so identical uploads are not extracted or parsed twice. Least
+# recently used entries are evicted beyond these sizes.
+# DRAWING_RESULTS: Step 1 (rows, locator, error) per drawing.
+# WORKBOOKS: Step 1 output files and parsed Step 2 workbooks.
+DRAWING_RESULTS = new_cache(64 * 1024 * 1024)
+WORKBOOKS = new_cache(128 * 1024 * 1024)
+# Drawings being processed by any job on this server are admitted under one
+# memory ceiling (set from the sidebar), so several large local-folder runs
+# wait for each other instead of exhausting the machine.
+DEFAULT_MEMORY_MB = 1024
+MEMORY = new_budget(DEFAULT_MEMORY_MB * MB)
+# Step 1 can add its rows to this revision index, which the search page
+# reads without opening any drawing
+REVISION_INDEX_PATH = os.environ.get("REVISION_INDEX", "revision_index.sqlite")
 
 # --- Helper functions ---
-REV_HEADERS = ["RELEASE NUMBER", "REV LTR", "REVISION DESCRIPTION", "BY", "DATE", "APPD"]
+def upload_name(uploaded_file):
+    # Uploads carry a bare file name, local-folder files are paths (or
+    # handles opened from one)
+    if isinstance(uploaded_file, str):
+        return os.path.basename(uploaded_file)
+    return os.path.basename(uploaded_file.name)
+
+def read_upload(uploaded_file):
+    if isinstance(uploaded_file, str):
+        with open(uploaded_file, "rb") as f:
+            return f.read()
+    uploaded_file.seek(0)
+    return uploaded_file.read()
+
+def upload_hash(uploaded_file):
+    # Content hash without copying: upload buffers are hashed in place,
+    # local files read from disk in chunks
+    if isinstance(uploaded_file, str):
+        return content_hash(uploaded_file)
+    if hasattr(uploaded_file, "getbuffer"):
+        with uploaded_file.getbuffer() as view:
+            return content_hash(view)
+    return content_hash(uploaded_file.name)
+
+def local_paths(input_folder):
+    # Paths only: each file is opened when its turn comes and closed after
+    return [os.path.join(input_folder, f) for f in os.listdir(input_folder) if f.lower().endswith(".pptx")]
+
+def open_presentation(uploaded_file):
+    # python-pptx reads straight from the upload buffer, no temp file needed
+    uploaded_file.seek(0)
+    return Presentation(uploaded_file)
 
-def is_revision_table(table):
-    header = [cell.text.strip().upper() for cell in table.rows[0].cells]
-    return header == REV_HEADERS
+def cached_extraction(data):
+    # (digest, cached result or None) for one drawing's bytes
+    with timed("hash"):
+        digest = content_hash(data)
+    with timed("cache"):
+        return digest, cache_lookup(DRAWING_RESULTS, digest)
 
-def find_balloons_and_texts_recursive(shapes):
-    balloon_shapes = []
-    text_shapes = []
-    for sh in shapes:
-        if sh.shape_type == MSO_SHAPE_TYPE.AUTO_SHAPE:
+def remember_extraction(digest, result):
+    # Failures are not kept, so a retry really retries
+    if not result[2]:
+        cache_store(DRAWING_RESULTS, digest, result)
+    return result
+
+def extract_upload(uploaded_file):
+    with for_file(upload_name(uploaded_file), "extract"):
+        data = read_upload(uploaded_file)
+        digest, result = cached_extraction(data)
+        if result is None:
+            result = remember_extraction(digest, extract_drawing_safe(data, digest=digest))
+        return result
+
+def iter_extractions(uploaded_files, workers=1, run=None):
+    # (upload, (rows, locator, error)) in upload order. Uploads are read one
+    # at a time as results are taken, so the input may be a progress-tracking
+    # generator; with workers > 1 at most two files per worker are in flight.
+    # With a memory_budget run, files in flight also hold a reservation on
+    # MEMORY and the next one waits while the ceiling is reached.
+    if workers <= 1:
+        for uploaded_file in (uploaded_files if run is None else budgeted(uploaded_files, MEMORY, run)):
+            yield uploaded_file, extract_upload(uploaded_file)
+        return
+    # Cached drawings are answered without going to the pool. Phases inside
+    # the workers are not recorded, only the pool as a whole.
+    def settle(entry):
+        uploaded_file, digest, result, nbytes = entry
+        try:
+            if isinstance(result, tuple):
+                return uploaded_file, result
+            return uploaded_file, remember_extraction(digest, result.result())
+        finally:
+            if run is not None:
+                release(MEMORY, nbytes, run)
+    with for_file(None, "extract"), timed("workers"):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = deque()
             try:
-                if sh.auto_shape_type in [9, 40, 56, 57]:
-                    balloon_shapes.append(sh)
-            except:
-                pass
-        if sh.has_text_frame and sh.text.strip():
-            text_shapes.append(sh)
-        if sh.shape_type == MSO_SHAPE_TYPE.GROUP:
-            bs, ts = find_balloons_and_texts_recursive(sh.shapes)
-            balloon_shapes.extend(bs)
-            text_shapes.extend(ts)
-    return balloon_shapes, text_shapes
-
-def get_balloon_letters_flexible(slide):
-    balloon_shapes, text_shapes = find_balloons_and_texts_recursive(slide.shapes)
-    balloon_letters = []
-    for balloon in balloon_shapes:
-        bx, by, bw, bh = balloon.left, balloon.top, balloon.width, balloon.height
-        b_center = (bx + bw / 2, by + bh / 2)
-        nearest_letter, nearest_dist = "", float("inf")
-        for txt in text_shapes:
-            tx, ty, tw, th = txt.left, txt.top, txt.width, txt.height
-            t_center = (tx + tw / 2, ty + th / 2)
-            dist = ((b_center[0] - t_center[0]) ** 2 + (b_center[1] - t_center[1]) ** 2) ** 0.5
-            text = txt.text.strip()
-            if len(text) == 1 and dist < min(bw, bh):
-                if dist < nearest_dist:
-                    nearest_letter = text
-                    nearest_dist = dist
-        balloon_letters.append(nearest_letter)
-    return balloon_letters
-
-def extract_revision_data_multisheet_from_files(uploaded_files):
+                for uploaded_file in uploaded_files:
+                    nbytes = 0
+                    if run is not None:
+                        nbytes = reservation(uploaded_file)
+                        # Over the ceiling: finish our own oldest files
+                        # before waiting on anyone else's
+                        while in_flight and not reserve(MEMORY, nbytes, run, block=False):
+                            yield settle(in_flight.popleft())
+                        if not in_flight:
+                            reserve(MEMORY, nbytes, run)
+                    data = read_upload(uploaded_file)
+                    digest, result = cached_extraction(data)
+                    if result is None:
+                        result = pool.submit(extract_drawing_safe, data, "pptx", digest)
+                    in_flight.append((uploaded_file, digest, result, nbytes))
+                    if len(in_flight) >= workers * 2:
+                        yield settle(in_flight.popleft())
+                while in_flight:
+                    yield settle(in_flight.popleft())
+            finally:
+                # Stopped early: hand back what the unsettled files reserved
+                if run is not None:
+                    for entry in in_flight:
+                        release(MEMORY, entry[3], run)
+
+def extract_revision_data_multisheet_from_files(uploaded_files, workers=1, fmt="xlsx", warn=None, run=None, index_path=None, folder=None):
+    # warn reports per-file problems (st.warning unless given). With
+    # index_path the rows also go into the revision index; folder (a local
+    # folder run) lets the index drop drawings no longer in it.
+    warn = warn or st.warning
     per_drawing = {}
-    with tempfile.TemporaryDirectory() as temp_dir:
-        for uploaded_file in uploaded_files:
-            ppt_path = os.path.join(temp_dir, uploaded_file.name)
-            with open(ppt_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            prs = Presentation(ppt_path)
-            drawing_name = os.path.splitext(uploaded_file.name)[0]
-            revision_rows = []
-            balloon_letters = []
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if shape.has_table and is_revision_table(shape.table):
-                        table = shape.table
-                        for i in range(1, len(table.rows)):
-                            row_data = [cell.text.strip() for cell in table.rows[i].cells]
-                            revision_rows.append(row_data)
-                        balloon_letters = get_balloon_letters_flexible(slide)
-                        while len(balloon_letters) < len(revision_rows):
-                            balloon_letters.append("")
-                        balloon_letters = balloon_letters[:len(revision_rows)]
-            sheet_rows = []
-            for row, balloon in zip(revision_rows, balloon_letters):
-                sheet_rows.append(row + [balloon])
-            if sheet_rows:
-                columns = REV_HEADERS + ["Balloon Text"]
-                per_drawing[drawing_name] = pd.DataFrame(sheet_rows, columns=columns)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".xlsx") as tmp:
-        with pd.ExcelWriter(tmp.name) as writer:
-            for name, df in per_drawing.items():
-                sheet_name = str(name)[:31]
-                df.to_excel(writer, index=False, sheet_name=sheet_name)
-        tmp.seek(0)
-        with open(tmp.name, "rb") as f:
-            excel_bytes = f.read()
+    # Where Step 2 finds the table and balloons in each drawing
+    locators = {}
+    failed = set()
+    for uploaded_file, (sheet_rows, locator, error) in iter_extractions(uploaded_files, workers, run):
+        if error:
+            warn(f"Could not extract {upload_name(uploaded_file)}: {error}")
+            failed.add(os.path.splitext(upload_name(uploaded_file))[0])
+            continue
+        if sheet_rows:
+            drawing_name = os.path.splitext(upload_name(uploaded_file))[0]
+            per_drawing[drawing_name] = sheet_rows
+            locators[drawing_name] = locator
+    # The output depends only on each drawing's name and content hash
+    key = ("output", fmt, tuple((name, locators[name]["hash"]) for name in per_drawing))
+    excel_bytes = cache_lookup(WORKBOOKS, key)
+    if excel_bytes is None:
+        excel_buffer = io.BytesIO()
+        with for_file(None, "extract"), timed("excel_write"):
+            write_revision_data(per_drawing, excel_buffer, fmt, locators)
+        excel_bytes = excel_buffer.getvalue()
+        cache_store(WORKBOOKS, key, excel_bytes)
+    if index_path:
+        conn = open_index(index_path)
+        try:
+            with for_file(None, "extract"), timed("index_write"):
+                index_results(conn, per_drawing, locators, folder, failed)
+        finally:
+            conn.close()
     return excel_bytes
 
+def read_revision_data_cached(excel_source, fmt, locators):
+    # read_revision_data for bytes or an upload, parsed once per distinct
+    # content. The rows are shared with the cache and must not be modified.
+    if not isinstance(excel_source, (bytes, bytearray, memoryview)):
+        excel_source = read_upload(excel_source)
+    key = ("parsed", fmt, content_hash(excel_source))
+    parsed = cache_lookup(WORKBOOKS, key)
+    if parsed is None:
+        parsed_locators = {}
+        per_drawing = read_revision_data(io.BytesIO(excel_source), fmt, parsed_locators)
+        parsed = per_drawing, parsed_locators
+        cache_store(WORKBOOKS, key, parsed)
+    locators.update(parsed[1])
+    return dict(parsed[0])
+
 # Auto open Excel file (Windows only)
-def open_excel_local(excel_path):
+def open_excel_local(excel_path, warn=None):
     if platform.system() == "Windows":
         try:
             os.startfile(excel_path)
         except Exception as e:
-            st.warning(f"Could not open Excel automatically: {e}")
-
-TABLE_FONT = "Arial Narrow"
-TABLE_SIZE = Pt(7)
-BALLOON_FONT = "Arial"
-BALLOON_SIZE = Pt(11)
-REVISION_HEADERS = ["RELEASE NUMBER", "REV LTR", "REVISION DESCRIPTION", "BY", "DATE", "APPD"]
-
-def is_revision_table_edit(headers):
-    normalized = [h.upper().replace(" ", "") for h in headers]
-    required = [h.upper().replace(" ", "") for h in REVISION_HEADERS]
-    return all(h in normalized for h in required)
-
-def clear_table_rows(table):
-    while len(table.rows) > 1:
-        table._tbl.remove(table.rows[1]._tr)
-
-def add_revision_rows(table, revision_data):
-    for rev in revision_data:
-        header_xml = table.rows[0]._tr
-        new_xml = deepcopy(header_xml)
-        table._tbl.append(new_xml)
-        new_row = table.rows[len(table.rows) - 1]
-        for i, val in enumerate(rev):
-            if i < len(new_row.cells):
-                cell = new_row.cells[i]
-                cell.text = str(val) if val is not None else ""
-                para = cell.text_frame.paragraphs[0]
-                para.font.name = TABLE_FONT
-                para.font.size = TABLE_SIZE
-
-def update_table_and_balloon_for_all(excel_bytes, uploaded_ppt_files):
-    results = {}
-    with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as xl_file, tempfile.TemporaryDirectory() as tmp_dir:
-        xl_file.write(excel_bytes)
-        xl_file.flush()
-        xl = pd.ExcelFile(xl_file.name)
-        for ppt_file in uploaded_ppt_files:
-            ppt_name = os.path.splitext(ppt_file.name)[0]
-            if ppt_name not in xl.sheet_names:
-                continue
-            df = xl.parse(ppt_name).dropna(how='all')
-            if df.empty:
-                continue
-            revision_data = df[REVISION_HEADERS].values.tolist()
-            balloon_values = df["Balloon Text"].dropna()
-            balloon_letter = str(balloon_values.iloc[-1]) if not balloon_values.empty else ""
-            pptx_path = os.path.join(tmp_dir, ppt_file.name)
-            with open(pptx_path, "wb") as f:
-                f.write(ppt_file.getbuffer())
-            prs = Presentation(pptx_path)
-            revision_done = False
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if shape.has_table:
-                        headers = [cell.text.strip().upper() for cell in shape.table.rows[0].cells]
-                        if is_revision_table_edit(headers) and not revision_done:
-                            clear_table_rows(shape.table)
-                            add_revision_rows(shape.table, revision_data)
-                            revision_done = True
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if shape.has_text_frame and shape.text.strip():
-                        txt = shape.text.strip()
-                        if (len(txt) == 1 and txt.isalpha()) or (len(txt) == 2 and txt[0].isalpha() and txt[1] == '.'):
-                            if balloon_letter:
-                                shape.text = str(balloon_letter)
-                                para = shape.text_frame.paragraphs[0]
-                                para.font.name = BALLOON_FONT
-                                para.font.size = BALLOON_SIZE
-            out_file = tempfile.NamedTemporaryFile(delete=False, suffix=".pptx")
-            prs.save(out_file.name)
-            out_file.seek(0)
-            with open(out_file.name, "rb") as f:
-                results[ppt_file.name] = f.read()
-    return results
+            (warn or st.warning)(f"Could not open Excel automatically: {e}")
 
-def add_bullet_point_to_pptx(uploaded_ppt_files, new_text_line):
-    results = {}
+def iter_table_and_balloon_updates(excel_source, uploaded_ppt_files, fmt="xlsx", unchanged="rewrite", stats=None, warn=None):
+    # Yields (file name, edited Presentation) one drawing at a time.
+    # excel_source is the uploaded workbook or manifest (file-like or bytes).
+    # unchanged: "rewrite" every drawing, "copy" drawings that already match
+    # their rows through untouched (yielded as the original bytes), or
+    # "omit" them. stats, if given, collects changed/unchanged/failed counts.
+    warn = warn or st.warning
+    if stats is None:
+        stats = {}
+    for key in ("changed", "unchanged", "failed"):
+        stats.setdefault(key, 0)
+    locators = {}
+    with for_file(None, "update"), timed("excel_read"):
+        per_drawing = read_revision_data_cached(excel_source, fmt, locators)
     for ppt_file in uploaded_ppt_files:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pptx") as tmp:
-            tmp.write(ppt_file.getbuffer())
-            tmp.flush()
-            prs = Presentation(tmp.name)
+        ppt_name = os.path.splitext(upload_name(ppt_file))[0]
+        if not per_drawing.get(ppt_name):
+            continue
+        current = False
+        try:
+            with for_file(upload_name(ppt_file), "update"):
+                revision_data, balloon_letter = revision_edits(per_drawing[ppt_name])
+                targets = None
+                if ppt_name in locators:
+                    with timed("hash"):
+                        targets = locator_targets(locators[ppt_name], upload_hash(ppt_file))
+                if unchanged != "rewrite":
+                    ppt_file.seek(0)
+                    current = drawing_is_current(ppt_file, revision_data, balloon_letter, targets)
+                if not current:
+                    with timed("load"):
+                        prs = open_presentation(ppt_file)
+                    apply_table_and_balloon_edits([slide.shapes for slide in prs.slides], revision_data, balloon_letter, targets)
+        except Exception as e:
+            stats["failed"] += 1
+            warn(f"Error updating {upload_name(ppt_file)}: {e}")
+            continue
+        if current:
+            stats["unchanged"] += 1
+            if unchanged == "copy":
+                yield upload_name(ppt_file), read_upload(ppt_file)
+            continue
+        stats["changed"] += 1
+        yield upload_name(ppt_file), prs
+
+def update_table_and_balloon_for_all(excel_source, uploaded_ppt_files, fmt="xlsx"):
+    return {fname: presentation_bytes(prs) for fname, prs in iter_table_and_balloon_updates(excel_source, uploaded_ppt_files, fmt)}
+
+def iter_bullet_point_updates(uploaded_ppt_files, new_text_line):
+    # Yields (file name, edited Presentation) for each drawing that got a bullet
+    for ppt_file in uploaded_ppt_files:
+        with for_file(upload_name(ppt_file), "bullet"):
+            with timed("load"):
+                prs = open_presentation(ppt_file)
             modified = False
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if not shape.has_text_frame:
-                        continue
-                    text_frame = shape.text_frame
-                    paragraphs = [p for p in text_frame.paragraphs if p.text.strip() != ""]
-                    if len(paragraphs) < 2:
-                        continue
-                    last_paragraph = paragraphs[-1]
-                    font_name = None
-                    font_size = None
-                    if last_paragraph.runs:
-                        font_name = last_paragraph.runs[0].font.name
-                        font_size = last_paragraph.runs[0].font.size
-                    blank_para = text_frame.add_paragraph()
-                    blank_para.text = " "
-                    new_para = text_frame.add_paragraph()
-                    new_para.text = f"{len(paragraphs) + 1}. {new_text_line}"
-                    new_para.level = last_paragraph.level
-                    if new_para.runs:
-                        run = new_para.runs[0]
-                        run.font.name = font_name if font_name else "Arial"
-                        run.font.size = font_size
-                    modified = True
-            if modified:
-                prs.save(tmp.name)
-                tmp.seek(0)
-                results[ppt_file.name] = tmp.read()
-    return results
+            with timed("bullet"):
+                for slide in prs.slides:
+                    if add_bullet_point_to_shapes(slide.shapes, new_text_line):
+                        modified = True
+        if modified:
+            yield upload_name(ppt_file), prs
+
+def add_bullet_point_to_pptx(uploaded_ppt_files, new_text_line):
+    return {fname: presentation_bytes(prs) for fname, prs in iter_bullet_point_updates(uploaded_ppt_files, new_text_line)}
+
+def iter_release_updates(excel_source, uploaded_ppt_files, fmt="xlsx", notes=(), replacements=(), stats=None, warn=None):
+    # Step 2 rows and balloon, any number of notes and (find, replace) pairs
+    # in one open/save per drawing. excel_source may be None for a release
+    # with notes or replacements only. Yields (file name, edited Presentation).
+    warn = warn or st.warning
+    if stats is None:
+        stats = {}
+    for key in ("changed", "unchanged", "failed"):
+        stats.setdefault(key, 0)
+    locators = {}
+    per_drawing = {}
+    if excel_source is not None:
+        with for_file(None, "release"), timed("excel_read"):
+            per_drawing = read_revision_data_cached(excel_source, fmt, locators)
+    script = edit_script_from_revision_data(per_drawing, locators, notes, replacements)
+    for ppt_file in uploaded_ppt_files:
+        ppt_name = os.path.splitext(upload_name(ppt_file))[0]
+        ops = drawing_ops(script, ppt_name)
+        if not ops:
+            continue
+        try:
+            with for_file(upload_name(ppt_file), "release"):
+                targets = None
+                if ppt_name in locators:
+                    with timed("hash"):
+                        targets = locator_targets(locators[ppt_name], upload_hash(ppt_file))
+                with timed("load"):
+                    prs = open_presentation(ppt_file)
+                modified = apply_edit_ops([slide.shapes for slide in prs.slides], ops, targets)
+        except Exception as e:
+            stats["failed"] += 1
+            warn(f"Error updating {upload_name(ppt_file)}: {e}")
+            continue
+        stats["changed" if modified else "unchanged"] += 1
+        yield upload_name(ppt_file), prs
+
+def parse_replacements(text):
+    # One "find => replace" pair per line
+    replacements = []
+    for line in text.splitlines():
+        if "=>" in line:
+            find, replace = line.split("=>", 1)
+            if find.strip():
+                replacements.append((find.strip(), replace.strip()))
+    return replacements
+
+def presentation_bytes(prs):
+    if isinstance(prs, (bytes, bytearray)):
+        return bytes(prs)
+    out_buffer = io.BytesIO()
+    prs.save(out_buffer)
+    return out_buffer.getvalue()
+
+# Archive members that are zip packages themselves gain nothing from deflate
+ALREADY_COMPRESSED = (".pptx", ".xlsx", ".zip", ".png", ".jpg", ".jpeg")
+BUNDLE_SPOOL_BYTES = 64 * 1024 * 1024
+
+def write_bundle(named_presentations, stage=None):
+    # Each drawing is saved straight into its archive member as soon as it is
+    # finished and then released, so only one drawing is held at a time. The
+    # archive spools to an anonymous temp file once it outgrows memory.
+    # stage names the run the save times are recorded under.
+    bundle = tempfile.SpooledTemporaryFile(max_size=BUNDLE_SPOOL_BYTES)
+    count = 0
+    with zipfile.ZipFile(bundle, "w", zipfile.ZIP_DEFLATED) as zf:
+        for fname, prs in named_presentations:
+            info = zipfile.ZipInfo(fname, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED if fname.lower().endswith(ALREADY_COMPRESSED) else zipfile.ZIP_DEFLATED
+            with for_file(fname, stage), timed("save"), zf.open(info, "w") as member:
+                # Pass-through drawings arrive as their original bytes
+                if isinstance(prs, (bytes, bytearray)):
+                    member.write(prs)
+                else:
+                    prs.save(member)
+            count += 1
+    return bundle, count
+
+def bundle_download(bundle):
+    # Deferred download data: the spooled archive is only read into memory
+    # when the user actually clicks the button
+    def read_bundle():
+        bundle.seek(0)
+        return bundle.read()
+    return read_bundle
+
+def show_timings(records, key):
+    # Per-phase summary of a finished job, with the raw records as JSON
+    # Lines and the totals as a Prometheus textfile
+    if not records:
+        return
+    st.caption("Stage timings")
+    st.dataframe(summarize_phases(records), width="stretch")
+    jsonl = io.StringIO()
+    write_jsonl(records, jsonl)
+    st.download_button("Download Timings (JSON Lines)", data=jsonl.getvalue(), file_name="stage_timings.jsonl", mime="application/json", on_click="ignore", key=f"timings_jsonl_{key}")
+    st.download_button("Download Timings (Prometheus)", data=prometheus_text(records), file_name="drawing_automation.prom", mime="text/plain", on_click="ignore", key=f"timings_prom_{key}")
+
+# --- Background jobs ---
+# Each button submits a job to job_queue and returns at once; the page polls
+# the job for progress. Uploads are handed over as they are, so the job
+# keeps them alive after the user moves on.
+
+def job_warner(job):
+    return lambda message: log_job(job, message)
+
+def job_inputs(job, files):
+    # One drawing at a time under the memory ceiling, local paths opened
+    # only for their turn
+    return open_each(budgeted(track_progress(job, files, upload_name), MEMORY, job["run"]))
+
+def run_recorded(job, record, track_memory, fn, *args):
+    # Runs fn(job, *args), recording its phases on the job's own thread and
+    # its memory peak against the ceiling
+    job["run"] = new_run(job["cancel"])
+    recorder = start_recording(track_memory) if record else None
+    try:
+        return fn(job, *args)
+    finally:
+        if recorder is not None:
+            stop_recording()
+            job["timings"] = recorder["records"]
+        job["memory"] = run_report(MEMORY, job["run"])
+
+def job_extract(job, source_files, workers, fmt, output_name, save_folder, index_path=None, folder=None):
+    excel_bytes = extract_revision_data_multisheet_from_files(
+        track_progress(job, source_files, upload_name), workers, fmt, job_warner(job), job["run"], index_path, folder
+    )
+    message = "Extraction complete! Download your Excel file below."
+    if index_path:
+        message += f" Rows added to the revision index {index_path}."
+    # Save Excel to input folder locally & open automatically
+    if save_folder:
+        excel_path = os.path.join(save_folder, output_name)
+        with open(excel_path, "wb") as f:
+            f.write(excel_bytes)
+        open_excel_local(excel_path, job_warner(job))
+        message = f"Excel saved to {excel_path} and opened for editing."
+    return {"data": excel_bytes, "file_name": output_name, "download_label": "Download Excel", "message": message}
+
+def bundle_result(bundle, count, stats, file_name, download_label, message, empty_message):
+    return {
+        "bundle": bundle,
+        "count": count,
+        "stats": stats,
+        "file_name": file_name,
+        "download_label": download_label,
+        "message": message if count else empty_message,
+    }
+
+def job_update(job, excel_bytes, pptx_files, fmt, unchanged):
+    stats = {}
+    bundle, count = write_bundle(iter_table_and_balloon_updates(
+        excel_bytes, job_inputs(job, pptx_files), fmt, unchanged, stats, job_warner(job)
+    ), "update")
+    return bundle_result(bundle, count, stats, "edited_ppts.zip", "Download All Edited PPTXs (ZIP)",
+                         f"Updated {count} PPTX files! Download below.", "No PPTX files were updated.")
+
+def job_bullet(job, pptx_files, new_text_line):
+    bundle, count = write_bundle(iter_bullet_point_updates(job_inputs(job, pptx_files), new_text_line), "bullet")
+    return bundle_result(bundle, count, None, "pptx_with_bullet.zip", "Download All PPTXs with Added Bullet (ZIP)",
+                         f"Added bullet to {count} PPTX files! Download below.", "No bullet points added.")
+
+def job_release(job, excel_bytes, pptx_files, fmt, notes, replacements):
+    stats = {}
+    bundle, count = write_bundle(iter_release_updates(
+        excel_bytes, job_inputs(job, pptx_files), fmt, notes, replacements, stats, job_warner(job)
+    ), "release")
+    return bundle_result(bundle, count, stats, "released_ppts.zip", "Download All Released PPTXs (ZIP)",
+                         f"Updated {count} PPTX files! Download below.", "No PPTX files were updated.")
+
+def remembered_jobs():
+    # Job ids are kept in the page URL (?jobs=...), so results survive a
+    # reload or a new session opened on the same link. Ids of jobs purged
+    # since are dropped from the URL.
+    listed = [job_id for job_id in st.query_params.get("jobs", "").split(",") if job_id]
+    known = [job_id for job_id in listed if get_job(job_id) is not None]
+    if known != listed:
+        st.query_params["jobs"] = ",".join(known)
+    return known
+
+def job_files(files):
+    # Two jobs on the same uploads must not share read positions: each gets
+    # its own reader over the upload's bytes (local-folder paths are opened
+    # by the job itself)
+    readers = []
+    for f in files:
+        if isinstance(f, io.BytesIO):
+            reader = io.BytesIO(f.getvalue())
+            reader.name = f.name
+            readers.append(reader)
+        else:
+            readers.append(f)
+    return readers
+
+def start_job(label, fn, *args):
+    job_id = submit_job(label, run_recorded, record_timings, track_memory, fn, *args)
+    st.query_params["jobs"] = ",".join(remembered_jobs() + [job_id])
+    st.info("Job submitted; progress is shown below.")
+
+def job_download(job):
+    # Deferred download data; fetching it starts the job's release countdown
+    result = job["result"]
+    read = bundle_download(result["bundle"]) if "bundle" in result else (lambda: result["data"])
+    def read_result():
+        mark_downloaded(job["id"])
+        return read()
+    return read_result
+
+def show_job(job):
+    job_id = job["id"]
+    with st.container(border=True):
+        st.markdown(f"**{job['label']}** · {job['status']}")
+        if job["status"] not in FINISHED:
+            fraction = job["done"] / job["total"] if job["total"] else 0.0
+            text = f"{job['done']} of {job['total']} files" + (f" · {job['current']}" if job["current"] else "")
+            st.progress(fraction, text=text)
+            st.button("Cancel", key=f"cancel_{job_id}", on_click=cancel_job, args=(job_id,))
+        elif job["status"] == "failed":
+            st.error(f"Job failed: {job['error']}")
+        elif job["status"] == "cancelled":
+            st.warning(f"Cancelled after {job['done']} of {job['total']} files.")
+        else:
+            result = job["result"]
+            if result.get("stats"):
+                stats = result["stats"]
+                st.info(f"{stats['changed']} changed, {stats['unchanged']} unchanged, {stats['failed']} failed.")
+            if result.get("count", 1):
+                st.success(result["message"])
+                st.download_button(result["download_label"], data=job_download(job), file_name=result["file_name"],
+                                   mime="application/zip" if "bundle" in result else None, on_click="ignore", key=f"download_{job_id}")
+            else:
+                st.warning(result["message"])
+        if job["log"]:
+            with st.expander(f"Messages ({len(job['log'])})"):
+                st.text("\n".join(job["log"]))
+        if job["status"] in FINISHED:
+            memory = job.get("memory")
+            if memory and memory["files"]:
+                peak = f"{memory['peak_rss_mb']} MB" if memory["peak_rss_mb"] is not None else "unknown"
+                st.caption(
+                    f"Memory: peak {peak} of a {memory['limit_mb']} MB ceiling, "
+                    f"{memory['waits']} waits for memory ({memory['waited_s']} s)"
+                )
+            show_timings(job.get("timings"), job_id)
+            st.button("Dismiss", key=f"dismiss_{job_id}", on_click=remove_job, args=(job_id,))
+
+def show_jobs(polling):
+    jobs = [get_job(job_id) for job_id in remembered_jobs()]
+    jobs = [job for job in jobs if job is not None]
+    if not jobs:
+        return
+    st.subheader("Jobs")
+    for job in reversed(jobs):
+        show_job(job)
+    # Everything finished: one full rerun to stop polling
+    if polling and all(job["status"] in FINISHED for job in jobs):
+        st.rerun()
 
 # ========== Streamlit UI ==========
 
@@ -233,56 +545,79 @@ stage = st.sidebar.radio(
     (
         "Step 1: Extract Revision Data to Excel",
         "Step 2: Edit PPTX from Excel",
-        "Step 3: Add Bullet Point to PPTX"
+        "Step 3: Add Bullet Point to PPTX",
+        "Release: Steps 2 and 3 in One Pass",
+        "Search Revision History"
     )
 )
 
+extract_workers = st.sidebar.number_input(
+    "Extraction worker processes", min_value=1, max_value=os.cpu_count() or 1, value=1
+)
+
+memory_ceiling = st.sidebar.number_input(
+    "Memory ceiling for running jobs (MB)", min_value=128, value=DEFAULT_MEMORY_MB, step=128,
+    help="Drawings wait to be opened while the server is above this; one is always let through.",
+)
+MEMORY["limit"] = int(memory_ceiling) * MB
+
+if st.sidebar.button("Clear cached results"):
+    cache_clear(DRAWING_RESULTS)
+    cache_clear(WORKBOOKS)
+result_cache = cache_stats(DRAWING_RESULTS)
+workbook_cache = cache_stats(WORKBOOKS)
+st.sidebar.caption(
+    f"Cached results: {result_cache['entries']} drawings, {workbook_cache['entries']} workbooks, "
+    f"{(result_cache['bytes'] + workbook_cache['bytes']) / (1024 * 1024):.1f} MB"
+)
+
+revision_index_path = st.sidebar.text_input("Revision index database", value=REVISION_INDEX_PATH)
+
+record_timings = st.sidebar.checkbox("Record stage timings")
+track_memory = st.sidebar.checkbox("Also track memory peaks (slower)", disabled=not record_timings)
+
+UNCHANGED_MODES = {
+    "Rewrite them anyway": "rewrite",
+    "Include them untouched": "copy",
+    "Leave them out of the ZIP": "omit",
+}
+
+OUTPUT_FORMATS = {
+    "Excel workbook, one sheet per drawing (.xlsx)": "xlsx",
+    "CSV manifest, one table for all drawings (.csv)": "csv",
+    "Parquet manifest, one table for all drawings (.parquet)": "parquet",
+}
+
 if stage == "Step 1: Extract Revision Data to Excel":
     st.header("Step 1: Extract Revision Table and Balloon Data")
+    output_format = OUTPUT_FORMATS[st.selectbox("Output format", list(OUTPUT_FORMATS))]
+    output_name = f"Extracted_Revision_Data.{output_format}"
+    add_to_index = st.checkbox("Add results to the revision index", help=f"Makes them searchable on the Search Revision History page ({revision_index_path}).")
     if st.button("Extract Data to Excel"):
         # Source files depends on user input mode
         source_files = uploaded_pptxs
         if input_folder and os.path.isdir(input_folder):
-            source_files = [
-                open(os.path.join(input_folder, f), "rb") for f in os.listdir(input_folder) if f.lower().endswith(".pptx")
-            ]
+            source_files = local_paths(input_folder)
         if source_files:
-            excel_bytes = extract_revision_data_multisheet_from_files(source_files)
-            # Save Excel to input folder locally & open automatically
-            if input_folder and os.path.isdir(input_folder) and platform.system() == "Windows":
-                excel_path = os.path.join(input_folder, "Extracted_Revision_Data.xlsx")
-                with open(excel_path, "wb") as f:
-                    f.write(excel_bytes)
-                st.success(f"Excel saved to {excel_path} and opened for editing.")
-                open_excel_local(excel_path)
-            else:
-                st.success("Extraction complete! Download your Excel file below.")
-                st.download_button("Download Excel", data=excel_bytes, file_name="Extracted_Revision_Data.xlsx")
+            save_folder = input_folder if input_folder and os.path.isdir(input_folder) and platform.system() == "Windows" else None
+            local_folder = os.path.abspath(input_folder) if input_folder and os.path.isdir(input_folder) else None
+            start_job(
+                "Step 1: Extract Revision Data", job_extract, job_files(source_files), int(extract_workers), output_format, output_name, save_folder,
+                revision_index_path if add_to_index else None, local_folder
+            )
         else:
             st.warning("Please upload or specify valid .pptx files.")
 
 elif stage == "Step 2: Edit PPTX from Excel":
     st.header("Step 2: Edit PPTX Files Based on Excel Data")
-    uploaded_excel = st.file_uploader("Upload updated Excel file", type="xlsx")
+    uploaded_excel = st.file_uploader("Upload updated Excel file or manifest", type=["xlsx", "csv", "parquet"])
+    unchanged_mode = UNCHANGED_MODES[st.selectbox("Drawings that already match the Excel", list(UNCHANGED_MODES))]
     if uploaded_excel and (uploaded_pptxs or (input_folder and os.path.isdir(input_folder))):
         if st.button("Apply Edits to PPTX"):
             pptx_files = uploaded_pptxs
             if input_folder and os.path.isdir(input_folder):
-                pptx_files = [
-                    open(os.path.join(input_folder, f), "rb") for f in os.listdir(input_folder) if f.lower().endswith(".pptx")
-                ]
-            excel_bytes = uploaded_excel.getbuffer()
-            updated_files = update_table_and_balloon_for_all(excel_bytes, pptx_files)
-            if updated_files:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as tmp_zip:
-                    with zipfile.ZipFile(tmp_zip.name, "w") as zf:
-                        for fname, file_bytes in updated_files.items():
-                            zf.writestr(fname, file_bytes)
-                    tmp_zip.seek(0)
-                    st.success(f"Updated {len(updated_files)} PPTX files! Download below.")
-                    st.download_button("Download All Edited PPTXs (ZIP)", data=open(tmp_zip.name, "rb").read(), file_name="edited_ppts.zip")
-            else:
-                st.warning("No PPTX files were updated.")
+                pptx_files = local_paths(input_folder)
+            start_job("Step 2: Edit PPTX from Excel", job_update, uploaded_excel.getvalue(), job_files(pptx_files), data_format(uploaded_excel.name), unchanged_mode)
     else:
         st.info("Please upload Excel and PPTX files or specify valid local folder.")
 
@@ -293,19 +628,63 @@ elif stage == "Step 3: Add Bullet Point to PPTX":
         if st.button("Add Bullet Point"):
             pptx_files = uploaded_pptxs
             if input_folder and os.path.isdir(input_folder):
-                pptx_files = [
-                    open(os.path.join(input_folder, f), "rb") for f in os.listdir(input_folder) if f.lower().endswith(".pptx")
-                ]
-            updated_files = add_bullet_point_to_pptx(pptx_files, new_text_line)
-            if updated_files:
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as tmp_zip:
-                    with zipfile.ZipFile(tmp_zip.name, "w") as zf:
-                        for fname, file_bytes in updated_files.items():
-                            zf.writestr(fname, file_bytes)
-                    tmp_zip.seek(0)
-                    st.success(f"Added bullet to {len(updated_files)} PPTX files! Download below.")
-                    st.download_button("Download All PPTXs with Added Bullet (ZIP)", data=open(tmp_zip.name, "rb").read(), file_name="pptx_with_bullet.zip")
-            else:
-                st.warning("No bullet points added.")
+                pptx_files = local_paths(input_folder)
+            start_job("Step 3: Add Bullet Point", job_bullet, job_files(pptx_files), new_text_line)
+    else:
+        st.info("Please upload PPTX files or specify a valid folder.")
+
+elif stage == "Release: Steps 2 and 3 in One Pass":
+    st.header("Release: Excel Edits, Notes and Text Replacements")
+    st.caption("Each drawing is opened and saved once, however many edits it gets.")
+    uploaded_excel = st.file_uploader("Upload updated Excel file or manifest (optional)", type=["xlsx", "csv", "parquet"])
+    notes_text = st.text_area("Notes to add, one per line")
+    replacements_text = st.text_area("Text replacements, one 'find => replace' per line")
+    if uploaded_pptxs or (input_folder and os.path.isdir(input_folder)):
+        if st.button("Apply Release Edits"):
+            pptx_files = uploaded_pptxs
+            if input_folder and os.path.isdir(input_folder):
+                pptx_files = local_paths(input_folder)
+            notes = [line for line in notes_text.splitlines() if line.strip()]
+            start_job(
+                "Release: Steps 2 and 3", job_release, uploaded_excel.getvalue() if uploaded_excel else None, job_files(pptx_files),
+                data_format(uploaded_excel.name) if uploaded_excel else "xlsx", notes, parse_replacements(replacements_text)
+            )
     else:
         st.info("Please upload PPTX files or specify a valid folder.")
+
+elif stage == "Search Revision History":
+    st.header("Search Revision History")
+    if not os.path.exists(revision_index_path):
+        st.info("No revision index yet: run Step 1 with 'Add results to the revision index' first.")
+    else:
+        conn = open_index(revision_index_path)
+        try:
+            stats = index_stats(conn)
+            st.caption(f"{stats['rows']} revision rows from {stats['drawings']} drawings" + ("" if stats["fts"] else " (no full-text support in this SQLite: slower, substring matching)"))
+            search_text = st.text_input("Words in any column (word* matches a prefix)")
+            col1, col2, col3, col4 = st.columns(4)
+            search_drawing = col1.text_input("Drawing (* wildcard)")
+            search_rev = col2.text_input("REV LTR")
+            search_by = col3.text_input("BY")
+            search_appd = col4.text_input("APPD")
+            col1, col2 = st.columns(2)
+            search_since = col1.text_input("Dated on or after (YYYY[-MM[-DD]])")
+            search_until = col2.text_input("Dated on or before (YYYY[-MM[-DD]])")
+            if any((search_text, search_drawing, search_rev, search_by, search_appd, search_since, search_until)):
+                try:
+                    start = time.perf_counter()
+                    rows = search_revisions(conn, search_text, search_drawing, search_rev, search_by, search_appd, search_since or None, search_until or None)
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+                except ValueError:
+                    st.error("Dates must be YYYY, YYYY-MM or YYYY-MM-DD.")
+                else:
+                    st.caption(f"{len(rows)} rows{' (first ' + str(len(rows)) + ' shown)' if len(rows) == SEARCH_LIMIT else ''} in {elapsed_ms:.0f} ms")
+                    st.dataframe(rows, width="stretch")
+        finally:
+            conn.close()
+
+# Jobs from this page (and earlier sessions on the same link), polled while
+# any is still queued or running (a job can be purged between lookups)
+purge_jobs()
+polling = any((job := get_job(job_id)) is not None and job["status"] not in FINISHED for job_id in remembered_jobs())
+st.fragment(show_jobs, run_every=1.0 if polling else None)(polling)
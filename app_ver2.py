@@ -2,83 +2,66 @@ import streamlit as st
 import os
 import pandas as pd
 from pptx import Presentation
-from pptx.enum.shapes import MSO_SHAPE_TYPE
 from pptx.util import Pt
 from copy import deepcopy
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from Code_2 import extract_drawing_rows_safe, get_balloon_letters_flexible
+from pptx_xml import header_could_match
+from shape_locator import REVISION_SIGNATURE
 
 # --- Helper Functions ---
 REV_HEADERS = ["RELEASE NUMBER", "REV LTR", "REVISION DESCRIPTION", "BY", "DATE", "APPD"]
 
 def is_revision_table(table):
+    # Tables that can't hold the revision headers are rejected from the XML
+    # before any cell proxies are built
+    if not header_could_match(table._tbl, REVISION_SIGNATURE):
+        return False
     header = [cell.text.strip().upper() for cell in table.rows[0].cells]
     return header == REV_HEADERS
 
-def find_balloons_and_texts_recursive(shapes):
-    balloon_shapes = []
-    text_shapes = []
-    for sh in shapes:
-        if sh.shape_type == MSO_SHAPE_TYPE.AUTO_SHAPE:
-            try:
-                if sh.auto_shape_type in [9, 40, 56, 57]:
-                    balloon_shapes.append(sh)
-            except:
-                pass
-        if sh.has_text_frame and sh.text.strip():
-            text_shapes.append(sh)
-        if sh.shape_type == MSO_SHAPE_TYPE.GROUP:
-            bs, ts = find_balloons_and_texts_recursive(sh.shapes)
-            balloon_shapes.extend(bs)
-            text_shapes.extend(ts)
-    return balloon_shapes, text_shapes
-
-def get_balloon_letters_flexible(slide):
-    balloon_shapes, text_shapes = find_balloons_and_texts_recursive(slide.shapes)
-    balloon_letters = []
-    for balloon in balloon_shapes:
-        bx, by, bw, bh = balloon.left, balloon.top, balloon.width, balloon.height
-        b_center = (bx + bw / 2, by + bh / 2)
-        nearest_letter, nearest_dist = "", float("inf")
-        for txt in text_shapes:
-            tx, ty, tw, th = txt.left, txt.top, txt.width, txt.height
-            t_center = (tx + tw / 2, ty + th / 2)
-            dist = ((b_center[0] - t_center[0]) ** 2 + (b_center[1] - t_center[1]) ** 2) ** 0.5
-            text = txt.text.strip()
-            if len(text) == 1 and dist < min(bw, bh):
-                if dist < nearest_dist:
-                    nearest_letter = text
-                    nearest_dist = dist
-        balloon_letters.append(nearest_letter)
-    return balloon_letters
-
-def extract_revision_data_multisheet_from_files(uploaded_files):
+def extract_revision_data_multisheet_from_files(uploaded_files, workers=1):
     per_drawing = {}
-    with tempfile.TemporaryDirectory() as temp_dir:
-        for uploaded_file in uploaded_files:
-            ppt_path = os.path.join(temp_dir, uploaded_file.name)
-            with open(ppt_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            prs = Presentation(ppt_path)
-            drawing_name = os.path.splitext(uploaded_file.name)[0]
-            revision_rows = []
-            balloon_letters = []
-            for slide in prs.slides:
-                for shape in slide.shapes:
-                    if shape.has_table and is_revision_table(shape.table):
-                        table = shape.table
-                        for i in range(1, len(table.rows)):
-                            row_data = [cell.text.strip() for cell in table.rows[i].cells]
-                            revision_rows.append(row_data)
-                        balloon_letters = get_balloon_letters_flexible(slide)
-                        while len(balloon_letters) < len(revision_rows):
-                            balloon_letters.append("")
-                        balloon_letters = balloon_letters[:len(revision_rows)]
-            sheet_rows = []
-            for row, balloon in zip(revision_rows, balloon_letters):
-                sheet_rows.append(row + [balloon])
-            if sheet_rows:
-                columns = REV_HEADERS + ["Balloon Text"]
-                per_drawing[drawing_name] = pd.DataFrame(sheet_rows, columns=columns)
+    columns = REV_HEADERS + ["Balloon Text"]
+    if workers > 1:
+        # Fan files out to worker processes; results come back in upload order
+        payloads = [bytes(uploaded_file.getbuffer()) for uploaded_file in uploaded_files]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(extract_drawing_rows_safe, payloads)
+            for uploaded_file, (sheet_rows, error) in zip(uploaded_files, results):
+                if error:
+                    st.warning(f"Could not extract {uploaded_file.name}: {error}")
+                    continue
+                if sheet_rows:
+                    drawing_name = os.path.splitext(uploaded_file.name)[0]
+                    per_drawing[drawing_name] = pd.DataFrame(sheet_rows, columns=columns)
+    else:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for uploaded_file in uploaded_files:
+                ppt_path = os.path.join(temp_dir, uploaded_file.name)
+                with open(ppt_path, "wb") as f:
+                    f.write(uploaded_file.getbuffer())
+                prs = Presentation(ppt_path)
+                drawing_name = os.path.splitext(uploaded_file.name)[0]
+                revision_rows = []
+                balloon_letters = []
+                for slide in prs.slides:
+                    for shape in slide.shapes:
+                        if shape.has_table and is_revision_table(shape.table):
+                            table = shape.table
+                            for i in range(1, len(table.rows)):
+                                row_data = [cell.text.strip() for cell in table.rows[i].cells]
+                                revision_rows.append(row_data)
+                            balloon_letters = get_balloon_letters_flexible(slide)
+                            while len(balloon_letters) < len(revision_rows):
+                                balloon_letters.append("")
+                            balloon_letters = balloon_letters[:len(revision_rows)]
+                sheet_rows = []
+                for row, balloon in zip(revision_rows, balloon_letters):
+                    sheet_rows.append(row + [balloon])
+                if sheet_rows:
+                    per_drawing[drawing_name] = pd.DataFrame(sheet_rows, columns=columns)
     # Return Excel as a bytes object for online download
     with tempfile.NamedTemporaryFile(suffix=".xlsx") as tmp:
         with pd.ExcelWriter(tmp.name) as writer:
@@ -119,8 +102,7 @@ def update_table_and_balloon_for_all(excel_bytes, uploaded_ppt_files):
             for slide in prs.slides:
                 for shape in slide.shapes:
                     if shape.has_table:
-                        headers = [cell.text.strip().upper() for cell in shape.table.rows[0].cells]
-                        if is_revision_table(headers) and not revision_done:
+                        if not revision_done and is_revision_table(shape.table):
                             while len(shape.table.rows) > 1:
                                 shape.table._tbl.remove(shape.table.rows[1]._tr)
                             for rev in revision_data:
@@ -207,12 +189,16 @@ stage = st.sidebar.radio(
     )
 )
 
+extract_workers = st.sidebar.number_input(
+    "Extraction worker processes", min_value=1, max_value=os.cpu_count() or 1, value=1
+)
+
 if stage == "Step 1: Extract Revision Data to Excel":
     st.header("Step 1: Extract Revision Table and Balloon Data")
     uploaded_pptxs = st.file_uploader("Upload .pptx files", type="pptx", accept_multiple_files=True)
     if st.button("Extract Data to Excel"):
         if uploaded_pptxs:
-            excel_bytes = extract_revision_data_multisheet_from_files(uploaded_pptxs)
+            excel_bytes = extract_revision_data_multisheet_from_files(uploaded_pptxs, workers=int(extract_workers))
             if excel_bytes:
                 st.success("Extraction complete! Download your Excel file below.")
                 st.download_button("Download Excel", data=excel_bytes, file_name="Extracted_Revision_Data.xlsx")
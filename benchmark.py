@@ -0,0 +1,193 @@
+# BENCHMARK
+#TIME EXTRACTION, UPDATE AND BULLET ADDITION ON A SYNTHETIC CORPUS, RESULTS AS JSON
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+# Stage name -> what it runs per file
+STAGES = {
+    "extract": "Code_2.extract_drawing, python-pptx engine",
+    "extract_xml": "Code_2.extract_drawing, XML engine",
+    "update": "Code_3.update_pptx_full",
+    "update_surgical": "Code_3.update_pptx_surgical",
+    "bullet": "Code_4.add_bullet_point_to_file",
+}
+
+CORPUS_DEFAULTS = {"slides": 1, "shapes": 50, "group_depth": 1, "revision_rows": 5, "balloons": None, "media_bytes": 0}
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def percentile(sorted_values, q):
+    # Linear interpolation between closest ranks, q in [0, 100]
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+def summarize(latencies, wall):
+    ordered = sorted(latencies)
+    return {
+        "files": len(ordered),
+        "wall_s": round(wall, 4),
+        "files_per_s": round(len(ordered) / wall, 2) if wall else None,
+        "latency_ms": {
+            "p50": round(percentile(ordered, 50) * 1000, 2),
+            "p90": round(percentile(ordered, 90) * 1000, 2),
+            "p99": round(percentile(ordered, 99) * 1000, 2),
+            "max": round(ordered[-1] * 1000, 2),
+        } if ordered else None,
+    }
+
+def run_stage(stage, ppt_paths, edits, work_dir, repeat):
+    # Runs in a fresh process so peak RSS belongs to this stage alone
+    from Code_2 import extract_drawing
+    from Code_3 import update_pptx_full, update_pptx_surgical
+    from Code_4 import add_bullet_point_to_file
+    out_dir = os.path.join(work_dir, stage)
+    os.makedirs(out_dir, exist_ok=True)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for path in ppt_paths:
+            name = os.path.basename(path)
+            output_path = os.path.join(out_dir, name)
+            t = time.perf_counter()
+            if stage == "extract":
+                extract_drawing(path)
+            elif stage == "extract_xml":
+                extract_drawing(path, "xml")
+            elif stage in ("update", "update_surgical"):
+                revision_data, balloon_letter = edits[name]
+                update = update_pptx_surgical if stage == "update_surgical" else update_pptx_full
+                update(path, output_path, revision_data, balloon_letter)
+            elif stage == "bullet":
+                add_bullet_point_to_file(path, output_path, "SERVICE PART PER SPEC - NON-SERVICEABLE ASSEMBLY.")
+            latencies.append(time.perf_counter() - t)
+    result = summarize(latencies, time.perf_counter() - start)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+def corpus_edits(ppt_paths):
+    # Step 2 input for every drawing: its own rows with the description
+    # changed, so the update stage rewrites real data
+    from Code_2 import extract_drawing
+    from workbook_io import revision_edits
+    edits = {}
+    for path in ppt_paths:
+        sheet_rows, _ = extract_drawing(path, "xml")
+        sheet_rows = [row[:2] + [f"{row[2]} (REV)"] + row[3:] for row in sheet_rows]
+        edits[os.path.basename(path)] = revision_edits(sheet_rows) if sheet_rows else ([], "")
+    return edits
+
+def run_benchmark(count=20, stages=None, repeat=1, corpus_dir=None, **corpus_params):
+    # Generates count drawings (unless corpus_dir already holds some) and
+    # runs every stage over them, each stage in its own process
+    from synth_drawings import make_corpus
+    stages = stages or list(STAGES)
+    params = dict(CORPUS_DEFAULTS, **corpus_params)
+    work_dir = tempfile.mkdtemp(prefix="drawing_bench_")
+    try:
+        if corpus_dir and os.path.isdir(corpus_dir) and any(f.lower().endswith(".pptx") for f in os.listdir(corpus_dir)):
+            ppt_paths = sorted(os.path.join(corpus_dir, f) for f in os.listdir(corpus_dir) if f.lower().endswith(".pptx"))
+        else:
+            ppt_paths = make_corpus(corpus_dir or os.path.join(work_dir, "corpus"), count, **params)
+        edits = corpus_edits(ppt_paths)
+        results = {}
+        ctx = multiprocessing.get_context("spawn")
+        for stage in stages:
+            with ctx.Pool(1) as pool:
+                results[stage] = pool.apply(run_stage, (stage, ppt_paths, edits, work_dir, repeat))
+            print(f"{stage}: {results[stage]['files_per_s']} files/s, p50 {results[stage]['latency_ms']['p50']} ms, peak RSS {results[stage]['peak_rss_mb']} MB", file=sys.stderr)
+        return {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "corpus": dict(params, count=len(ppt_paths), repeat=repeat,
+                           total_bytes=sum(os.path.getsize(p) for p in ppt_paths)),
+            "stages": results,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def compare_results(baseline, current, tolerance=0.10):
+    # Stages whose throughput dropped, or whose p90 latency or peak RSS grew,
+    # by more than tolerance against baseline
+    regressions = []
+    for stage, now in current["stages"].items():
+        before = baseline.get("stages", {}).get(stage)
+        if not before:
+            continue
+        checks = [
+            ("files_per_s", before["files_per_s"], now["files_per_s"], False),
+            ("latency_ms.p90", before["latency_ms"]["p90"], now["latency_ms"]["p90"], True),
+            ("peak_rss_mb", before.get("peak_rss_mb"), now.get("peak_rss_mb"), True),
+        ]
+        for metric, old, new, higher_is_worse in checks:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (change > tolerance) if higher_is_worse else (change < -tolerance):
+                regressions.append(f"{stage} {metric}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the drawing automation stages on synthetic PPTX files.")
+    parser.add_argument("--count", type=int, default=20, help="drawings to generate")
+    parser.add_argument("--slides", type=int, default=CORPUS_DEFAULTS["slides"])
+    parser.add_argument("--shapes", type=int, default=CORPUS_DEFAULTS["shapes"], help="filler shapes per slide")
+    parser.add_argument("--group-depth", type=int, default=CORPUS_DEFAULTS["group_depth"])
+    parser.add_argument("--revision-rows", type=int, default=CORPUS_DEFAULTS["revision_rows"])
+    parser.add_argument("--balloons", type=int, default=None, help="balloons on the table slide (default: one per row)")
+    parser.add_argument("--media-mb", type=float, default=0, help="embedded picture size per drawing")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated: " + ", ".join(STAGES))
+    parser.add_argument("--repeat", type=int, default=1, help="passes over the corpus per stage")
+    parser.add_argument("--corpus", help="folder to reuse or fill with the generated drawings")
+    parser.add_argument("--output", help="write the JSON results here")
+    parser.add_argument("--baseline", help="earlier JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args(argv)
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+    results = run_benchmark(
+        args.count, stages, args.repeat, args.corpus,
+        slides=args.slides, shapes=args.shapes, group_depth=args.group_depth,
+        revision_rows=args.revision_rows, balloons=args.balloons,
+        media_bytes=int(args.media_mb * 1024 * 1024),
+    )
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_results(json.load(f), results, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
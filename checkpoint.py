@@ -0,0 +1,64 @@
+# CHECKPOINT
+#APPEND-ONLY PROGRESS FILE SO AN INTERRUPTED BATCH RESUMES WHERE IT STOPPED
+
+import json
+import os
+
+# Layout: the first line describes the run ({"run": {...}}), then one JSON
+# object per finished file, written as soon as the file is done:
+# {"file": "DRW-0001.pptx", "key": [size, mtime_ns], ...stage data...}
+# A file counts as done only while its size and mtime still match, so a
+# drawing replaced between runs is processed again.
+
+def file_key(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def load_checkpoint(path, run, files):
+    # {file name: record} for the files (name -> path) an earlier run with
+    # the same settings finished and that are still unchanged. A checkpoint
+    # written for another command or other options is ignored; a last line
+    # torn by the interruption is dropped.
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    try:
+        header = json.loads(lines[0])
+    except ValueError:
+        return {}
+    if header != {"run": run}:
+        return {}
+    done = {}
+    for line in lines[1:]:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        name = record["file"]
+        if name in files and record["key"] == file_key(files[name]):
+            done[name] = record
+    return done
+
+def start_checkpoint(path, run, done):
+    # Rewrites the checkpoint with just the records still valid and returns
+    # it open for appending, so a torn line never ends up mid-file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"run": run}) + "\n")
+        for record in done.values():
+            f.write(json.dumps(record) + "\n")
+    os.replace(tmp_path, path)
+    return open(path, "a", encoding="utf-8")
+
+def record_done(checkpoint, name, path, **data):
+    # Flushed per file: what is on disk is what a resumed run skips
+    record = dict(data, file=name, key=file_key(path))
+    checkpoint.write(json.dumps(record) + "\n")
+    checkpoint.flush()
+    return record
+
+def finish_checkpoint(checkpoint, path):
+    # The run completed, nothing left to resume
+    checkpoint.close()
+    os.remove(path)
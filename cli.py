@@ -0,0 +1,797 @@
+# CLI
+#HEADLESS BATCH RUNS (EXTRACT, UPDATE, BULLET, CONVERT) THAT RESUME FROM A CHECKPOINT
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from checkpoint import file_key, finish_checkpoint, load_checkpoint, record_done, start_checkpoint
+
+# python-pptx, lxml, openpyxl and pandas are imported inside the subcommand
+# that needs them, so --help and argument errors return straight away.
+#
+# Every subcommand appends a line to <output>.checkpoint.jsonl as each file
+# finishes. Rerunning the same command after an interruption skips the
+# files already done (unless they changed since); --restart ignores the
+# checkpoint. It is removed once a run ends with no failures, and kept
+# otherwise so the next run retries only the failed files.
+
+def list_files(folder, ext):
+    return {f: os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.lower().endswith(ext)}
+
+def default_checkpoint(output):
+    return os.path.abspath(output).rstrip("\\/") + ".checkpoint.jsonl"
+
+def open_run(args, run, files):
+    # (checkpoint path, {file: record} already done, open checkpoint)
+    path = args.checkpoint or default_checkpoint(args.output)
+    done = {} if args.restart else load_checkpoint(path, run, files)
+    if done:
+        print(f"Resuming from {path}: {len(done)} of {len(files)} files already done.")
+    return path, done, start_checkpoint(path, run, done)
+
+def close_run(path, checkpoint, failed):
+    if failed:
+        checkpoint.close()
+        print(f"{failed} failed; rerun the same command to retry them (checkpoint: {path}).")
+        return 1
+    finish_checkpoint(checkpoint, path)
+    return 0
+
+def extract_results(pending, engine, workers, conn):
+    # (rows, locator, error) per pending file, in order. Cache hits are
+    # answered here; misses go through extract_drawing_safe, in a process
+    # pool when workers > 1.
+    from concurrent.futures import ProcessPoolExecutor
+    from functools import partial
+    from Code_2 import extract_drawing_safe
+    from extract_cache import cache_get, cache_put, file_content_hash
+    from metrics import for_file, timed
+    from shape_locator import locator_targets, make_locator
+    cached = {}
+    if conn:
+        for name, path in pending.items():
+            digest = file_content_hash(conn, path)
+            hit = cache_get(conn, digest, engine)
+            if hit is not None:
+                cached[name] = hit[0], make_locator(hit[1], digest), None
+    misses = [name for name in pending if name not in cached]
+    worker = partial(extract_drawing_safe, engine=engine)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(misses) > 1 else None
+    try:
+        paths = [pending[name] for name in misses]
+        if pool:
+            fresh = pool.map(worker, paths, chunksize=max(1, len(paths) // (workers * 4)))
+        else:
+            fresh = map(worker, paths)
+        fresh = iter(fresh)
+        for name in pending:
+            if name in cached:
+                yield name, cached[name]
+                continue
+            # Sequential runs record each file's phases. Phases inside the
+            # worker processes aren't recorded, so with a pool each wait for
+            # the next result is timed instead; together they are the pool's
+            # time, as in extract_revision_data_multisheet_parallel.
+            if pool:
+                with for_file(None, "extract"), timed("workers"):
+                    result = next(fresh)
+            else:
+                with for_file(name, "extract"):
+                    result = next(fresh)
+            if conn and not result[2]:
+                cache_put(conn, result[1]["hash"], engine, result[0], locator_targets(result[1], result[1]["hash"]))
+            yield name, result
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+def run_extract(args):
+    files = list_files(args.input, ".pptx")
+    run = {"command": "extract", "input": os.path.abspath(args.input), "engine": args.engine}
+    path, done, checkpoint = open_run(args, run, files)
+    conn = None
+    if args.cache:
+        from extract_cache import default_cache_path, evict_cache, open_cache
+        conn = open_cache(default_cache_path(args.input))
+    pending = {name: files[name] for name in files if name not in done}
+    failed = 0
+    try:
+        for name, (sheet_rows, locator, error) in extract_results(pending, args.engine, args.workers, conn):
+            if error:
+                print(f"Error extracting {name}: {error}")
+                failed += 1
+                continue
+            done[name] = record_done(checkpoint, name, files[name], rows=sheet_rows, locator=locator)
+            print(f"Extracted: {name}")
+    finally:
+        if conn:
+            evict_cache(conn)
+            conn.close()
+    count = write_extract_output(files, done, args.output, index_path(args), os.path.abspath(args.input))
+    print(f"Revision data for {count} drawings written to: {args.output}")
+    return close_run(path, checkpoint, failed)
+
+def write_extract_output(files, done, output, index=None, folder=None):
+    # Workbook or manifest from the checkpoint records, in folder order,
+    # and the same rows into the revision index if one is given. Returns
+    # the number of drawings with revision rows.
+    from manifest import write_revision_data
+    per_drawing = {}
+    locators = {}
+    for name in files:
+        if name in done and done[name]["rows"]:
+            drawing_name = os.path.splitext(name)[0]
+            per_drawing[drawing_name] = done[name]["rows"]
+            locators[drawing_name] = done[name]["locator"]
+    write_revision_data(per_drawing, output, locators=locators)
+    if index:
+        # Drawings that failed this time keep their earlier rows
+        keep = {os.path.splitext(name)[0] for name in files if name not in done}
+        add_to_index(index, per_drawing, locators, folder, keep)
+    return len(per_drawing)
+
+def index_path(args):
+    # --index with no path puts the index next to the drawing folder
+    if args.index is None:
+        return None
+    if args.index:
+        return args.index
+    from revision_index import default_index_path
+    return default_index_path(args.input)
+
+def add_to_index(path, per_drawing, locators, folder=None, keep=()):
+    from revision_index import index_results, open_index
+    conn = open_index(path)
+    try:
+        written = index_results(conn, per_drawing, locators, folder, keep)
+    finally:
+        conn.close()
+    if written:
+        print(f"Revision index {path}: {written} drawings indexed.")
+
+def run_update(args):
+    from Code_3 import update_drawing
+    from manifest import read_revision_data
+    from metrics import for_file
+    locators = {}
+    per_drawing = read_revision_data(args.excel, locators=locators)
+    files = list_files(args.input, ".pptx")
+    # An edited workbook starts the run over
+    run = {
+        "command": "update", "excel": os.path.abspath(args.excel), "excel_key": file_key(args.excel),
+        "input": os.path.abspath(args.input), "output": os.path.abspath(args.output),
+        "surgical": args.surgical, "unchanged": args.unchanged,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    path, done, checkpoint = open_run(args, run, files)
+    counts = {"changed": 0, "unchanged": 0, "failed": 0, "skipped": 0, "resumed": len(done)}
+    for name, ppt_path in files.items():
+        if name in done:
+            continue
+        sheet_rows = per_drawing.get(os.path.splitext(name)[0])
+        if not sheet_rows:
+            counts["skipped"] += 1
+            continue
+        try:
+            with for_file(name, "update"):
+                result = update_drawing(
+                    ppt_path, os.path.join(args.output, name), sheet_rows,
+                    locators.get(os.path.splitext(name)[0]), args.surgical, args.unchanged
+                )
+        except Exception as e:
+            print(f"Error updating {name}: {e}")
+            counts["failed"] += 1
+            continue
+        record_done(checkpoint, name, ppt_path, result=result)
+        print(f"{'Updated' if result == 'changed' else 'Unchanged'}: {name}")
+        counts[result] += 1
+    print(", ".join(f"{n} {key}" for key, n in counts.items()) + ".")
+    return close_run(path, checkpoint, counts["failed"])
+
+def run_bullet(args):
+    from Code_4 import add_bullet_point_to_file
+    from metrics import for_file
+    files = list_files(args.input, ".pptx")
+    run = {"command": "bullet", "input": os.path.abspath(args.input), "output": os.path.abspath(args.output), "text": args.text}
+    os.makedirs(args.output, exist_ok=True)
+    path, done, checkpoint = open_run(args, run, files)
+    failed = 0
+    for name, ppt_path in files.items():
+        if name in done:
+            continue
+        try:
+            with for_file(name, "bullet"):
+                modified = add_bullet_point_to_file(ppt_path, os.path.join(args.output, f"updated_{name}"), args.text)
+        except Exception as e:
+            print(f"Error updating {name}: {e}")
+            failed += 1
+            continue
+        record_done(checkpoint, name, ppt_path, modified=modified)
+        print(f"{'Updated' if modified else 'No bullet text found in'}: {name}")
+    return close_run(path, checkpoint, failed)
+
+def convert_results(jobs, backend, workers, timeout):
+    # (ppt_path, pptx_path, error) per job as each finishes
+    if backend == "powerpoint":
+        from Code_1 import convert_ppt_file, open_powerpoint
+        powerpoint = open_powerpoint()
+        try:
+            for ppt_path, pptx_path in jobs:
+                try:
+                    convert_ppt_file(powerpoint, os.path.abspath(ppt_path), os.path.abspath(pptx_path))
+                    yield ppt_path, pptx_path, None
+                except Exception as e:
+                    yield ppt_path, pptx_path, f"{type(e).__name__}: {e}"
+        finally:
+            powerpoint.Quit()
+    else:
+        from office_convert import iter_conversions
+        yield from iter_conversions(jobs, workers, timeout)
+
+def default_backend():
+    # PowerPoint where it can be driven over COM, LibreOffice everywhere else
+    if sys.platform == "win32":
+        try:
+            import win32com.client  # noqa: F401
+            return "powerpoint"
+        except ImportError:
+            pass
+    return "libreoffice"
+
+def run_convert(args):
+    from office_convert import needs_conversion
+    files = list_files(args.input, ".ppt")
+    args.output = args.output or args.input
+    run = {"command": "convert", "input": os.path.abspath(args.input), "output": os.path.abspath(args.output)}
+    os.makedirs(args.output, exist_ok=True)
+    path, done, checkpoint = open_run(args, run, files)
+    jobs = []
+    for name in files:
+        if name in done:
+            continue
+        pptx_path = os.path.join(args.output, name[:-4] + ".pptx")
+        if needs_conversion(files[name], pptx_path):
+            jobs.append((files[name], pptx_path))
+        else:
+            print(f"Up to date: {name}")
+    backend = default_backend() if args.backend == "auto" else args.backend
+    if jobs and backend == "libreoffice":
+        from office_convert import find_soffice
+        if find_soffice() is None:
+            checkpoint.close()
+            print("LibreOffice not found: install it or put soffice on PATH.")
+            return 2
+    failed = 0
+    for ppt_path, pptx_path, error in convert_results(jobs, backend, args.workers, args.timeout):
+        name = os.path.basename(ppt_path)
+        if error:
+            print(f"Error converting {name}: {error}")
+            failed += 1
+            continue
+        record_done(checkpoint, name, ppt_path)
+        print(f"Converted: {name}")
+    return close_run(path, checkpoint, failed)
+
+# ---- Sharded runs ----
+# "coordinate" splits a folder into shards in a queue folder on a shared
+# filesystem (see shard_queue) and merges what comes back; "work" runs on
+# each node and processes shards until none are left. Rerunning the
+# coordinator resumes the queue and retries failed shards.
+
+def default_queue(output):
+    return os.path.abspath(output).rstrip("\\/") + ".queue"
+
+def extract_shard(run, names, input_folder, processes):
+    pending = {name: os.path.join(input_folder, name) for name in names}
+    drawings = {}
+    failed = {}
+    for name, (sheet_rows, locator, error) in extract_results(pending, run["engine"], processes, None):
+        if error:
+            print(f"Error extracting {name}: {error}")
+            failed[name] = error
+            continue
+        drawings[name] = {"rows": sheet_rows, "locator": locator}
+    return {"drawings": drawings, "failed": failed}
+
+def update_shard(run, names, input_folder, output_folder, workbook):
+    from Code_3 import update_drawing
+    from metrics import for_file
+    per_drawing, locators = workbook
+    os.makedirs(output_folder, exist_ok=True)
+    results = {}
+    failed = {}
+    for name in names:
+        drawing_name = os.path.splitext(name)[0]
+        if not per_drawing.get(drawing_name):
+            results[name] = "skipped"
+            continue
+        try:
+            with for_file(name, "update"):
+                results[name] = update_drawing(
+                    os.path.join(input_folder, name), os.path.join(output_folder, name), per_drawing[drawing_name],
+                    locators.get(drawing_name), run["surgical"], run["unchanged"]
+                )
+        except Exception as e:
+            print(f"Error updating {name}: {e}")
+            failed[name] = f"{type(e).__name__}: {e}"
+    return {"results": results, "failed": failed}
+
+def run_work(args):
+    from shard_queue import (
+        POLL_SECONDS, claim_shard, drop_lease, finish_shard, is_complete, keep_lease, load_queue,
+        queue_status, reclaim_expired, release_lease, shard_files,
+    )
+    plan = load_queue(args.queue)
+    while plan is None:
+        print(f"Waiting for a queue in {args.queue}...")
+        time.sleep(POLL_SECONDS)
+        plan = load_queue(args.queue)
+    run = plan["run"]
+    # Nodes that mount the shared folders elsewhere say where
+    input_folder = args.input or run["input"]
+    output_folder = args.output or run["output"]
+    workbook = None
+    if run["command"] == "update":
+        from manifest import read_revision_data
+        locators = {}
+        per_drawing = read_revision_data(os.path.join(args.queue, run["workbook"]), locators=locators)
+        workbook = per_drawing, locators
+    processed = 0
+    while True:
+        try:
+            claimed = False
+            for shard in plan["shards"]:
+                lease = claim_shard(args.queue, shard, run["lease_seconds"], run["max_attempts"])
+                if lease is None:
+                    continue
+                claimed = True
+                names = shard_files(args.queue, shard)
+                print(f"Shard {shard}: {len(names)} files")
+                stop = keep_lease(args.queue, lease, run["lease_seconds"])
+                try:
+                    if run["command"] == "extract":
+                        result = extract_shard(run, names, input_folder, args.processes)
+                    else:
+                        result = update_shard(run, names, input_folder, output_folder, workbook)
+                except KeyboardInterrupt:
+                    release_lease(args.queue, lease)
+                    raise
+                except Exception as e:
+                    print(f"Shard {shard} failed: {type(e).__name__}: {e}")
+                    drop_lease(args.queue, lease, f"{type(e).__name__}: {e}")
+                    continue
+                finally:
+                    stop.set()
+                finish_shard(args.queue, lease, result)
+                processed += 1
+            if is_complete(queue_status(args.queue, plan)):
+                break
+            if not claimed:
+                # Everything left is leased: wait in case a lease runs out
+                reclaim_expired(args.queue, run["lease_seconds"])
+                time.sleep(POLL_SECONDS)
+        except FileNotFoundError:
+            # The coordinator removes the queue once it has merged it
+            if load_queue(args.queue) is None:
+                break
+            raise
+    print(f"No shards left; this worker processed {processed}.")
+    return 0
+
+def merge_extract(results, files, output, index=None, folder=None):
+    found = {}
+    for result in results.values():
+        found.update(result["drawings"])
+    # Same order as a single-machine run: the folder's sorted file names
+    count = write_extract_output(files, found, output, index, folder)
+    print(f"Revision data for {count} drawings from {len(results)} shards written to: {output}")
+
+def merge_update(results):
+    counts = {"changed": 0, "unchanged": 0, "skipped": 0, "failed": 0}
+    for result in results.values():
+        for outcome in result["results"].values():
+            counts[outcome] += 1
+        counts["failed"] += len(result["failed"])
+    print(", ".join(f"{n} {key}" for key, n in counts.items()) + ".")
+
+def start_local_workers(queue, count, processes):
+    command = [sys.executable, os.path.abspath(__file__), "work", queue, "--processes", str(processes)]
+    return [subprocess.Popen(command) for _ in range(count)]
+
+def run_coordinate(args):
+    from shard_queue import (
+        POLL_SECONDS, create_queue, failed_shards, is_complete, queue_status, reclaim_expired,
+        remove_queue, reopen_shards, shard_files, shard_results,
+    )
+    queue = os.path.abspath(args.queue or default_queue(args.output))
+    files = list(list_files(args.input, ".pptx"))
+    run = {
+        "command": "update" if args.excel else "extract",
+        "input": os.path.abspath(args.input), "output": os.path.abspath(args.output),
+        "shard_size": args.shard_size, "lease_seconds": args.lease_seconds, "max_attempts": args.attempts,
+    }
+    attachments = {}
+    if args.excel:
+        # Copied into the queue, so every node reads the same workbook
+        run.update(workbook="workbook" + os.path.splitext(args.excel)[1].lower(), excel_key=file_key(args.excel),
+                   surgical=args.surgical, unchanged=args.unchanged)
+        attachments[run["workbook"]] = args.excel
+    else:
+        run["engine"] = args.engine
+    if args.restart:
+        remove_queue(queue)
+    try:
+        plan = create_queue(queue, run, files, args.shard_size, attachments)
+    except ValueError as e:
+        print(e)
+        return 2
+    if [name for shard in plan["shards"] for name in shard_files(queue, shard)] != files:
+        print(f"{args.input} has changed since {queue} was planned; use --restart to plan it again.")
+        return 2
+    reopened = reopen_shards(queue, plan)
+    if reopened:
+        print(f"Retrying {len(reopened)} shards that failed last time.")
+    print(f"Queue {queue}: {plan['files']} files in {len(plan['shards'])} shards.")
+    workers = start_local_workers(queue, args.local_workers, args.processes) if args.local_workers else []
+    last = None
+    try:
+        while True:
+            freed = reclaim_expired(queue, run["lease_seconds"])
+            if freed:
+                print(f"Leases expired, shards queued again: {', '.join(freed)}")
+            status = queue_status(queue, plan)
+            if status != last:
+                print(", ".join(f"{n} {key}" for key, n in status.items()) + " shards.")
+                last = status
+            if is_complete(status):
+                break
+            if workers and all(worker.poll() is not None for worker in workers):
+                print("Local workers have stopped; waiting for other nodes (Ctrl-C to stop).")
+                workers = []
+            time.sleep(POLL_SECONDS)
+    finally:
+        for worker in workers:
+            if worker.poll() is None:
+                worker.terminate()
+            worker.wait()
+    results = shard_results(queue, plan)
+    if run["command"] == "extract":
+        merge_extract(results, files, args.output, index_path(args), run["input"])
+    else:
+        merge_update(results)
+    failed = {name: error for result in results.values() for name, error in result["failed"].items()}
+    lost = failed_shards(queue, plan)
+    for name, error in failed.items():
+        print(f"Failed: {name}: {error}")
+    for shard, info in lost.items():
+        print(f"Shard {shard} not processed: {info['error']}")
+    if failed or lost:
+        print(f"Rerun the same command to retry them (queue: {queue}).")
+        return 1
+    remove_queue(queue)
+    return 0
+
+# ---- Watch ----
+# "watch" keeps running and processes drawings as they land in the folder
+# or change there. Its checkpoint is its state: never removed, so a
+# restarted watcher only picks up what changed while it was down.
+
+def replace_output(output, write):
+    # write(path) fills a temp file beside output, which is then swapped in,
+    # so nobody opens a half-written workbook. Excel on Windows locks a
+    # workbook it has open; False means try again with the next batch.
+    folder, name = os.path.split(os.path.abspath(output))
+    base, ext = os.path.splitext(name)
+    tmp_path = os.path.join(folder, f".{base}.writing{ext}")
+    write(tmp_path)
+    try:
+        os.replace(tmp_path, output)
+    except PermissionError:
+        os.remove(tmp_path)
+        return False
+    return True
+
+def rows_digest(sheet_rows):
+    # Records which workbook rows a drawing was last updated from
+    import hashlib
+    import json
+    return hashlib.sha256(json.dumps(sheet_rows, default=str).encode("utf-8")).hexdigest()[:16]
+
+def load_workbook_rows(excel):
+    from manifest import read_revision_data
+    locators = {}
+    per_drawing = read_revision_data(excel, locators=locators)
+    return {"key": file_key(excel), "rows": per_drawing, "locators": locators}
+
+def stale_drawings(workbook, files, done):
+    # Drawings whose rows in the workbook differ from the ones they were
+    # last updated from
+    stale = []
+    for name in files:
+        sheet_rows = workbook["rows"].get(os.path.splitext(name)[0])
+        if sheet_rows and done.get(name, {}).get("rows") != rows_digest(sheet_rows):
+            stale.append(name)
+    return stale
+
+def workbook_changes(args, workbook, done, settle):
+    # Reloads the workbook once a save has settled; returns the drawings
+    # that now need updating
+    try:
+        key = file_key(args.excel)
+    except FileNotFoundError:
+        return []
+    if key == workbook["key"]:
+        workbook.pop("seen", None)
+        return []
+    seen = workbook.get("seen")
+    if seen is None or seen[1] != key:
+        workbook["seen"] = (time.monotonic(), key)
+        return []
+    if time.monotonic() - seen[0] < settle:
+        return []
+    try:
+        workbook.update(load_workbook_rows(args.excel))
+    except Exception as e:
+        # Caught mid-save, or broken: wait for the next save
+        workbook["key"] = key
+        print(f"Could not read {args.excel}: {e}")
+        return []
+    workbook.pop("seen", None)
+    stale = stale_drawings(workbook, list_files(args.input, ".pptx"), done)
+    print(f"Workbook changed: {len(stale)} drawings to update.")
+    return stale
+
+def watch_extract(args, changed, done, checkpoint, watcher):
+    from watch_folder import processed, retry_later
+    pending = {name: os.path.join(args.input, name) for name in changed}
+    failed = 0
+    for name, (sheet_rows, locator, error) in extract_results(pending, args.engine, args.workers, None):
+        if error:
+            print(f"Error extracting {name}: {error}")
+            done.pop(name, None)
+            retry_later(watcher, name)
+            failed += 1
+            continue
+        done[name] = record_done(checkpoint, name, pending[name], rows=sheet_rows, locator=locator)
+        processed(watcher, name)
+        print(f"Extracted: {name}")
+    return failed
+
+def watch_update(args, changed, done, checkpoint, workbook, watcher):
+    from Code_3 import update_drawing
+    from metrics import for_file
+    from watch_folder import processed, retry_later
+    failed = 0
+    for name in changed:
+        drawing_name = os.path.splitext(name)[0]
+        sheet_rows = workbook["rows"].get(drawing_name)
+        if not sheet_rows:
+            continue
+        ppt_path = os.path.join(args.input, name)
+        try:
+            with for_file(name, "update"):
+                result = update_drawing(
+                    ppt_path, os.path.join(args.output, name), sheet_rows,
+                    workbook["locators"].get(drawing_name), args.surgical, args.unchanged
+                )
+        except Exception as e:
+            print(f"Error updating {name}: {e}")
+            retry_later(watcher, name)
+            failed += 1
+            continue
+        done[name] = record_done(checkpoint, name, ppt_path, result=result, rows=rows_digest(sheet_rows))
+        processed(watcher, name)
+        print(f"{'Updated' if result == 'changed' else 'Unchanged'}: {name}")
+    return failed
+
+def run_watch(args):
+    from watch_folder import has_pending, new_watcher, rescan, rescan_due, stop_watcher, take_settled, wait
+    files = list_files(args.input, ".pptx")
+    run = {"command": "watch", "input": os.path.abspath(args.input), "output": os.path.abspath(args.output)}
+    workbook = None
+    if args.excel:
+        if os.path.abspath(args.output) == os.path.abspath(args.input):
+            print("The output folder must not be the watched folder.")
+            return 2
+        run.update(excel=os.path.abspath(args.excel), surgical=args.surgical, unchanged=args.unchanged)
+        workbook = load_workbook_rows(args.excel)
+        os.makedirs(args.output, exist_ok=True)
+    else:
+        run["engine"] = args.engine
+    path, done, checkpoint = open_run(args, run, files)
+    known = {name: record["key"] for name, record in done.items()}
+    if workbook is not None:
+        # Rows edited while the watcher was down
+        for name in stale_drawings(workbook, files, done):
+            known.pop(name, None)
+    watcher = new_watcher(args.input, ".pptx", known, use_events=not args.poll_only)
+    print(f"Watching {os.path.abspath(args.input)} ({'events' if watcher['observer'] else 'polling'}); Ctrl-C to stop.")
+    # The extract output is rewritten after each batch (and at start, to
+    # match the checkpoint); a locked workbook is retried later
+    output_stale = workbook is None
+    # With --once the exit code says whether any drawing failed
+    failures = 0
+    try:
+        while True:
+            if rescan_due(watcher, args.poll):
+                rescan(watcher)
+            changed, removed = take_settled(watcher, args.settle)
+            if workbook is not None:
+                changed = sorted(set(changed) | set(workbook_changes(args, workbook, done, args.settle)))
+            for name in removed:
+                done.pop(name, None)
+                print(f"Removed: {name}")
+            failed = 0
+            if changed:
+                if workbook is None:
+                    failed = watch_extract(args, changed, done, checkpoint, watcher)
+                else:
+                    failed = watch_update(args, changed, done, checkpoint, workbook, watcher)
+                failures += failed
+            if workbook is None and (changed or removed or output_stale):
+                files = list_files(args.input, ".pptx")
+                output_stale = not replace_output(args.output, lambda target: write_extract_output(
+                    files, done, target, index_path(args), run["input"]
+                ))
+                if output_stale:
+                    print(f"Could not replace {args.output} (open in Excel?); trying again with the next batch.")
+                elif changed or removed:
+                    print(f"{args.output} updated: {len(changed) - failed} changed, {failed} failed, {len(removed)} removed.")
+            if args.once and not has_pending(watcher) and not output_stale:
+                return 1 if failures else 0
+            wait(watcher, args.settle / 2 if has_pending(watcher) else args.poll)
+    finally:
+        stop_watcher(watcher)
+        checkpoint.close()
+
+# ---- Search ----
+
+def run_search(args):
+    from revision_index import COLUMNS, open_index, search_revisions
+    if not os.path.exists(args.index):
+        print(f"No index at {args.index}; build one with extract --index.")
+        return 2
+    conn = open_index(args.index)
+    try:
+        rows = search_revisions(conn, " ".join(args.text), args.drawing, args.rev, args.by, args.appd, args.since, args.until, args.limit)
+    except ValueError:
+        print("--since and --until take YYYY, YYYY-MM or YYYY-MM-DD.")
+        return 2
+    finally:
+        conn.close()
+    if args.csv:
+        import csv
+        writer = csv.writer(sys.stdout)
+        writer.writerow(COLUMNS)
+        writer.writerows([row[c] for c in COLUMNS] for row in rows)
+        return 0
+    widths = {c: min(40, max([len(c)] + [len(str(row[c] or "")) for row in rows])) for c in COLUMNS}
+    print("  ".join(c.upper().ljust(widths[c]) for c in COLUMNS))
+    for row in rows:
+        print("  ".join(str(row[c] or "")[:widths[c]].ljust(widths[c]) for c in COLUMNS))
+    print(f"{len(rows)} rows" + (" (limit reached)" if len(rows) == args.limit else "") + ".")
+    return 0
+
+COMMANDS = {
+    "extract": run_extract, "update": run_update, "bullet": run_bullet, "convert": run_convert,
+    "coordinate": run_coordinate, "work": run_work, "watch": run_watch, "search": run_search,
+}
+
+def build_parser():
+    timing = argparse.ArgumentParser(add_help=False)
+    timing.add_argument("--timings", help="write per-phase timings here (.prom: Prometheus textfile, else JSON Lines)")
+    timing.add_argument("--track-memory", action="store_true", help="add allocation peaks to --timings (slower)")
+    common = argparse.ArgumentParser(add_help=False, parents=[timing])
+    common.add_argument("--checkpoint", help="checkpoint file (default: <output>.checkpoint.jsonl)")
+    common.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and process every file")
+    parser = argparse.ArgumentParser(description="Batch runs of the drawing automation steps without the Streamlit app.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract = commands.add_parser("extract", parents=[common], help="Step 1: revision rows and balloons to a workbook or manifest")
+    extract.add_argument("input", help="folder of .pptx drawings")
+    extract.add_argument("output", help=".xlsx workbook, or .csv / .parquet manifest")
+    extract.add_argument("--engine", choices=("pptx", "xml"), default="pptx")
+    extract.add_argument("--workers", type=int, default=1, help="extraction processes")
+    extract.add_argument("--cache", action="store_true", help="reuse results from the folder's extract cache")
+    extract.add_argument("--index", nargs="?", const="", help="also add the rows to this revision search index (default: <input>.revisions.sqlite)")
+
+    update = commands.add_parser("update", parents=[common], help="Step 2: edit the drawings from the workbook")
+    update.add_argument("excel", help="edited workbook or manifest from extract")
+    update.add_argument("input", help="folder of .pptx drawings")
+    update.add_argument("output", help="folder for the edited drawings")
+    update.add_argument("--surgical", action="store_true", help="rewrite only the edited slide XML")
+    update.add_argument("--unchanged", choices=("rewrite", "copy", "omit"), default="rewrite",
+                        help="what to do with drawings that already match the workbook")
+
+    bullet = commands.add_parser("bullet", parents=[common], help="Step 3: add a numbered note to every bullet list")
+    bullet.add_argument("input", help="folder of .pptx drawings")
+    bullet.add_argument("output", help="folder for the updated drawings")
+    bullet.add_argument("text", help="note text")
+
+    convert = commands.add_parser("convert", parents=[common], help="convert .ppt drawings to .pptx")
+    convert.add_argument("input", help="folder of .ppt drawings")
+    convert.add_argument("--output", help="folder for the .pptx files (default: next to the .ppt files)")
+    convert.add_argument("--backend", choices=("auto", "libreoffice", "powerpoint"), default="auto",
+                         help="auto: PowerPoint over COM on Windows, headless LibreOffice elsewhere")
+    convert.add_argument("--workers", type=int, default=None, help="LibreOffice instances (default: CPU count)")
+    convert.add_argument("--timeout", type=float, default=120, help="seconds allowed per file")
+
+    coordinate = commands.add_parser("coordinate", parents=[timing],
+                                     help="split extract or update into shards for workers on several machines")
+    coordinate.add_argument("input", help="folder of .pptx drawings, at the same path on every node (or see work --input)")
+    coordinate.add_argument("output", help="extract: .xlsx / .csv / .parquet; with --excel: folder for the edited drawings")
+    coordinate.add_argument("--excel", help="run update from this workbook or manifest instead of extract")
+    coordinate.add_argument("--queue", help="shared queue folder (default: <output>.queue)")
+    coordinate.add_argument("--shard-size", type=int, default=500, help="drawings per shard")
+    coordinate.add_argument("--lease-seconds", type=int, default=600, help="a shard not renewed for this long goes to another worker")
+    coordinate.add_argument("--attempts", type=int, default=3, help="tries per shard before it is given up")
+    coordinate.add_argument("--local-workers", type=int, default=0, help="also start this many workers on this machine")
+    coordinate.add_argument("--processes", type=int, default=1, help="extraction processes per local worker")
+    coordinate.add_argument("--restart", action="store_true", help="discard an existing queue and start over")
+    coordinate.add_argument("--engine", choices=("pptx", "xml"), default="pptx")
+    coordinate.add_argument("--index", nargs="?", const="", help="also add the merged rows to this revision search index (default: <input>.revisions.sqlite)")
+    coordinate.add_argument("--surgical", action="store_true", help="rewrite only the edited slide XML")
+    coordinate.add_argument("--unchanged", choices=("rewrite", "copy", "omit"), default="rewrite",
+                            help="what to do with drawings that already match the workbook")
+
+    watch = commands.add_parser("watch", parents=[common], help="keep running: extract or update drawings as they land in the folder")
+    watch.add_argument("input", help="folder of .pptx drawings to watch")
+    watch.add_argument("output", help="extract: .xlsx / .csv / .parquet kept up to date; with --excel: folder for the edited drawings")
+    watch.add_argument("--excel", help="update changed drawings from this workbook or manifest instead of extracting")
+    watch.add_argument("--engine", choices=("pptx", "xml"), default="pptx")
+    watch.add_argument("--index", nargs="?", const="", help="also keep this revision search index up to date (default: <input>.revisions.sqlite)")
+    watch.add_argument("--workers", type=int, default=1, help="extraction processes")
+    watch.add_argument("--surgical", action="store_true", help="rewrite only the edited slide XML")
+    watch.add_argument("--unchanged", choices=("rewrite", "copy", "omit"), default="rewrite",
+                       help="what to do with drawings that already match the workbook")
+    watch.add_argument("--settle", type=float, default=2.0, help="seconds a file must stay unchanged before it is read")
+    watch.add_argument("--poll", type=float, default=5.0, help="seconds between folder scans when polling")
+    watch.add_argument("--poll-only", action="store_true", help="scan the folder instead of using file system events")
+    watch.add_argument("--once", action="store_true", help="process what has changed, then exit")
+
+    search = commands.add_parser("search", help="look up revision rows in an index built by extract --index")
+    search.add_argument("index", help="index database (.revisions.sqlite)")
+    search.add_argument("text", nargs="*", help="words that must all appear somewhere in the row (word* for a prefix)")
+    search.add_argument("--drawing", help="drawing name, * as wildcard")
+    search.add_argument("--rev", help="REV LTR")
+    search.add_argument("--by", help="BY initials")
+    search.add_argument("--appd", help="APPD initials")
+    search.add_argument("--since", help="dated on or after YYYY[-MM[-DD]]")
+    search.add_argument("--until", help="dated on or before YYYY[-MM[-DD]]")
+    search.add_argument("--limit", type=int, default=500)
+    search.add_argument("--csv", action="store_true", help="CSV on stdout instead of a table")
+
+    work = commands.add_parser("work", parents=[timing], help="process shards from a coordinator's queue until none are left")
+    work.add_argument("queue", help="queue folder given to (or made by) coordinate")
+    work.add_argument("--processes", type=int, default=1, help="extraction processes")
+    work.add_argument("--input", help="where this node sees the drawings folder, if not at the coordinator's path")
+    work.add_argument("--output", help="where this node sees the output folder (update), if not at the coordinator's path")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if getattr(args, "input", None) is not None and not os.path.isdir(args.input):
+        print(f"Not a folder: {args.input}")
+        return 2
+    recorder = None
+    if getattr(args, "timings", None):
+        from metrics import start_recording
+        recorder = start_recording(args.track_memory)
+    try:
+        return COMMANDS[args.command](args)
+    except KeyboardInterrupt:
+        print("Interrupted; rerun the same command to resume.")
+        return 130
+    finally:
+        if recorder is not None:
+            from metrics import stop_recording, write_jsonl, write_prometheus_textfile
+            stop_recording()
+            if args.timings.lower().endswith(".prom"):
+                write_prometheus_textfile(recorder["records"], args.timings)
+            else:
+                write_jsonl(recorder["records"], args.timings)
+
+if __name__ == "__main__":
+    sys.exit(main())
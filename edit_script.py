@@ -0,0 +1,196 @@
+# EDIT SCRIPT
+#APPLY A WHOLE RELEASE (ROWS, BALLOON, NOTES, FIND/REPLACE) IN ONE LOAD/SAVE PER DRAWING
+
+import json
+import os
+import zipfile
+from pptx import Presentation
+from pptx.opc.oxml import serialize_part_xml
+from Code_3 import edit_balloons, edit_revision_table, find_edit_targets, load_slide_shapes
+from Code_4 import add_bullet_point_to_shapes
+from extract_cache import content_hash
+from metrics import for_file, timed
+from pptx_xml import A, rewrite_package, slide_part_names
+from shape_locator import locator_targets
+from workbook_io import revision_edits
+
+# Operation name -> required keys
+EDIT_OPS = {
+    "revision_rows": ("rows",),
+    "balloon": ("letter",),
+    "add_notes": ("lines",),
+    "replace": ("find", "replace"),
+}
+
+# Script layout:
+# {
+#   "drawings": {"DRW-0001": [{"op": "revision_rows", "rows": [[...], ...]},
+#                             {"op": "balloon", "letter": "B"}]},
+#   "all": [{"op": "add_notes", "lines": ["SERVICE PART PER SPEC ..."]},
+#           {"op": "replace", "find": "OLD", "replace": "NEW"}],
+#   "locators": {"DRW-0001": {...}}      (optional, from Step 1)
+# }
+# A drawing gets its own operations followed by the "all" ones, in order.
+
+def validate_edit_script(script):
+    if not isinstance(script, dict):
+        raise ValueError("Edit script must be a JSON object")
+    drawings = script.get("drawings", {})
+    if not isinstance(drawings, dict):
+        raise ValueError("'drawings' must map drawing names to operation lists")
+    for name, ops in drawings.items():
+        validate_edit_ops(ops, name)
+    validate_edit_ops(script.get("all", []), "all")
+    return script
+
+def validate_edit_ops(ops, where):
+    if not isinstance(ops, list):
+        raise ValueError(f"{where}: operations must be a list")
+    for op in ops:
+        if not isinstance(op, dict) or op.get("op") not in EDIT_OPS:
+            raise ValueError(f"{where}: unknown operation {op!r}")
+        missing = [key for key in EDIT_OPS[op["op"]] if key not in op]
+        if missing:
+            raise ValueError(f"{where}: '{op['op']}' needs {', '.join(missing)}")
+        if op["op"] == "add_notes" and not isinstance(op["lines"], list):
+            raise ValueError(f"{where}: 'add_notes' lines must be a list")
+
+def load_edit_script(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, encoding="utf-8") as f:
+            return validate_edit_script(json.load(f))
+    return validate_edit_script(json.load(source))
+
+def save_edit_script(script, path):
+    # Dates and numbers from the workbook are written the way the table
+    # cells get them (str())
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(script, f, indent=1, default=str)
+
+def edit_script_from_revision_data(per_drawing, locators=None, notes=(), replacements=()):
+    # Step 2 rows and balloon letter per drawing, plus release-wide notes and
+    # (find, replace) pairs for every drawing
+    drawings = {}
+    for name, sheet_rows in per_drawing.items():
+        if not sheet_rows:
+            continue
+        revision_data, balloon_letter = revision_edits(sheet_rows)
+        drawings[name] = [
+            {"op": "revision_rows", "rows": revision_data},
+            {"op": "balloon", "letter": balloon_letter},
+        ]
+    all_ops = []
+    if notes:
+        all_ops.append({"op": "add_notes", "lines": list(notes)})
+    for find, replace in replacements:
+        all_ops.append({"op": "replace", "find": find, "replace": replace})
+    return {"drawings": drawings, "all": all_ops, "locators": dict(locators or {})}
+
+def drawing_ops(script, name):
+    return list(script.get("drawings", {}).get(name, [])) + list(script.get("all", []))
+
+def apply_edit_ops(slides_shapes, ops, targets=None):
+    # Runs ops in order on one drawing's slides. The revision table and
+    # balloons are found once (through the locator targets if given) and
+    # found again only after a replace has changed text. Returns the
+    # indices of slides whose XML was changed.
+    modified = set()
+    found = None
+    for op in ops:
+        if op["op"] in ("revision_rows", "balloon"):
+            if found is None:
+                found = find_edit_targets(slides_shapes, targets)
+            if op["op"] == "revision_rows":
+                modified |= edit_revision_table(found, op["rows"])
+            else:
+                modified |= edit_balloons(found, op["letter"])
+        elif op["op"] == "add_notes":
+            with timed("bullet"):
+                for line in op["lines"]:
+                    for index, shapes in enumerate(slides_shapes):
+                        if add_bullet_point_to_shapes(shapes, line):
+                            modified.add(index)
+        elif op["op"] == "replace":
+            with timed("replace"):
+                modified |= replace_text(slides_shapes, op["find"], op["replace"])
+            found = None
+            targets = None
+    return modified
+
+def replace_text(slides_shapes, find, replace):
+    # Plain substring replace inside each text run (a:t), grouped shapes and
+    # table cells included. Text split over differently formatted runs is
+    # not matched.
+    modified = set()
+    if not find:
+        return modified
+    for index, shapes in enumerate(slides_shapes):
+        for t in shapes._spTree.iter(A + "t"):
+            if t.text and find in t.text:
+                t.text = t.text.replace(find, replace)
+                modified.add(index)
+    return modified
+
+def edit_pptx_full(pptx_path, output_path, ops, targets=None):
+    with timed("load"):
+        prs = Presentation(pptx_path)
+    modified = apply_edit_ops([slide.shapes for slide in prs.slides], ops, targets)
+    with timed("save"):
+        prs.save(output_path)
+    return modified
+
+def edit_pptx_surgical(pptx_path, output_path, ops, targets=None):
+    # Same single pass over the slide parts as Code_3.update_pptx_surgical
+    with zipfile.ZipFile(pptx_path) as zin:
+        slide_names = slide_part_names(zin)
+        slide_elms, slides_shapes = load_slide_shapes(zin, slide_names)
+        modified = apply_edit_ops(slides_shapes, ops, targets)
+        with timed("save"):
+            replacements = {slide_names[i]: serialize_part_xml(slide_elms[i]) for i in modified}
+            rewrite_package(zin, output_path, replacements)
+    return modified
+
+def apply_edit_script(script, ppt_folder, output_folder, surgical=False):
+    # script is a dict or the path of a JSON edit script. Every drawing with
+    # operations is opened and saved once; "unchanged" counts drawings none
+    # of the operations touched (they are still written out).
+    if not isinstance(script, dict):
+        script = load_edit_script(script)
+    else:
+        validate_edit_script(script)
+    locators = script.get("locators", {})
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+    edit_pptx = edit_pptx_surgical if surgical else edit_pptx_full
+    counts = {"changed": 0, "unchanged": 0, "failed": 0, "skipped": 0}
+    for ppt_file in sorted(os.listdir(ppt_folder)):
+        if ppt_file.lower().endswith(".pptx"):
+            ppt_name = os.path.splitext(ppt_file)[0]
+            ops = drawing_ops(script, ppt_name)
+            if not ops:
+                print(f"No edits for {ppt_file}, skipping.")
+                counts["skipped"] += 1
+                continue
+            try:
+                with for_file(ppt_file, "release"):
+                    pptx_path = os.path.join(ppt_folder, ppt_file)
+                    targets = None
+                    if ppt_name in locators:
+                        with timed("hash"):
+                            targets = locator_targets(locators[ppt_name], content_hash(pptx_path))
+                    modified = edit_pptx(pptx_path, os.path.join(output_folder, ppt_file), ops, targets)
+                print(f"Updated: {ppt_file} ({len(ops)} edits)")
+                counts["changed" if modified else "unchanged"] += 1
+            except Exception as e:
+                print(f"Error updating {ppt_file}: {e}")
+                counts["failed"] += 1
+    print(f"{counts['changed']} changed, {counts['unchanged']} unchanged, {counts['failed']} failed, {counts['skipped']} skipped.")
+    return counts
+
+# Usage:
+if __name__ == "__main__":
+    apply_edit_script(
+        r"C:\Users\release_edits.json",
+        r"C:\Users\INPUT PPTS",
+        r"C:\Users\OUTPUT PPTS"
+    )
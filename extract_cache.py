@@ -0,0 +1,128 @@
+# EXTRACT CACHE
+#CONTENT-HASH CACHE OF STEP 1 RESULTS IN A LOCAL SQLITE FILE
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# Bump whenever extraction output can change (row layout, balloon matching,
+# table detection...). Entries written under another version are ignored
+# and purged the next time the cache is opened.
+EXTRACTION_VERSION = "3"
+
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+CACHE_MAX_AGE_DAYS = 90
+HASH_CHUNK = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    content_hash TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    version TEXT NOT NULL,
+    rows TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (content_hash, engine)
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    file_size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    last_used REAL NOT NULL
+);
+"""
+
+def default_cache_path(input_folder):
+    # Sits next to the drawing folder, e.g. "INPUT PPTS.extract_cache.sqlite"
+    folder = os.path.abspath(input_folder).rstrip("\\/")
+    return folder + ".extract_cache.sqlite"
+
+def open_cache(cache_path):
+    conn = sqlite3.connect(cache_path, timeout=30)
+    # Caches from before results were kept per engine are started afresh
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(entries)")]
+    if columns and "engine" not in columns:
+        conn.execute("DROP TABLE entries")
+    conn.executescript(SCHEMA)
+    conn.execute("DELETE FROM entries WHERE version != ?", (EXTRACTION_VERSION,))
+    conn.commit()
+    return conn
+
+def content_hash(ppt_source):
+    digest = hashlib.sha256()
+    if isinstance(ppt_source, (bytes, bytearray, memoryview)):
+        digest.update(ppt_source)
+        return digest.hexdigest()
+    with open(ppt_source, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def file_content_hash(conn, ppt_path):
+    # Re-hash only when size or mtime changed since the last run, so an
+    # unchanged folder costs one stat per file
+    ppt_path = os.path.abspath(ppt_path)
+    st = os.stat(ppt_path)
+    row = conn.execute(
+        "SELECT file_size, mtime_ns, content_hash FROM files WHERE path = ?", (ppt_path,)
+    ).fetchone()
+    now = time.time()
+    if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+        conn.execute("UPDATE files SET last_used = ? WHERE path = ?", (now, ppt_path))
+        return row[2]
+    digest = content_hash(ppt_path)
+    conn.execute(
+        "INSERT OR REPLACE INTO files (path, file_size, mtime_ns, content_hash, last_used) VALUES (?, ?, ?, ?, ?)",
+        (ppt_path, st.st_size, st.st_mtime_ns, digest, now),
+    )
+    return digest
+
+def cache_get(conn, digest, engine):
+    # (sheet_rows, targets) stored for this content hash by this engine, or
+    # None. The engines can disagree (xml ignores layout inheritance), so
+    # one's results are never served to the other.
+    row = conn.execute(
+        "SELECT rows FROM entries WHERE content_hash = ? AND engine = ? AND version = ?", (digest, engine, EXTRACTION_VERSION)
+    ).fetchone()
+    if row is None:
+        return None
+    conn.execute("UPDATE entries SET last_used = ? WHERE content_hash = ? AND engine = ?", (time.time(), digest, engine))
+    payload = json.loads(row[0])
+    return payload["rows"], payload["targets"]
+
+def cache_put(conn, digest, engine, sheet_rows, targets):
+    # sheet_rows are the revision rows with the balloon letter as last column,
+    # targets the Step 2 shape locations from shape_locator (not a locator:
+    # the hash is the key already)
+    payload = json.dumps({"rows": sheet_rows, "targets": targets})
+    now = time.time()
+    conn.execute(
+        "INSERT OR REPLACE INTO entries (content_hash, engine, version, rows, size, created, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (digest, engine, EXTRACTION_VERSION, payload, len(payload), now, now),
+    )
+
+def evict_cache(conn, max_bytes=CACHE_MAX_BYTES, max_age_days=CACHE_MAX_AGE_DAYS):
+    # Drop entries unused for max_age_days, then least recently used ones
+    # until the stored rows fit in max_bytes
+    cutoff = time.time() - max_age_days * 86400
+    conn.execute("DELETE FROM entries WHERE last_used < ?", (cutoff,))
+    conn.execute("DELETE FROM files WHERE last_used < ?", (cutoff,))
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+    if total > max_bytes:
+        for rowid, size in conn.execute("SELECT rowid, size FROM entries ORDER BY last_used").fetchall():
+            if total <= max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE rowid = ?", (rowid,))
+            total -= size
+    conn.commit()
+
+def clear_cache(conn):
+    # Manual invalidation, e.g. after changing extraction code without
+    # bumping EXTRACTION_VERSION
+    conn.execute("DELETE FROM entries")
+    conn.execute("DELETE FROM files")
+    conn.commit()
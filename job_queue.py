@@ -0,0 +1,154 @@
+# JOB QUEUE
+#BACKGROUND JOBS FOR THE STREAMLIT APP: PER-FILE PROGRESS, CANCELLATION, RESULTS KEPT UNTIL DOWNLOADED
+
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+# Jobs run on a small thread pool shared by every session of the server
+# process; the rest wait in its queue. Streamlit reruns the page script but
+# imports this module once, so jobs outlive reruns and browser reloads.
+JOB_WORKERS = 2
+# A finished job is dropped this long after its result was downloaded...
+DOWNLOADED_GRACE = 10 * 60
+# ...or this long after it finished if nobody downloads it
+JOB_MAX_AGE = 24 * 60 * 60
+LOG_LINES = 500
+
+FINISHED = ("done", "failed", "cancelled")
+
+_jobs = {}
+_lock = threading.Lock()
+_pool = {"executor": None}
+
+def executor():
+    with _lock:
+        if _pool["executor"] is None:
+            _pool["executor"] = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="drawing-job")
+        return _pool["executor"]
+
+def submit_job(label, fn, *args, **kwargs):
+    # fn(job, *args, **kwargs) runs in the background; what it returns is
+    # kept as job["result"]. Returns the job id.
+    job = {
+        "id": uuid.uuid4().hex[:12],
+        "label": label,
+        "status": "queued",
+        "created": time.time(),
+        "started": None,
+        "finished": None,
+        "downloaded": None,
+        "total": 0,
+        "done": 0,
+        "current": None,
+        "log": [],
+        "result": None,
+        "error": None,
+        "cancel": threading.Event(),
+        "future": None,
+    }
+    with _lock:
+        _jobs[job["id"]] = job
+    job["future"] = executor().submit(run_job, job, fn, args, kwargs)
+    return job["id"]
+
+def finish_job(job, status):
+    # finished and status change together, so purge_jobs never sees a
+    # finished job without its time. A job removed while it ran has its
+    # result released here.
+    with _lock:
+        job["finished"] = time.time()
+        job["status"] = status
+        removed = _jobs.get(job["id"]) is not job
+    if removed:
+        release_result(job)
+
+def run_job(job, fn, args, kwargs):
+    if job["cancel"].is_set():
+        finish_job(job, "cancelled")
+        return
+    job["status"] = "running"
+    job["started"] = time.time()
+    status = "failed"
+    try:
+        job["result"] = fn(job, *args, **kwargs)
+        status = "done"
+    except CancelledError:
+        status = "cancelled"
+    except Exception as e:
+        job["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        job["current"] = None
+        finish_job(job, status)
+
+def get_job(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+def cancel_job(job_id):
+    # A queued job never starts; a running one stops before its next file
+    job = get_job(job_id)
+    if job is None or job["status"] in FINISHED:
+        return
+    job["cancel"].set()
+    if job["future"] is not None and job["future"].cancel():
+        finish_job(job, "cancelled")
+
+def track_progress(job, items, name=str):
+    # Passes items through while keeping job["done"] / job["total"] and the
+    # current item's name up to date; raises CancelledError between items
+    # once the job is cancelled
+    items = list(items)
+    job["total"] = len(items)
+    for i, item in enumerate(items):
+        if job["cancel"].is_set():
+            raise CancelledError()
+        job["done"] = i
+        job["current"] = name(item)
+        yield item
+    job["done"] = len(items)
+
+def log_job(job, message):
+    job["log"].append(message)
+    del job["log"][:-LOG_LINES]
+
+def mark_downloaded(job_id):
+    job = get_job(job_id)
+    if job is not None and job["downloaded"] is None:
+        job["downloaded"] = time.time()
+
+def release_result(job):
+    result = job["result"] or {}
+    bundle = result.get("bundle")
+    if bundle is not None:
+        bundle.close()
+    job["result"] = None
+
+def remove_job(job_id):
+    # Cancelled while still listed (cancel_job looks it up); the result is
+    # released now if the job has finished, else by finish_job when it does
+    cancel_job(job_id)
+    with _lock:
+        job = _jobs.pop(job_id, None)
+        finished = job is not None and job["status"] in FINISHED
+    if finished:
+        release_result(job)
+
+def purge_jobs(now=None):
+    # Frees finished jobs whose result was downloaded a while ago, or that
+    # have waited longer than JOB_MAX_AGE
+    now = now or time.time()
+    with _lock:
+        expired = [
+            job for job in _jobs.values()
+            if job["status"] in FINISHED and (
+                (job["downloaded"] is not None and now - job["downloaded"] > DOWNLOADED_GRACE)
+                or now - job["finished"] > JOB_MAX_AGE
+            )
+        ]
+        for job in expired:
+            del _jobs[job["id"]]
+    for job in expired:
+        release_result(job)
+    return len(expired)
@@ -0,0 +1,108 @@
+# MANIFEST
+#SINGLE-TABLE (LONG FORMAT) REVISION MANIFEST AS CSV OR PARQUET
+
+import csv
+import io
+import os
+from workbook_io import WORKBOOK_COLUMNS, blank_to_none, read_revision_workbook, write_revision_workbook
+from shape_locator import decode_locator, encode_locator
+
+# One row per revision row, keyed by the full drawing name (no 31-char limit).
+# "Locator" is only filled on each drawing's first row.
+MANIFEST_COLUMNS = ["Drawing"] + WORKBOOK_COLUMNS + ["Locator"]
+MANIFEST_FORMATS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet", ".xlsx": "xlsx"}
+
+def data_format(name):
+    # "xlsx", "csv" or "parquet" from a path or upload file name
+    return MANIFEST_FORMATS.get(os.path.splitext(str(name))[1].lower(), "xlsx")
+
+def iter_manifest_rows(per_drawing, locators=None):
+    locators = locators or {}
+    for name, sheet_rows in per_drawing.items():
+        locator = encode_locator(locators[name]) if name in locators else None
+        for i, row in enumerate(sheet_rows):
+            yield [name] + list(row) + [locator if i == 0 else None]
+
+def write_manifest(per_drawing, target, fmt="csv", locators=None):
+    if fmt == "parquet":
+        import pandas as pd
+        df = pd.DataFrame(list(iter_manifest_rows(per_drawing, locators)), columns=MANIFEST_COLUMNS, dtype="string")
+        df.to_parquet(target, index=False)
+        return
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, "w", newline="", encoding="utf-8-sig") as f:
+            write_manifest_csv(per_drawing, f, locators)
+    else:
+        text = io.TextIOWrapper(target, encoding="utf-8-sig", newline="")
+        write_manifest_csv(per_drawing, text, locators)
+        text.flush()
+        text.detach()
+
+def write_manifest_csv(per_drawing, f, locators=None):
+    writer = csv.writer(f)
+    writer.writerow(MANIFEST_COLUMNS)
+    writer.writerows(iter_manifest_rows(per_drawing, locators))
+
+def read_manifest(source, fmt="csv", locators=None):
+    # {drawing: rows} built in one pass, so Step 2 looks each drawing up by
+    # key instead of parsing a sheet per file
+    if fmt == "parquet":
+        import pandas as pd
+        df = pd.read_parquet(source)
+        records = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+        header = list(df.columns)
+        return group_manifest_rows(header, records, locators)
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline="", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            return group_manifest_rows(next(reader, []), reader, locators)
+    text = io.TextIOWrapper(source, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        return group_manifest_rows(next(reader, []), reader, locators)
+    finally:
+        text.detach()
+
+def group_manifest_rows(header, records, locators=None):
+    positions = {str(h).strip(): i for i, h in enumerate(header)}
+    if "Drawing" not in positions:
+        raise ValueError("Manifest has no 'Drawing' column")
+    # A missing or misspelled revision column would blank it in every
+    # drawing; only the balloon column is optional
+    missing = [c for c in WORKBOOK_COLUMNS if c != "Balloon Text" and c not in positions]
+    if missing:
+        raise ValueError(f"Manifest has no {', '.join(repr(c) for c in missing)} column")
+    drawing_col = positions["Drawing"]
+    locator_col = positions.get("Locator")
+    columns = [positions.get(c) for c in WORKBOOK_COLUMNS]
+    per_drawing = {}
+    for values in records:
+        if not values or drawing_col >= len(values) or blank_to_none(values[drawing_col]) is None:
+            continue
+        row = [blank_to_none(values[i]) if i is not None and i < len(values) else None for i in columns]
+        if any(v is not None for v in row):
+            per_drawing.setdefault(str(values[drawing_col]), []).append(row)
+        if locators is not None and locator_col is not None and locator_col < len(values):
+            locator = decode_locator(values[locator_col])
+            if locator:
+                locators[str(values[drawing_col])] = locator
+    return per_drawing
+
+def write_revision_data(per_drawing, target, fmt=None, locators=None):
+    # Step 1 output, picked from the file extension: a workbook with one
+    # sheet per drawing, or for .csv / .parquet paths a single long-format
+    # manifest instead.
+    # locators ({drawing: shape_locator locator}) are stored alongside.
+    fmt = fmt or data_format(target)
+    if fmt == "xlsx":
+        write_revision_workbook(per_drawing, target, locators)
+    else:
+        write_manifest(per_drawing, target, fmt, locators)
+
+def read_revision_data(source, fmt=None, locators=None):
+    # Step 2 input: {drawing: rows} from a workbook or a manifest. If a
+    # locators dict is given it is filled with the stored locators.
+    fmt = fmt or data_format(source)
+    if fmt == "xlsx":
+        return read_revision_workbook(source, locators)
+    return read_manifest(source, fmt, locators)
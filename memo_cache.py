@@ -0,0 +1,71 @@
+# MEMO CACHE
+#BOUNDED IN-MEMORY LRU FOR RESULTS KEYED BY CONTENT HASH, SHARED BY EVERY APP SESSION
+
+import sys
+import threading
+from collections import OrderedDict
+
+# Values are shared between callers (and threads), so they are treated as
+# read-only once stored. Sizes are estimates: strings and bytes by length,
+# containers by their items, which is close enough to keep memory capped.
+
+def new_cache(max_bytes):
+    return {
+        "entries": OrderedDict(),
+        "bytes": 0,
+        "max_bytes": max_bytes,
+        "hits": 0,
+        "misses": 0,
+        "lock": threading.Lock(),
+    }
+
+def approx_size(value):
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value) + 50
+    if isinstance(value, dict):
+        return 64 + sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return 56 + sum(approx_size(v) for v in value)
+    return sys.getsizeof(value)
+
+def cache_lookup(cache, key):
+    # The stored value, or None on a miss; a hit becomes most recently used
+    with cache["lock"]:
+        entry = cache["entries"].get(key)
+        if entry is None:
+            cache["misses"] += 1
+            return None
+        cache["entries"].move_to_end(key)
+        cache["hits"] += 1
+        return entry[0]
+
+def cache_store(cache, key, value, size=None):
+    # Least recently used entries go first once max_bytes is exceeded; a
+    # value bigger than the whole cache is not kept
+    size = approx_size(value) if size is None else size
+    with cache["lock"]:
+        old = cache["entries"].pop(key, None)
+        if old is not None:
+            cache["bytes"] -= old[1]
+        if size > cache["max_bytes"]:
+            return
+        cache["entries"][key] = (value, size)
+        cache["bytes"] += size
+        while cache["bytes"] > cache["max_bytes"]:
+            _, (_, evicted) = cache["entries"].popitem(last=False)
+            cache["bytes"] -= evicted
+
+def cache_clear(cache):
+    with cache["lock"]:
+        cache["entries"].clear()
+        cache["bytes"] = 0
+
+def cache_stats(cache):
+    with cache["lock"]:
+        return {
+            "entries": len(cache["entries"]),
+            "bytes": cache["bytes"],
+            "max_bytes": cache["max_bytes"],
+            "hits": cache["hits"],
+            "misses": cache["misses"],
+        }
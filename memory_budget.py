@@ -0,0 +1,129 @@
+# MEMORY BUDGET
+#ADMIT DRAWINGS INTO MEMORY ONLY WHILE THE PROCESS STAYS UNDER A CEILING, AND REPORT EACH RUN'S PEAK
+
+import gc
+import os
+import threading
+import time
+from concurrent.futures import CancelledError
+
+try:
+    import psutil
+except ImportError:  # /proc/self/statm on Linux, reservations only elsewhere
+    psutil = None
+
+# A drawing opened with python-pptx takes roughly this many times its file
+# size (unzipped XML plus the lxml trees); a file reserves that much of the
+# ceiling while it is being processed
+EXPANSION = 8
+POLL_SECONDS = 0.25
+MB = 1024 * 1024
+
+def current_rss():
+    # Resident set size of this process in bytes, or None if unknown
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def new_budget(limit_bytes):
+    # One budget is shared by every run it should hold back (in the app:
+    # every job on the server); each run keeps its own figures
+    return {"limit": limit_bytes, "reserved": 0, "in_flight": 0, "cond": threading.Condition()}
+
+def new_run(cancel=None):
+    # cancel (a threading.Event) ends a wait for memory with CancelledError
+    return {"peak_rss": 0, "peak_reserved": 0, "waits": 0, "waited_s": 0.0, "files": 0, "cancel": cancel}
+
+def sample(run):
+    rss = current_rss()
+    if rss is not None:
+        run["peak_rss"] = max(run["peak_rss"], rss)
+    return rss
+
+def over_limit(budget, run, nbytes):
+    rss = sample(run)
+    return budget["reserved"] + nbytes > budget["limit"] or (rss is not None and rss > budget["limit"])
+
+def reserve(budget, nbytes, run, block=True):
+    # Blocks while admitting nbytes more would pass the ceiling, counting
+    # both reservations and the process's actual RSS. With nothing in
+    # flight a file is always admitted (after a gc pass), so an oversized
+    # drawing or memory held elsewhere slows processing down to one file at
+    # a time rather than stopping it. With block=False it returns False
+    # instead of waiting: a caller that still holds reservations of its own
+    # must finish one of those first, or it would wait for itself.
+    with budget["cond"]:
+        if over_limit(budget, run, nbytes):
+            if budget["in_flight"]:
+                run["waits"] += 1
+                if not block:
+                    return False
+                start = time.perf_counter()
+                try:
+                    while budget["in_flight"] and over_limit(budget, run, nbytes):
+                        if run["cancel"] is not None and run["cancel"].is_set():
+                            raise CancelledError()
+                        budget["cond"].wait(POLL_SECONDS)
+                finally:
+                    run["waited_s"] += time.perf_counter() - start
+            else:
+                gc.collect()
+        budget["reserved"] += nbytes
+        budget["in_flight"] += 1
+        run["files"] += 1
+        run["peak_reserved"] = max(run["peak_reserved"], budget["reserved"])
+        return True
+
+def release(budget, nbytes, run):
+    with budget["cond"]:
+        budget["reserved"] -= nbytes
+        budget["in_flight"] -= 1
+        budget["cond"].notify_all()
+    sample(run)
+
+def input_size(item):
+    # Bytes of an upload buffer, an open local file or a path
+    if isinstance(item, (str, os.PathLike)):
+        return os.path.getsize(item)
+    if hasattr(item, "getbuffer"):
+        return item.getbuffer().nbytes
+    return os.fstat(item.fileno()).st_size
+
+def reservation(item):
+    return input_size(item) * EXPANSION
+
+def budgeted(items, budget, run):
+    # Passes items through one at a time, each holding its reservation until
+    # the consumer asks for the next one (by then it has been saved and
+    # released)
+    for item in items:
+        nbytes = reservation(item)
+        reserve(budget, nbytes, run)
+        try:
+            yield item
+        finally:
+            release(budget, nbytes, run)
+
+def open_each(items):
+    # Local paths are opened only when their turn comes and closed as soon
+    # as the consumer moves on; file-like items pass through
+    for item in items:
+        if isinstance(item, (str, os.PathLike)):
+            with open(item, "rb") as f:
+                yield f
+        else:
+            yield item
+
+def run_report(budget, run):
+    return {
+        "limit_mb": round(budget["limit"] / MB, 1),
+        "peak_rss_mb": round(run["peak_rss"] / MB, 1) if run["peak_rss"] else None,
+        "peak_reserved_mb": round(run["peak_reserved"] / MB, 1),
+        "files": run["files"],
+        "waits": run["waits"],
+        "waited_s": round(run["waited_s"], 2),
+    }
@@ -0,0 +1,184 @@
+# METRICS
+#PER-FILE, PER-PHASE WALL TIME AND ALLOCATION PEAKS, EXPORTED AS JSON LINES OR PROMETHEUS TEXT
+
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# Phases the stages report: load (zip / Presentation), index (shape
+# traversal), match (balloon matching), locate (finding the Step 2 targets),
+# noop_check (whether a drawing already matches its rows), table_rebuild,
+# balloon_edit, bullet, replace, save, hash, cache, excel_read, excel_write,
+# index_write (the revision search index) and workers (waiting on a process
+# pool, whose workers record nothing)
+#
+# Recording is per thread, so background jobs in the app each record only
+# their own phases (tracemalloc itself is process-wide).
+_local = threading.local()
+_noop = contextlib.nullcontext()
+
+def _state():
+    state = getattr(_local, "state", None)
+    if state is None:
+        state = _local.state = {"recorder": None, "file": None, "stage": None, "stack": []}
+    return state
+
+def start_recording(track_memory=False):
+    # Everything timed from now on goes into the returned recorder. With
+    # track_memory, tracemalloc gives each phase its allocation peak (this
+    # slows the stages down noticeably, so it is off by default).
+    state = _state()
+    recorder = {"records": [], "track_memory": track_memory, "started_tracemalloc": False}
+    if track_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        recorder["started_tracemalloc"] = True
+    state["recorder"] = recorder
+    state["stack"] = []
+    return recorder
+
+def stop_recording():
+    state = _state()
+    recorder = state["recorder"]
+    state["recorder"] = None
+    if recorder and recorder["started_tracemalloc"]:
+        tracemalloc.stop()
+    return recorder
+
+def is_recording():
+    return _state()["recorder"] is not None
+
+@contextlib.contextmanager
+def _file_scope(name, stage):
+    state = _state()
+    previous = state["file"], state["stage"]
+    state["file"], state["stage"] = name, stage
+    try:
+        yield
+    finally:
+        state["file"], state["stage"] = previous
+
+def for_file(name, stage):
+    # Phases timed inside are attributed to this drawing and stage
+    # ("extract", "update", "bullet", "release")
+    if _state()["recorder"] is None:
+        return _noop
+    return _file_scope(name, stage)
+
+@contextlib.contextmanager
+def _timed(phase):
+    state = _state()
+    recorder = state["recorder"]
+    track = recorder["track_memory"] and tracemalloc.is_tracing()
+    frame = {"peak": 0}
+    if track:
+        # Fold the enclosing phase's peak so far in before resetting it
+        current, peak = tracemalloc.get_traced_memory()
+        if state["stack"]:
+            parent = state["stack"][-1]
+            parent["peak"] = max(parent["peak"], peak - parent["base"])
+        tracemalloc.reset_peak()
+        frame["base"] = current
+    state["stack"].append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        state["stack"].pop()
+        peak_bytes = None
+        if track:
+            peak_bytes = max(frame["peak"], tracemalloc.get_traced_memory()[1] - frame["base"])
+            if state["stack"]:
+                parent = state["stack"][-1]
+                parent["peak"] = max(parent["peak"], peak_bytes + frame["base"] - parent["base"])
+        recorder["records"].append({
+            "stage": state["stage"],
+            "file": state["file"],
+            "phase": phase,
+            "seconds": seconds,
+            "peak_bytes": peak_bytes,
+        })
+
+def timed(phase):
+    # Wraps one phase; free when nothing is recording
+    if _state()["recorder"] is None:
+        return _noop
+    return _timed(phase)
+
+def summarize_phases(records):
+    # One row per (stage, phase): calls, files, total and mean time, and
+    # the largest allocation peak, slowest phases first within a stage
+    groups = {}
+    for record in records:
+        key = (record["stage"] or "", record["phase"])
+        group = groups.setdefault(key, {"seconds": [], "files": set(), "peak": None})
+        group["seconds"].append(record["seconds"])
+        group["files"].add(record["file"])
+        if record["peak_bytes"] is not None:
+            group["peak"] = max(group["peak"] or 0, record["peak_bytes"])
+    rows = []
+    for (stage, phase), group in groups.items():
+        seconds = group["seconds"]
+        rows.append({
+            "stage": stage,
+            "phase": phase,
+            "calls": len(seconds),
+            "files": len(group["files"] - {None}),
+            "total_s": round(sum(seconds), 4),
+            "mean_ms": round(sum(seconds) / len(seconds) * 1000, 2),
+            "max_ms": round(max(seconds) * 1000, 2),
+            "peak_alloc_kb": round(group["peak"] / 1024, 1) if group["peak"] is not None else None,
+        })
+    rows.sort(key=lambda row: (row["stage"], -row["total_s"]))
+    return rows
+
+def write_jsonl(records, target):
+    # One JSON object per phase record; target is a path or a text stream
+    if isinstance(target, (str, os.PathLike)):
+        with open(target, "a", encoding="utf-8") as f:
+            write_jsonl(records, f)
+        return
+    for record in records:
+        target.write(json.dumps(record) + "\n")
+
+def prometheus_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def prometheus_text(records, prefix="drawing_automation"):
+    # Totals per stage and phase in the Prometheus text exposition format
+    lines = [
+        f"# HELP {prefix}_phase_seconds_total Wall time spent in each phase.",
+        f"# TYPE {prefix}_phase_seconds_total counter",
+    ]
+    rows = summarize_phases(records)
+    for row in rows:
+        labels = f'stage="{prometheus_label(row["stage"])}",phase="{prometheus_label(row["phase"])}"'
+        lines.append(f"{prefix}_phase_seconds_total{{{labels}}} {row['total_s']}")
+    lines += [
+        f"# HELP {prefix}_phase_calls_total Times each phase ran.",
+        f"# TYPE {prefix}_phase_calls_total counter",
+    ]
+    for row in rows:
+        labels = f'stage="{prometheus_label(row["stage"])}",phase="{prometheus_label(row["phase"])}"'
+        lines.append(f"{prefix}_phase_calls_total{{{labels}}} {row['calls']}")
+    peaks = [row for row in rows if row["peak_alloc_kb"] is not None]
+    if peaks:
+        lines += [
+            f"# HELP {prefix}_phase_peak_alloc_bytes Largest allocation peak seen in each phase.",
+            f"# TYPE {prefix}_phase_peak_alloc_bytes gauge",
+        ]
+        for row in peaks:
+            labels = f'stage="{prometheus_label(row["stage"])}",phase="{prometheus_label(row["phase"])}"'
+            lines.append(f"{prefix}_phase_peak_alloc_bytes{{{labels}}} {int(row['peak_alloc_kb'] * 1024)}")
+    return "\n".join(lines) + "\n"
+
+def write_prometheus_textfile(records, path, prefix="drawing_automation"):
+    # Written to a temp file and renamed, so the node_exporter textfile
+    # collector never reads a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(prometheus_text(records, prefix))
+    os.replace(tmp_path, path)
@@ -0,0 +1,316 @@
+# OFFICE CONVERT
+#CONVERT PPT TO PPTX WITH A POOL OF WARM HEADLESS LIBREOFFICE INSTANCES (NO WINDOWS NEEDED)
+
+import os
+import queue
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+PPTX_FILTER = "Impress MS PowerPoint 2007 XML"
+SOFFICE_NAMES = ("soffice", "libreoffice")
+SOFFICE_PATHS = (
+    "/usr/lib/libreoffice/program/soffice",
+    "/opt/libreoffice/program/soffice",
+    "/Applications/LibreOffice.app/Contents/MacOS/soffice",
+    r"C:\Program Files\LibreOffice\program\soffice.exe",
+)
+DEFAULT_TIMEOUT = 120
+STARTUP_TIMEOUT = 60
+# A long-running instance slowly grows; it is restarted after this many files
+RECYCLE_AFTER = 200
+
+def find_soffice():
+    for name in SOFFICE_NAMES:
+        path = shutil.which(name)
+        if path:
+            return path
+    for path in SOFFICE_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+def uno_available():
+    # The Python-UNO bridge (python3-uno) lets an instance stay up between
+    # files; without it every file starts its own soffice process
+    try:
+        import uno  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def needs_conversion(ppt_path, pptx_path):
+    # Skipped when the .pptx is already there and at least as new as the .ppt
+    return not os.path.exists(pptx_path) or os.path.getmtime(pptx_path) < os.path.getmtime(ppt_path)
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def soffice_command(worker, *args):
+    # Each instance gets its own profile, so several can run side by side
+    return [worker["soffice"], f"-env:UserInstallation={Path(worker['profile']).as_uri()}",
+            "--headless", "--invisible", "--nologo", "--norestore", "--nolockcheck", *args]
+
+def popen_group(command):
+    # In its own process group so a timeout kills soffice.bin too, not just
+    # the launcher script
+    if os.name == "posix":
+        return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, start_new_session=True)
+    return subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+def kill_group(process):
+    if process.poll() is None:
+        if os.name == "posix":
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            process.kill()
+    process.wait()
+
+# ---- Instances ----
+
+def start_worker(soffice, use_uno):
+    worker = {
+        "soffice": soffice,
+        "profile": tempfile.mkdtemp(prefix="lo_profile_"),
+        "use_uno": use_uno,
+        "process": None,
+        "desktop": None,
+        "converted": 0,
+    }
+    if use_uno:
+        try:
+            launch_instance(worker)
+        except Exception:
+            stop_worker(worker)
+            raise
+    return worker
+
+def launch_instance(worker):
+    port = free_port()
+    worker["process"] = popen_group(soffice_command(
+        worker, "--nodefault", f"--accept=socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext"
+    ))
+    worker["desktop"] = connect_desktop(port, worker["process"])
+    worker["converted"] = 0
+
+def connect_desktop(port, process):
+    import uno
+    from com.sun.star.connection import NoConnectException
+    local = uno.getComponentContext()
+    resolver = local.ServiceManager.createInstanceWithContext("com.sun.star.bridge.UnoUrlResolver", local)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while True:
+        try:
+            ctx = resolver.resolve(f"uno:socket,host=127.0.0.1,port={port};urp;StarOffice.ComponentContext")
+            return ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+        except NoConnectException:
+            if process.poll() is not None or time.monotonic() > deadline:
+                kill_group(process)
+                raise RuntimeError(f"LibreOffice did not start listening on port {port}")
+            time.sleep(0.25)
+
+def kill_instance(worker):
+    worker["desktop"] = None
+    if worker["process"] is not None:
+        kill_group(worker["process"])
+        worker["process"] = None
+
+def restart_instance(worker):
+    kill_instance(worker)
+    launch_instance(worker)
+
+def stop_worker(worker):
+    if worker["desktop"] is not None:
+        try:
+            worker["desktop"].terminate()
+            worker["process"].wait(timeout=10)
+        except Exception:
+            pass
+    kill_instance(worker)
+    shutil.rmtree(worker["profile"], ignore_errors=True)
+
+# ---- One file ----
+
+def uno_property(name, value):
+    from com.sun.star.beans import PropertyValue
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+def uno_convert(desktop, ppt_path, out_path):
+    import uno
+    doc = desktop.loadComponentFromURL(
+        uno.systemPathToFileUrl(os.path.abspath(ppt_path)), "_blank", 0,
+        (uno_property("Hidden", True), uno_property("ReadOnly", True)),
+    )
+    if doc is None:
+        raise RuntimeError("LibreOffice could not open the file")
+    try:
+        doc.storeToURL(uno.systemPathToFileUrl(os.path.abspath(out_path)),
+                       (uno_property("FilterName", PPTX_FILTER), uno_property("Overwrite", True)))
+    finally:
+        doc.close(True)
+
+def convert_on_instance(worker, ppt_path, out_path, timeout):
+    # The UNO call can't be interrupted, so it runs on a helper thread; on
+    # timeout the instance is killed (which also ends the call) and restarted
+    if worker["converted"] >= RECYCLE_AFTER:
+        restart_instance(worker)
+    outcome = {}
+    def target():
+        try:
+            uno_convert(worker["desktop"], ppt_path, out_path)
+        except Exception as e:
+            outcome["error"] = e
+    call = threading.Thread(target=target, daemon=True)
+    call.start()
+    call.join(timeout)
+    if call.is_alive():
+        restart_instance(worker)
+        raise TimeoutError(f"no result after {timeout}s")
+    worker["converted"] += 1
+    if "error" in outcome:
+        # The file may have crashed the instance; bring up a fresh one
+        if worker["process"].poll() is not None:
+            restart_instance(worker)
+        raise outcome["error"]
+
+def convert_with_process(worker, ppt_path, out_dir, timeout):
+    # Fallback without UNO: one soffice --convert-to run per file
+    process = popen_group(soffice_command(worker, "--convert-to", f"pptx:{PPTX_FILTER}", "--outdir", out_dir, os.path.abspath(ppt_path)))
+    try:
+        _, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        kill_group(process)
+        raise TimeoutError(f"no result after {timeout}s")
+    if process.returncode:
+        raise RuntimeError(f"soffice exited with {process.returncode}: {stderr.decode(errors='replace').strip()[-300:]}")
+
+def convert_file(worker, ppt_path, pptx_path, timeout=DEFAULT_TIMEOUT):
+    # Written into a scratch folder beside the target and moved into place,
+    # so a half-written .pptx never looks newer than its .ppt
+    out_dir = os.path.dirname(os.path.abspath(pptx_path))
+    os.makedirs(out_dir, exist_ok=True)
+    scratch = tempfile.mkdtemp(prefix=".converting_", dir=out_dir)
+    try:
+        out_path = os.path.join(scratch, os.path.splitext(os.path.basename(ppt_path))[0] + ".pptx")
+        if worker["use_uno"]:
+            convert_on_instance(worker, ppt_path, out_path, timeout)
+        else:
+            convert_with_process(worker, ppt_path, scratch, timeout)
+        if not os.path.exists(out_path):
+            raise RuntimeError("LibreOffice wrote no output")
+        os.replace(out_path, pptx_path)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+# ---- Pool ----
+
+def iter_conversions(jobs, workers=None, timeout=DEFAULT_TIMEOUT, soffice=None):
+    # jobs: (ppt_path, pptx_path) pairs. Each worker thread keeps one
+    # LibreOffice instance warm and takes the next job when it is free.
+    # Yields (ppt_path, pptx_path, error) as files finish, error None on
+    # success; a failed or timed-out file never stops the others.
+    jobs = list(jobs)
+    if not jobs:
+        return
+    soffice = soffice or find_soffice()
+    if soffice is None:
+        raise RuntimeError("LibreOffice not found: install it or put soffice on PATH")
+    use_uno = uno_available()
+    if not use_uno:
+        print("python3-uno not found: every file starts its own LibreOffice process (slower).")
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    todo = queue.Queue()
+    for job in jobs:
+        todo.put(job)
+    results = queue.Queue()
+    startup_errors = []
+
+    def run():
+        worker = None
+        try:
+            worker = start_worker(soffice, use_uno)
+            while True:
+                try:
+                    ppt_path, pptx_path = todo.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    convert_file(worker, ppt_path, pptx_path, timeout)
+                    results.put((ppt_path, pptx_path, None))
+                except Exception as e:
+                    results.put((ppt_path, pptx_path, f"{type(e).__name__}: {e}"))
+        except Exception as e:
+            startup_errors.append(f"{type(e).__name__}: {e}")
+        finally:
+            if worker is not None:
+                stop_worker(worker)
+            results.put(None)
+
+    threads = [threading.Thread(target=run, name=f"soffice-{i}") for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        running = len(threads)
+        while running:
+            item = results.get()
+            if item is None:
+                running -= 1
+            else:
+                yield item
+        # Only reached with jobs left over if no instance would start
+        while True:
+            try:
+                ppt_path, pptx_path = todo.get_nowait()
+            except queue.Empty:
+                break
+            yield ppt_path, pptx_path, f"no LibreOffice instance: {'; '.join(startup_errors) or 'unknown error'}"
+    finally:
+        # Stopped early (Ctrl-C): workers finish their current file and quit
+        while True:
+            try:
+                todo.get_nowait()
+            except queue.Empty:
+                break
+        for thread in threads:
+            thread.join()
+
+def convert_ppt_folder(input_folder, output_folder=None, workers=None, timeout=DEFAULT_TIMEOUT):
+    # Linux counterpart of Code_1.convert_ppt_to_pptx: every .ppt that has no
+    # up-to-date .pptx yet, several at a time
+    output_folder = output_folder or input_folder
+    jobs = []
+    counts = {"converted": 0, "up_to_date": 0, "failed": 0}
+    for ppt_file in sorted(os.listdir(input_folder)):
+        if ppt_file.lower().endswith(".ppt"):
+            ppt_path = os.path.join(input_folder, ppt_file)
+            pptx_path = os.path.join(output_folder, ppt_file[:-4] + ".pptx")
+            if needs_conversion(ppt_path, pptx_path):
+                jobs.append((ppt_path, pptx_path))
+            else:
+                counts["up_to_date"] += 1
+    for ppt_path, pptx_path, error in iter_conversions(jobs, workers, timeout):
+        if error:
+            print(f"Error converting {os.path.basename(ppt_path)}: {error}")
+            counts["failed"] += 1
+        else:
+            print(f"Converted {os.path.basename(ppt_path)} to {pptx_path}")
+            counts["converted"] += 1
+    print(f"{counts['converted']} converted, {counts['up_to_date']} already up to date, {counts['failed']} failed.")
+    return counts
+
+# Usage:
+if __name__ == "__main__":
+    convert_ppt_folder("/data/INPUT PPTS", workers=4)
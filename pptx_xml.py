@@ -0,0 +1,175 @@
+# PPTX XML
+#READ REVISION TABLES AND SHAPE GEOMETRY STRAIGHT FROM THE ZIP PACKAGE
+
+import copy
+import io
+import os
+import posixpath
+import struct
+import zipfile
+from lxml import etree
+
+NS = {
+    "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+    "p": "http://schemas.openxmlformats.org/presentationml/2006/main",
+    "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+}
+A = "{%s}" % NS["a"]
+P = "{%s}" % NS["p"]
+R = "{%s}" % NS["r"]
+
+COPY_CHUNK = 1024 * 1024
+# Whether copy_member_raw works with this Python's zipfile, found out once
+# per process by raw_copy_supported
+RAW_COPY = {"ok": None}
+
+# First row of an a:tbl: its cell count, and the a:t of each run and field
+# (the same elements text_of reads). Compiled once.
+HEADER_CELL_COUNT = etree.XPath("count(a:tr[1]/a:tc)", namespaces=NS)
+HEADER_RUN_TEXTS = etree.XPath("a:tr[1]/a:tc/a:txBody/a:p/*[self::a:r or self::a:fld]/a:t[1]/text()", namespaces=NS)
+
+def open_package(ppt_source):
+    if isinstance(ppt_source, (bytes, bytearray)):
+        ppt_source = io.BytesIO(ppt_source)
+    return zipfile.ZipFile(ppt_source)
+
+def slide_part_names(zf):
+    # Slide parts in p:sldIdLst order, the same order prs.slides gives
+    pres = etree.fromstring(zf.read("ppt/presentation.xml"))
+    rels = etree.fromstring(zf.read("ppt/_rels/presentation.xml.rels"))
+    targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+    names = []
+    for sld_id in pres.iterfind("p:sldIdLst/p:sldId", NS):
+        target = targets[sld_id.get(R + "id")]
+        if target.startswith("/"):
+            names.append(target[1:])
+        else:
+            names.append(posixpath.normpath(posixpath.join("ppt", target)))
+    return names
+
+def paragraph_texts(tx_body):
+    # Mirrors python-pptx _Paragraph.text for each a:p, a:br read as "\v"
+    if tx_body is None:
+        return []
+    paragraphs = []
+    for p in tx_body.iterfind("a:p", NS):
+        parts = []
+        for child in p:
+            if child.tag == A + "r" or child.tag == A + "fld":
+                parts.append(child.findtext("a:t", "", NS) or "")
+            elif child.tag == A + "br":
+                parts.append("\v")
+        paragraphs.append("".join(parts))
+    return paragraphs
+
+def text_of(tx_body):
+    # Mirrors python-pptx TextFrame.text: paragraphs joined by "\n"
+    return "\n".join(paragraph_texts(tx_body))
+
+def table_rows(tbl, limit=None):
+    rows = []
+    for tr in tbl.iterfind("a:tr", NS):
+        if limit is not None and len(rows) == limit:
+            break
+        rows.append([text_of(tc.find("a:txBody", NS)).strip() for tc in tr.iterfind("a:tc", NS)])
+    return rows
+
+def header_could_match(tbl, signature):
+    # Quick reject before any cell text is built. signature holds headers
+    # upper-cased without spaces; a first row whose cells include all of
+    # them has at least that many cells, and each one appears in its run
+    # text once whitespace is dropped. False means it can't match.
+    if HEADER_CELL_COUNT(tbl) < len(signature):
+        return False
+    row_text = "".join("".join(HEADER_RUN_TEXTS(tbl)).split()).upper()
+    return all(h in row_text for h in signature)
+
+def xfrm_geometry(xfrm):
+    if xfrm is None:
+        return None
+    off = xfrm.find("a:off", NS)
+    ext = xfrm.find("a:ext", NS)
+    if off is None or ext is None:
+        return None
+    return int(off.get("x")), int(off.get("y")), int(ext.get("cx")), int(ext.get("cy"))
+
+def iter_slide_trees(ppt_source):
+    # p:spTree of each slide in order. Only presentation.xml, its rels and
+    # the slide parts are ever read; media parts stay compressed inside the zip
+    with open_package(ppt_source) as zf:
+        for name in slide_part_names(zf):
+            yield etree.fromstring(zf.read(name)).find("p:cSld/p:spTree", NS)
+
+def copy_member_raw(zin, info, zout):
+    # Append one member's compressed bytes as-is: no inflate/deflate round
+    # trip. Goes through zipfile internals; only used once
+    # raw_copy_supported has vouched for them.
+    zin.fp.seek(info.header_offset)
+    local_header = zin.fp.read(30)
+    name_len, extra_len = struct.unpack("<HH", local_header[26:30])
+    zin.fp.seek(name_len + extra_len, os.SEEK_CUR)
+    out = copy.copy(info)
+    # CRC and sizes are known up front, so no trailing data descriptor
+    out.flag_bits &= ~0x08
+    out.header_offset = zout.fp.tell()
+    zout.fp.write(out.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        chunk = zin.fp.read(min(COPY_CHUNK, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Truncated member {info.filename}")
+        zout.fp.write(chunk)
+        remaining -= len(chunk)
+    zout.filelist.append(out)
+    zout.NameToInfo[out.filename] = out
+    zout.start_dir = zout.fp.tell()
+    zout._didModify = True
+
+def copy_member(zin, info, zout):
+    # Same member through the public API: inflated and compressed again
+    zout.writestr(copy.copy(info), zin.read(info))
+
+def raw_copy_supported():
+    # The internals copy_member_raw relies on must exist, and a small
+    # package (deflated and stored members, then a normal write) must come
+    # back intact: testzip passes and every member reads back the same.
+    # Otherwise (a Python whose zipfile changed) members are recompressed.
+    if RAW_COPY["ok"] is None:
+        RAW_COPY["ok"] = False
+        if all(hasattr(zipfile.ZipInfo, attr) for attr in ("FileHeader", "header_offset", "compress_size", "flag_bits")):
+            try:
+                source = io.BytesIO()
+                with zipfile.ZipFile(source, "w", zipfile.ZIP_DEFLATED) as zf:
+                    zf.writestr("ppt/slides/slide1.xml", b"<p:sld/>" * 200)
+                    zf.writestr(zipfile.ZipInfo("ppt/media/image1.png"), bytes(range(256)))
+                copied = io.BytesIO()
+                with zipfile.ZipFile(source) as zin, zipfile.ZipFile(copied, "w") as zout:
+                    if all(hasattr(zout, attr) for attr in ("fp", "filelist", "NameToInfo", "start_dir", "_didModify")):
+                        for info in zin.infolist():
+                            copy_member_raw(zin, info, zout)
+                        zout.writestr("[Content_Types].xml", b"<Types/>")
+                with zipfile.ZipFile(source) as original, zipfile.ZipFile(copied) as result:
+                    names = original.namelist()
+                    RAW_COPY["ok"] = (
+                        result.testzip() is None
+                        and result.namelist() == names + ["[Content_Types].xml"]
+                        and all(result.read(name) == original.read(name) for name in names)
+                    )
+            except Exception:
+                RAW_COPY["ok"] = False
+    return RAW_COPY["ok"]
+
+def rewrite_package(zin, output, replacements):
+    # Write a copy of zin to output where only the members named in
+    # replacements ({member name: new bytes}) are re-compressed; every other
+    # member is copied byte-for-byte in its original order
+    copy_other = copy_member_raw if raw_copy_supported() else copy_member
+    with zipfile.ZipFile(output, "w") as zout:
+        for info in zin.infolist():
+            if info.filename in replacements:
+                new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                new_info.compress_type = zipfile.ZIP_DEFLATED
+                new_info.external_attr = info.external_attr
+                zout.writestr(new_info, replacements[info.filename])
+            else:
+                copy_other(zin, info, zout)
@@ -0,0 +1,220 @@
+# REVISION INDEX
+#SQLITE FULL-TEXT INDEX OF EVERY EXTRACTED REVISION ROW, SEARCHABLE WITHOUT OPENING ANY PPTX
+
+import datetime
+import os
+import re
+import sqlite3
+import time
+
+# One row per revision row of each drawing, in table order, keyed by the
+# drawing name (drawing numbers are unique across the corpus; indexing a
+# drawing again replaces its rows). revisions_fts is an FTS5 index over the
+# same rows, kept in step by triggers. SQLite builds without FTS5 fall back
+# to LIKE matching, which is slower and looser: it matches substrings, not
+# whole words or word prefixes, so "rev" also finds "preview" there.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS drawings (
+    drawing TEXT PRIMARY KEY,
+    folder TEXT,
+    content_hash TEXT,
+    indexed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS revisions (
+    id INTEGER PRIMARY KEY,
+    drawing TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    release_number TEXT,
+    rev_ltr TEXT,
+    description TEXT,
+    by TEXT,
+    date TEXT,
+    appd TEXT,
+    balloon TEXT,
+    date_iso TEXT
+);
+CREATE INDEX IF NOT EXISTS revisions_drawing ON revisions (drawing);
+CREATE INDEX IF NOT EXISTS revisions_rev ON revisions (rev_ltr COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS revisions_date ON revisions (date_iso);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS revisions_fts USING fts5(
+    drawing, release_number, rev_ltr, description, by, date, appd, balloon,
+    content='revisions', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS revisions_ai AFTER INSERT ON revisions BEGIN
+    INSERT INTO revisions_fts (rowid, drawing, release_number, rev_ltr, description, by, date, appd, balloon)
+    VALUES (new.id, new.drawing, new.release_number, new.rev_ltr, new.description, new.by, new.date, new.appd, new.balloon);
+END;
+CREATE TRIGGER IF NOT EXISTS revisions_ad AFTER DELETE ON revisions BEGIN
+    INSERT INTO revisions_fts (revisions_fts, rowid, drawing, release_number, rev_ltr, description, by, date, appd, balloon)
+    VALUES ('delete', old.id, old.drawing, old.release_number, old.rev_ltr, old.description, old.by, old.date, old.appd, old.balloon);
+END;
+"""
+
+COLUMNS = ["drawing", "release_number", "rev_ltr", "description", "by", "date", "appd", "balloon"]
+# Title-block dates come in whatever style each drafter used; these are
+# tried in order (US month-first before day-first) to fill date_iso, which
+# the since/until filters use. Rows whose date matches none are only found
+# by text.
+DATE_FORMATS = (
+    "%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%d-%b-%Y", "%d-%b-%y", "%d %b %Y", "%b %d %Y",
+    "%d %B %Y", "%B %d %Y", "%d.%m.%Y", "%d/%m/%Y", "%Y/%m/%d", "%m-%d-%Y", "%m-%d-%y",
+)
+SEARCH_LIMIT = 500
+
+def default_index_path(input_folder):
+    # Sits next to the drawing folder, e.g. "INPUT PPTS.revisions.sqlite"
+    return os.path.abspath(input_folder).rstrip("\\/") + ".revisions.sqlite"
+
+def open_index(index_path):
+    conn = sqlite3.connect(index_path, timeout=30)
+    conn.executescript(SCHEMA)
+    try:
+        conn.executescript(FTS_SCHEMA)
+    except sqlite3.OperationalError:  # SQLite built without FTS5
+        pass
+    conn.commit()
+    return conn
+
+def has_fts(conn):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'revisions_fts'").fetchone() is not None
+
+def parse_date(value):
+    # ISO date (YYYY-MM-DD) for a DATE cell, or None
+    if value is None:
+        return None
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime("%Y-%m-%d")
+    text = re.sub(r"\s+", " ", str(value).strip().replace(",", ""))
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+def cell_text(value):
+    if value is None:
+        return None
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+# ---- Writing ----
+
+def index_drawing(conn, drawing, sheet_rows, digest=None, folder=None):
+    # Replaces the drawing's rows (Step 1 rows: the six revision columns and
+    # the balloon letter). A drawing already indexed from the same content
+    # hash is left alone; returns whether anything was written.
+    if digest is not None:
+        row = conn.execute("SELECT content_hash FROM drawings WHERE drawing = ?", (drawing,)).fetchone()
+        if row is not None and row[0] == digest:
+            return False
+    conn.execute("DELETE FROM revisions WHERE drawing = ?", (drawing,))
+    conn.executemany(
+        "INSERT INTO revisions (drawing, position, release_number, rev_ltr, description, by, date, appd, balloon, date_iso)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (drawing, position, *[cell_text(v) for v in (list(row) + [None] * 7)[:7]], parse_date(row[4] if len(row) > 4 else None))
+            for position, row in enumerate(sheet_rows)
+        ],
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO drawings (drawing, folder, content_hash, indexed) VALUES (?, ?, ?, ?)",
+        (drawing, folder, digest, time.time()),
+    )
+    return True
+
+def remove_drawing(conn, drawing):
+    conn.execute("DELETE FROM revisions WHERE drawing = ?", (drawing,))
+    conn.execute("DELETE FROM drawings WHERE drawing = ?", (drawing,))
+
+def index_results(conn, per_drawing, locators=None, folder=None, keep=()):
+    # A Step 1 result set ({drawing: rows} and their locators) in one
+    # transaction. With folder, drawings indexed from that folder earlier
+    # that are no longer in per_drawing (deleted, or no revision table any
+    # more) are dropped, except those in keep (e.g. failed this time).
+    # Returns the number of drawings written.
+    locators = locators or {}
+    written = 0
+    with conn:
+        for drawing, sheet_rows in per_drawing.items():
+            digest = (locators.get(drawing) or {}).get("hash")
+            written += index_drawing(conn, drawing, sheet_rows, digest, folder)
+        if folder is not None:
+            for (drawing,) in conn.execute("SELECT drawing FROM drawings WHERE folder = ?", (folder,)).fetchall():
+                if drawing not in per_drawing and drawing not in keep:
+                    remove_drawing(conn, drawing)
+    return written
+
+# ---- Searching ----
+
+def fts_query(text):
+    # Free text as an FTS5 query: every word must appear (prefix match with
+    # a trailing *); punctuation can't break the query syntax
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        word = word.rstrip("*")
+        if word:
+            terms.append('"' + word.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+def date_bound(value, end=False):
+    # "2024", "2024-03" or "2024-03-15" -> first (or with end, last) day
+    parts = [int(p) for p in str(value).split("-")]
+    if len(parts) == 1:
+        return f"{parts[0]:04d}-12-31" if end else f"{parts[0]:04d}-01-01"
+    if len(parts) == 2:
+        if not end:
+            return datetime.date(parts[0], parts[1], 1).strftime("%Y-%m-%d")
+        following = datetime.date(parts[0] + parts[1] // 12, parts[1] % 12 + 1, 1)
+        return (following - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+    return datetime.date(*parts).strftime("%Y-%m-%d")
+
+def search_revisions(conn, text=None, drawing=None, rev=None, by=None, appd=None, since=None, until=None, limit=SEARCH_LIMIT):
+    # Revision rows as dicts (COLUMNS). text is matched against every
+    # column; drawing may use * wildcards; rev, by and appd match whole
+    # values, ignoring case; since/until take YYYY[-MM[-DD]] and only match
+    # rows with a readable date. Best text matches first, else by drawing.
+    where = []
+    params = []
+    order = "r.drawing, r.position"
+    source = "revisions r"
+    if text and fts_query(text):
+        if has_fts(conn):
+            source = "revisions_fts JOIN revisions r ON r.id = revisions_fts.rowid"
+            where.append("revisions_fts MATCH ?")
+            params.append(fts_query(text))
+            order = "revisions_fts.rank, r.drawing, r.position"
+        else:
+            for word in text.split():
+                word = word.rstrip("*")
+                where.append("(" + " OR ".join(f"r.{c} LIKE ?" for c in COLUMNS) + ")")
+                params.extend([f"%{word}%"] * len(COLUMNS))
+    if drawing:
+        where.append("r.drawing LIKE ?")
+        params.append(drawing.replace("*", "%"))
+    for column, value in (("rev_ltr", rev), ("by", by), ("appd", appd)):
+        if value:
+            where.append(f"TRIM(r.{column}) = ? COLLATE NOCASE")
+            params.append(value.strip())
+    if since:
+        where.append("r.date_iso >= ?")
+        params.append(date_bound(since))
+    if until:
+        where.append("r.date_iso <= ?")
+        params.append(date_bound(until, end=True))
+    sql = f"SELECT {', '.join('r.' + c for c in COLUMNS)} FROM {source}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += f" ORDER BY {order} LIMIT ?"
+    params.append(limit)
+    return [dict(zip(COLUMNS, row)) for row in conn.execute(sql, params)]
+
+def index_stats(conn):
+    drawings, last = conn.execute("SELECT COUNT(*), MAX(indexed) FROM drawings").fetchone()
+    rows = conn.execute("SELECT COUNT(*) FROM revisions").fetchone()[0]
+    return {"drawings": drawings, "rows": rows, "last_indexed": last, "fts": has_fts(conn)}
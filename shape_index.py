@@ -0,0 +1,176 @@
+# SHAPE INDEX
+#ONE PASS PER SLIDE: EVERY SHAPE, GROUPS FLATTENED, WITH ITS BOX IN SLIDE SPACE
+
+import math
+from array import array
+from pptx_xml import NS, P, header_could_match, paragraph_texts, table_rows, xfrm_geometry
+from shape_locator import REVISION_SIGNATURE
+
+# Child tags python-pptx treats as shapes, and the kind each is indexed as.
+# A graphic frame holding a table is indexed as "table".
+SHAPE_KINDS = {
+    P + "sp": "sp",
+    P + "grpSp": "group",
+    P + "graphicFrame": "frame",
+    P + "cxnSp": "connector",
+    P + "pic": "picture",
+    P + "contentPart": "other",
+}
+
+# prstGeom values python-pptx reports as auto_shape_type 9, 40, 56, 57
+BALLOON_PRESETS = {"ellipse", "leftRightUpArrow", "downArrowCallout", "leftRightArrowCallout"}
+
+IDENTITY = (1.0, 1.0, 0.0, 0.0)
+NAN = float("nan")
+
+def new_index():
+    # Column per field, one entry per shape in document order (a group
+    # comes right before its children). x/y/w/h are NaN when the geometry
+    # is inherited and unknown; text is stripped; paragraphs counts the
+    # non-empty ones; headers holds the upper-cased first row of tables
+    # by position (empty for tables that can't be a revision table);
+    # elms keeps the element so a stage can wrap it for edits.
+    return {
+        "id": array("q"),
+        "kind": [],
+        "top": array("b"),
+        "x": array("d"),
+        "y": array("d"),
+        "w": array("d"),
+        "h": array("d"),
+        "balloon": array("b"),
+        "paragraphs": array("l"),
+        "text": [],
+        "headers": {},
+        "elms": [],
+    }
+
+def build_slide_index(sp_tree, shapes=None):
+    # shapes is the python-pptx collection for sp_tree when the slide comes
+    # from a Presentation; it is only used for top-level placeholders that
+    # inherit their position from the layout
+    index = new_index()
+    add_shapes(index, sp_tree, IDENTITY, True, shapes)
+    return index
+
+def add_shapes(index, parent, transform, top, shapes):
+    sx, sy, tx, ty = transform
+    for elm in parent:
+        kind = SHAPE_KINDS.get(elm.tag)
+        if kind is None:
+            continue
+        shape_id = int(elm.find("*/p:cNvPr", NS).get("id"))
+        balloon = False
+        paragraphs = []
+        headers = None
+        if kind == "sp":
+            sp_pr = elm.find("p:spPr", NS)
+            geometry = xfrm_geometry(sp_pr.find("a:xfrm", NS)) if sp_pr is not None else None
+            balloon = is_balloon_sp(elm, sp_pr)
+            paragraphs = paragraph_texts(elm.find("p:txBody", NS))
+            if geometry is None and top and shapes is not None and elm.find("p:nvSpPr/p:nvPr/p:ph", NS) is not None:
+                geometry = placeholder_geometry(shapes, elm)
+        elif kind == "group":
+            xfrm = elm.find("p:grpSpPr/a:xfrm", NS)
+            geometry = xfrm_geometry(xfrm)
+        elif kind == "frame":
+            geometry = xfrm_geometry(elm.find("p:xfrm", NS))
+            tbl = elm.find("a:graphic/a:graphicData/a:tbl", NS)
+            if tbl is not None:
+                kind = "table"
+                headers = []
+                # BOM and tolerance tables stop at the XPath check
+                if header_could_match(tbl, REVISION_SIGNATURE):
+                    first_row = table_rows(tbl, limit=1)
+                    headers = [h.upper() for h in first_row[0]] if first_row else []
+        elif kind in ("connector", "picture"):
+            sp_pr = elm.find("p:spPr", NS)
+            geometry = xfrm_geometry(sp_pr.find("a:xfrm", NS)) if sp_pr is not None else None
+        else:
+            geometry = None
+        position = len(index["id"])
+        index["id"].append(shape_id)
+        index["kind"].append(kind)
+        index["top"].append(1 if top else 0)
+        if geometry is None:
+            for key in ("x", "y", "w", "h"):
+                index[key].append(NAN)
+        else:
+            x, y, w, h = geometry
+            index["x"].append(sx * x + tx)
+            index["y"].append(sy * y + ty)
+            index["w"].append(sx * w)
+            index["h"].append(sy * h)
+        index["balloon"].append(1 if balloon else 0)
+        index["paragraphs"].append(sum(1 for p in paragraphs if p.strip() != ""))
+        index["text"].append("\n".join(paragraphs).strip())
+        if headers is not None:
+            index["headers"][position] = headers
+        index["elms"].append(elm)
+        if kind == "group":
+            add_shapes(index, elm, child_transform(transform, xfrm), False, shapes)
+
+def is_balloon_sp(sp, sp_pr):
+    # Same test as shape_type == AUTO_SHAPE and auto_shape_type in [9, 40, 56, 57]
+    nv = sp.find("p:nvSpPr", NS)
+    prst = sp_pr.find("a:prstGeom", NS) if sp_pr is not None else None
+    return (
+        nv.find("p:nvPr/p:ph", NS) is None
+        and (sp_pr is None or sp_pr.find("a:custGeom", NS) is None)
+        and prst is not None
+        and nv.find("p:cNvSpPr", NS).get("txBox") not in ("1", "true")
+        and prst.get("prst") in BALLOON_PRESETS
+    )
+
+def placeholder_geometry(shapes, sp):
+    placeholder = shapes._shape_factory(sp)
+    geometry = (placeholder.left, placeholder.top, placeholder.width, placeholder.height)
+    return None if None in geometry else geometry
+
+def child_transform(transform, xfrm):
+    # Children of a group are laid out in its chOff/chExt space; map that
+    # onto the group's own off/ext, then through the parent transform
+    if xfrm is None:
+        return transform
+    off = xfrm.find("a:off", NS)
+    ext = xfrm.find("a:ext", NS)
+    ch_off = xfrm.find("a:chOff", NS)
+    ch_ext = xfrm.find("a:chExt", NS)
+    if off is None or ext is None or ch_off is None or ch_ext is None:
+        return transform
+    ch_cx, ch_cy = int(ch_ext.get("cx")), int(ch_ext.get("cy"))
+    kx = int(ext.get("cx")) / ch_cx if ch_cx else 1.0
+    ky = int(ext.get("cy")) / ch_cy if ch_cy else 1.0
+    x0 = int(off.get("x")) - int(ch_off.get("x")) * kx
+    y0 = int(off.get("y")) - int(ch_off.get("y")) * ky
+    sx, sy, tx, ty = transform
+    return sx * kx, sy * ky, tx + sx * x0, ty + sy * y0
+
+def has_geometry(index, i):
+    return not math.isnan(index["x"][i])
+
+def top_level_tables(index):
+    return [i for i in index["headers"] if index["top"][i]]
+
+def revision_table_rows(index, rev_headers):
+    # Data rows of every top-level table whose header row is exactly
+    # rev_headers, in slide order
+    return [table_rows(index["elms"][i].find("a:graphic/a:graphicData/a:tbl", NS))[1:]
+            for i in top_level_tables(index) if index["headers"][i] == rev_headers]
+
+def balloon_match_inputs(index):
+    # Balloon (center x, center y, radius) and the centers and letters of
+    # single-character texts, for Code_2.match_balloons
+    balloons = []
+    centers = []
+    letters = []
+    for i in range(len(index["id"])):
+        if not has_geometry(index, i):
+            continue
+        x, y, w, h = index["x"][i], index["y"][i], index["w"][i], index["h"][i]
+        if index["balloon"][i]:
+            balloons.append((x + w / 2, y + h / 2, min(w, h)))
+        if len(index["text"][i]) == 1:
+            letters.append(index["text"][i])
+            centers.append((x + w / 2, y + h / 2))
+    return balloons, centers, letters
@@ -0,0 +1,83 @@
+# SHAPE LOCATOR
+#WHERE STEP 2 EDITS EACH DRAWING: REVISION TABLE AND BALLOON TEXT SHAPE IDS
+
+import json
+
+REVISION_HEADERS = [
+    "RELEASE NUMBER", "REV LTR", "REVISION DESCRIPTION", "BY", "DATE", "APPD"
+]
+# The headers as compared: upper case, spaces removed. Computed once.
+REVISION_SIGNATURE = frozenset(h.upper().replace(" ", "") for h in REVISION_HEADERS)
+
+def is_revision_table(headers):
+    return REVISION_SIGNATURE.issubset(h.upper().replace(" ", "") for h in headers)
+
+def is_balloon_text(txt):
+    return (len(txt) == 1 and txt.isalpha()) or (len(txt) == 2 and txt[0].isalpha() and txt[1] == '.')
+
+def slide_edit_targets(index):
+    # Positions in one slide's shape_index of the first revision table and
+    # of every top-level text shape holding a single balloon letter
+    table = None
+    balloons = []
+    for i in range(len(index["id"])):
+        if not index["top"][i]:
+            continue
+        if index["kind"][i] == "table":
+            if table is None and is_revision_table(index["headers"][i]):
+                table = i
+        elif index["kind"][i] == "sp" and is_balloon_text(index["text"][i]):
+            balloons.append(i)
+    return table, balloons
+
+def locate_edit_targets(slide_indexes):
+    # Same rules as the Step 2 scan: the first revision table in slide order
+    # and every balloon text. Positions are [slide index, shape id].
+    table = None
+    balloons = []
+    for slide, index in enumerate(slide_indexes):
+        table_pos, balloon_pos = slide_edit_targets(index)
+        if table is None and table_pos is not None:
+            table = [slide, index["id"][table_pos]]
+        balloons.extend([slide, index["id"][i]] for i in balloon_pos)
+    return {"table": table, "balloons": balloons}
+
+def make_locator(targets, digest):
+    # Targets are only valid for the exact file they were found in
+    return dict(targets, hash=digest)
+
+def locator_targets(locator, digest):
+    # Targets of a locator recorded for a file with this content hash, or
+    # None when there is no usable locator and Step 2 has to scan
+    if not locator or locator.get("hash") != digest:
+        return None
+    return {"table": locator.get("table"), "balloons": locator["balloons"]}
+
+def locator_slides(targets):
+    slides = {index for index, _ in targets["balloons"]}
+    if targets["table"]:
+        slides.add(targets["table"][0])
+    return slides
+
+def encode_locator(locator):
+    return json.dumps(locator, separators=(",", ":"))
+
+def decode_locator(text):
+    # Hand-edited or truncated cells just mean no locator
+    if not text:
+        return None
+    try:
+        locator = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(locator, dict) or not isinstance(locator.get("hash"), str):
+        return None
+    if not isinstance(locator.get("balloons"), list):
+        return None
+    positions = list(locator["balloons"])
+    if locator.get("table") is not None:
+        positions.append(locator["table"])
+    for position in positions:
+        if not (isinstance(position, list) and len(position) == 2 and all(type(v) is int for v in position)):
+            return None
+    return locator
@@ -0,0 +1,230 @@
+# SHARD QUEUE
+#FILE-BASED WORK QUEUE ON A SHARED FOLDER: SHARDS, LEASES, RETRIES, RESULTS
+
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+
+# Layout of a queue folder, which every node must be able to reach:
+#   queue.json              the run: command, folders, options, shard count
+#   shards/00000.json       file names in each shard
+#   leases/00000.json       held by the worker processing the shard
+#   attempts/00000.<token>  one per lost or failed attempt
+#   done/00000.json         the shard's results
+#   failed/00000.json       a shard that ran out of attempts
+# Everything is claimed with O_EXCL creates and published with os.replace,
+# so no locks are needed beyond what the filesystem gives. Workers' clocks
+# should agree (NTP) to within a small part of the lease time. A shard may
+# run twice if its lease expires while the first worker is still on it;
+# results are only ever replaced whole, so the last one wins.
+
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+POLL_SECONDS = 2.0
+SUBFOLDERS = ("shards", "leases", "attempts", "done", "failed")
+
+def shard_path(queue, folder, shard):
+    return os.path.join(queue, folder, f"{shard}.json")
+
+def write_json(path, data):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def read_json(path):
+    # None when the file is gone (or caught half-way by a non-atomic
+    # filesystem)
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# ---- Plan ----
+
+def create_queue(queue, run, files, shard_size, attachments=None):
+    # Splits files (names, in order) into shards of shard_size. attachments
+    # ({name: local path}) are copied into the queue for every node to read.
+    # An existing queue for the same run is kept as it is, so a restarted
+    # coordinator picks up where the last one stopped; one for another run
+    # is an error.
+    existing = read_json(os.path.join(queue, "queue.json"))
+    if existing is not None:
+        if existing["run"] != run:
+            raise ValueError(f"{queue} holds a different run; pick another folder or use --restart")
+        return existing
+    for folder in SUBFOLDERS:
+        os.makedirs(os.path.join(queue, folder), exist_ok=True)
+    for name, path in (attachments or {}).items():
+        shutil.copyfile(path, os.path.join(queue, name))
+    shards = [f"{i:05d}" for i in range(0, (len(files) + shard_size - 1) // shard_size)]
+    for i, shard in enumerate(shards):
+        write_json(shard_path(queue, "shards", shard), files[i * shard_size:(i + 1) * shard_size])
+    plan = {"run": run, "shards": shards, "files": len(files)}
+    # Written last: workers wait for it, so they never see half a plan
+    write_json(os.path.join(queue, "queue.json"), plan)
+    return plan
+
+def remove_queue(queue):
+    # Only folders that really are queues
+    if os.path.exists(os.path.join(queue, "queue.json")):
+        shutil.rmtree(queue)
+
+def load_queue(queue):
+    return read_json(os.path.join(queue, "queue.json"))
+
+def shard_files(queue, shard):
+    return read_json(shard_path(queue, "shards", shard))
+
+# ---- Leases ----
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def attempts(queue, shard):
+    prefix = shard + "."
+    return sum(1 for name in os.listdir(os.path.join(queue, "attempts")) if name.startswith(prefix))
+
+def is_finished(queue, shard):
+    return os.path.exists(shard_path(queue, "done", shard)) or os.path.exists(shard_path(queue, "failed", shard))
+
+def claim_shard(queue, shard, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    # The lease (a dict) if this worker now holds the shard, else None.
+    # A shard that has used up its attempts is moved to failed/ instead.
+    if is_finished(queue, shard):
+        return None
+    lease = {"shard": shard, "token": uuid.uuid4().hex, "worker": worker_name(), "expires": time.time() + lease_seconds}
+    path = shard_path(queue, "leases", shard)
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return None
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(lease, f)
+    # Finished by someone else between the check and the claim
+    if is_finished(queue, shard):
+        os.remove(path)
+        return None
+    if attempts(queue, shard) >= max_attempts:
+        write_json(shard_path(queue, "failed", shard), {"error": f"gave up after {max_attempts} attempts"})
+        os.remove(path)
+        return None
+    return lease
+
+def holds_lease(queue, lease):
+    current = read_json(shard_path(queue, "leases", lease["shard"]))
+    return current is not None and current["token"] == lease["token"]
+
+def renew_lease(queue, lease, lease_seconds=LEASE_SECONDS):
+    # False once the lease was taken away (expired and reclaimed)
+    if not holds_lease(queue, lease):
+        return False
+    lease["expires"] = time.time() + lease_seconds
+    write_json(shard_path(queue, "leases", lease["shard"]), lease)
+    return True
+
+def keep_lease(queue, lease, lease_seconds=LEASE_SECONDS):
+    # Renews the lease from a background thread until the returned event is
+    # set, so a slow shard is not mistaken for a dead worker
+    stop = threading.Event()
+    def renew():
+        while not stop.wait(lease_seconds / 3):
+            if not renew_lease(queue, lease, lease_seconds):
+                return
+    threading.Thread(target=renew, daemon=True, name=f"lease-{lease['shard']}").start()
+    return stop
+
+def release_lease(queue, lease):
+    # Gives the shard back without counting an attempt (worker stopped)
+    try:
+        if holds_lease(queue, lease):
+            os.remove(shard_path(queue, "leases", lease["shard"]))
+    except FileNotFoundError:
+        pass
+
+def drop_lease(queue, lease, reason):
+    # Gives the shard back, counting this as a failed attempt
+    if holds_lease(queue, lease):
+        write_json(os.path.join(queue, "attempts", f"{lease['shard']}.{lease['token']}"), dict(lease, error=reason))
+        release_lease(queue, lease)
+
+def reclaim_expired(queue, lease_seconds=LEASE_SECONDS, now=None):
+    # Leases whose worker stopped renewing them (crashed, killed, lost its
+    # mount) are moved to attempts/ so the shard can be claimed again. A
+    # lease file left empty by a worker that died while claiming counts as
+    # expired once it is older than lease_seconds. Returns the shards freed.
+    now = now or time.time()
+    freed = []
+    for name in sorted(os.listdir(os.path.join(queue, "leases"))):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(queue, "leases", name)
+        shard = name[:-len(".json")]
+        lease = read_json(path)
+        if lease is not None:
+            expired, token = lease["expires"] < now, lease["token"]
+        else:
+            try:
+                expired, token = os.path.getmtime(path) < now - lease_seconds, uuid.uuid4().hex
+            except FileNotFoundError:
+                continue
+        if expired:
+            try:
+                # Only one reclaimer wins the rename
+                os.replace(path, os.path.join(queue, "attempts", f"{shard}.{token}"))
+            except FileNotFoundError:
+                continue
+            freed.append(shard)
+    return freed
+
+def finish_shard(queue, lease, result):
+    # Publishes the result, then lets go of the lease
+    write_json(shard_path(queue, "done", lease["shard"]), dict(result, worker=lease["worker"]))
+    release_lease(queue, lease)
+
+def reopen_shards(queue, plan):
+    # For a rerun: shards that ran out of attempts, or finished with some
+    # files failing, are queued again with a fresh set of attempts.
+    # Returns the shards reopened.
+    reopened = []
+    for shard in plan["shards"]:
+        result = read_json(shard_path(queue, "done", shard))
+        if os.path.exists(shard_path(queue, "failed", shard)) or (result is not None and result.get("failed")):
+            for name in os.listdir(os.path.join(queue, "attempts")):
+                if name.startswith(shard + "."):
+                    os.remove(os.path.join(queue, "attempts", name))
+            for folder in ("failed", "done"):
+                if os.path.exists(shard_path(queue, folder, shard)):
+                    os.remove(shard_path(queue, folder, shard))
+            reopened.append(shard)
+    return reopened
+
+# ---- Status ----
+
+def queue_status(queue, plan):
+    status = {"done": 0, "failed": 0, "running": 0, "waiting": 0}
+    for shard in plan["shards"]:
+        if os.path.exists(shard_path(queue, "done", shard)):
+            status["done"] += 1
+        elif os.path.exists(shard_path(queue, "failed", shard)):
+            status["failed"] += 1
+        elif os.path.exists(shard_path(queue, "leases", shard)):
+            status["running"] += 1
+        else:
+            status["waiting"] += 1
+    return status
+
+def is_complete(status):
+    return not status["running"] and not status["waiting"]
+
+def shard_results(queue, plan):
+    # {shard: result} for every shard that finished
+    return {shard: read_json(shard_path(queue, "done", shard)) for shard in plan["shards"] if os.path.exists(shard_path(queue, "done", shard))}
+
+def failed_shards(queue, plan):
+    return {shard: read_json(shard_path(queue, "failed", shard)) for shard in plan["shards"] if os.path.exists(shard_path(queue, "failed", shard))}
@@ -0,0 +1,106 @@
+# SYNTH DRAWINGS
+#GENERATE SYNTHETIC ENGINEERING DRAWINGS (PPTX) FOR BENCHMARKS
+
+import io
+import os
+import random
+import struct
+import zlib
+from pptx import Presentation
+from pptx.enum.shapes import MSO_SHAPE
+from pptx.util import Emu, Pt
+
+REV_HEADERS = ["RELEASE NUMBER", "REV LTR", "REVISION DESCRIPTION", "BY", "DATE", "APPD"]
+LETTERS = "ABCDEFGHJKLMNPRTUVWY"
+
+SLIDE_W = 9144000
+SLIDE_H = 6858000
+BALLOON = 300000
+
+def noise_png(size_bytes, seed=0):
+    # Valid RGB PNG of roughly size_bytes: random pixels stored with no
+    # compression, so zip can't shrink it either (like a scanned view)
+    width = 512
+    height = max(1, size_bytes // (width * 3))
+    rnd = random.Random(seed)
+    row_bytes = width * 3
+    raw = b"".join(b"\x00" + rnd.getrandbits(8 * row_bytes).to_bytes(row_bytes, "little") for _ in range(height))
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data))
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 0)) + chunk(b"IEND", b"")
+
+def add_revision_table(shapes, rows, rnd):
+    table = shapes.add_table(rows + 1, len(REV_HEADERS), Emu(4500000), Emu(300000), Emu(4400000), Emu(250000 * (rows + 1))).table
+    for c, header in enumerate(REV_HEADERS):
+        table.cell(0, c).text = header
+    for r in range(1, rows + 1):
+        values = [f"R{rnd.randint(1000, 9999)}", LETTERS[(r - 1) % len(LETTERS)],
+                  f"CHANGE {r}: UPDATED DIMENSION {rnd.randint(1, 99)}", "ENG", f"2024-{r % 12 + 1:02d}-01", "QA"]
+        for c, value in enumerate(values):
+            table.cell(r, c).text = value
+
+def add_balloon(shapes, x, y, letter):
+    shapes.add_shape(MSO_SHAPE.OVAL, Emu(x), Emu(y), Emu(BALLOON), Emu(BALLOON))
+    text = shapes.add_textbox(Emu(x + 50000), Emu(y + 50000), Emu(BALLOON - 100000), Emu(BALLOON - 100000))
+    text.text_frame.text = letter
+
+def add_notes(shapes, count=3):
+    box = shapes.add_textbox(Emu(300000), Emu(5200000), Emu(4000000), Emu(1200000))
+    box.text_frame.text = "1. MATERIAL PER SPEC."
+    for n in range(2, count + 1):
+        para = box.text_frame.add_paragraph()
+        para.text = f"{n}. NOTE {n}."
+        para.runs[0].font.size = Pt(8)
+
+def nested_group(shapes, depth):
+    for _ in range(depth):
+        shapes = shapes.add_group_shape().shapes
+    return shapes
+
+def make_drawing(path, slides=1, shapes=50, group_depth=1, revision_rows=5, balloons=None, media_bytes=0, seed=0):
+    # One drawing: the revision table, balloons and a notes list on slide 1,
+    # filler shapes (rectangles with text, lines) on every slide. Every
+    # other balloon sits group_depth groups deep. balloons defaults to one
+    # per revision row; media_bytes > 0 embeds an incompressible picture.
+    rnd = random.Random(seed)
+    balloons = revision_rows if balloons is None else balloons
+    prs = Presentation()
+    blank = prs.slide_layouts[6]
+    for s in range(slides):
+        slide = prs.slides.add_slide(blank)
+        tree = slide.shapes
+        if s == 0:
+            add_revision_table(tree, revision_rows, rnd)
+            grouped = nested_group(tree, group_depth) if group_depth else tree
+            for b in range(balloons):
+                target = grouped if b % 2 else tree
+                x = rnd.randint(0, SLIDE_W - BALLOON)
+                y = rnd.randint(1500000, 5000000)
+                add_balloon(target, x, y, LETTERS[b % len(LETTERS)])
+            add_notes(tree)
+            if media_bytes:
+                tree.add_picture(io.BytesIO(noise_png(media_bytes, seed)), Emu(300000), Emu(300000), Emu(3000000))
+        for n in range(shapes):
+            x, y = rnd.randint(0, SLIDE_W - 600000), rnd.randint(0, SLIDE_H - 300000)
+            if n % 4 == 3:
+                tree.add_connector(1, Emu(x), Emu(y), Emu(x + 500000), Emu(y + 200000))
+            else:
+                rect = tree.add_shape(MSO_SHAPE.RECTANGLE, Emu(x), Emu(y), Emu(600000), Emu(300000))
+                rect.text_frame.text = f"DIM {rnd.randint(1, 500)}.{rnd.randint(0, 9)}"
+    prs.save(path)
+
+def make_corpus(folder, count, prefix="SYN", **params):
+    # count drawings named <prefix>-0000.pptx... with seeds 0..count-1
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"{prefix}-{i:04d}.pptx")
+        make_drawing(path, seed=i, **params)
+        paths.append(path)
+    return paths
+
+# Usage:
+if __name__ == "__main__":
+    make_corpus(r"C:\Users\SYNTH PPTS", 50, slides=2, shapes=200, group_depth=2, revision_rows=10, media_bytes=2 * 1024 * 1024)
@@ -0,0 +1,166 @@
+# WATCH FOLDER
+#NOTICE FILES LANDING IN A FOLDER (INOTIFY THROUGH WATCHDOG, OR POLLING) AND HAND THEM OVER ONCE THEY STOP CHANGING
+
+import os
+import threading
+import time
+from checkpoint import file_key
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # folder is polled instead
+    Observer = None
+
+# A file is handed over once its size and mtime have stayed the same for
+# this long, so a drawing still being copied in is never read half-written
+SETTLE_SECONDS = 2.0
+POLL_SECONDS = 5.0
+# Even with events the folder is rescanned now and then: a network share
+# delivers no inotify events for files written from other machines
+RESCAN_SECONDS = 60.0
+# A file that could not be processed is handed over again once its content
+# changes, or else after this long, doubling with each failure up to
+# RETRY_MAX_SECONDS (a copier's lock clears soon, a broken file never does)
+RETRY_SECONDS = 30.0
+RETRY_MAX_SECONDS = 3600.0
+
+def is_candidate(name, ext):
+    # Office lock files (~$...) and hidden temp files are never drawings
+    return name.lower().endswith(ext) and not name.startswith(("~$", "."))
+
+def scan_folder(folder, ext):
+    keys = {}
+    for name in os.listdir(folder):
+        if is_candidate(name, ext):
+            try:
+                keys[name] = file_key(os.path.join(folder, name))
+            except FileNotFoundError:
+                pass
+    return keys
+
+def current_key(watcher, name):
+    try:
+        return file_key(os.path.join(watcher["folder"], name))
+    except FileNotFoundError:
+        return None
+
+def new_watcher(folder, ext, known=None, use_events=True):
+    # known: {name: file_key} of files already handled (from a checkpoint);
+    # anything else found on the first scan is reported as changed
+    watcher = {
+        "folder": os.path.abspath(folder),
+        "ext": ext,
+        "known": dict(known or {}),
+        # name -> (monotonic time of the last change seen, key then)
+        "pending": {},
+        "lock": threading.Lock(),
+        "wake": threading.Event(),
+        "observer": None,
+        "last_scan": None,
+        # name -> (failures in a row, key then, monotonic time of next try)
+        "retries": {},
+    }
+    if use_events and Observer is not None:
+        watcher["observer"] = start_observer(watcher)
+    return watcher
+
+def mark(watcher, name):
+    key = current_key(watcher, name)
+    with watcher["lock"]:
+        watcher["pending"][name] = (time.monotonic(), key)
+    watcher["wake"].set()
+
+def start_observer(watcher):
+    def on_event(event):
+        for path in (event.src_path, getattr(event, "dest_path", None)):
+            if not path:
+                continue
+            path = os.fsdecode(path)
+            name = os.path.basename(path)
+            if os.path.dirname(os.path.abspath(path)) == watcher["folder"] and is_candidate(name, watcher["ext"]):
+                mark(watcher, name)
+    handler = FileSystemEventHandler()
+    handler.on_any_event = on_event
+    observer = Observer()
+    observer.schedule(handler, watcher["folder"], recursive=False)
+    observer.start()
+    return observer
+
+def stop_watcher(watcher):
+    if watcher["observer"] is not None:
+        watcher["observer"].stop()
+        watcher["observer"].join()
+
+def rescan(watcher):
+    # Marks every file whose key differs from what was handed over last
+    # (or whose retry is due)
+    current = scan_folder(watcher["folder"], watcher["ext"])
+    now = time.monotonic()
+    with watcher["lock"]:
+        pending = set(watcher["pending"])
+        for name, (_, _, retry_at) in watcher["retries"].items():
+            if retry_at <= now and name not in pending:
+                watcher["known"].pop(name, None)
+        known = dict(watcher["known"])
+    for name in set(current) | set(known):
+        if name not in pending and current.get(name) != known.get(name):
+            mark(watcher, name)
+    watcher["last_scan"] = now
+
+def rescan_due(watcher, poll=POLL_SECONDS):
+    interval = RESCAN_SECONDS if watcher["observer"] is not None else poll
+    return watcher["last_scan"] is None or time.monotonic() - watcher["last_scan"] >= interval
+
+def take_settled(watcher, settle=SETTLE_SECONDS):
+    # (changed names, removed names) among the pending files that have not
+    # changed for settle seconds. A file whose size or mtime moved since it
+    # was marked starts its wait again.
+    now = time.monotonic()
+    with watcher["lock"]:
+        due = [(name, entry) for name, entry in watcher["pending"].items() if now - entry[0] >= settle]
+    changed = []
+    removed = []
+    for name, entry in due:
+        key = entry[1]
+        latest = current_key(watcher, name)
+        with watcher["lock"]:
+            if watcher["pending"].get(name) != entry:
+                # Marked again meanwhile
+                continue
+            if latest != key:
+                watcher["pending"][name] = (now, latest)
+                continue
+            del watcher["pending"][name]
+            if latest is None:
+                watcher["retries"].pop(name, None)
+                if watcher["known"].pop(name, None) is not None:
+                    removed.append(name)
+            elif latest != watcher["known"].get(name):
+                watcher["known"][name] = latest
+                changed.append(name)
+    return sorted(changed), sorted(removed)
+
+def retry_later(watcher, name):
+    # For a file that could not be processed (e.g. still locked by the
+    # copier): a rescan hands it over again once it changes or its retry is
+    # due. take_settled has already recorded its key as handled.
+    with watcher["lock"]:
+        key = watcher["known"].get(name)
+        count, failed_key, _ = watcher["retries"].get(name, (0, None, None))
+        count = count + 1 if failed_key == key else 1
+        delay = min(RETRY_MAX_SECONDS, RETRY_SECONDS * 2 ** (count - 1))
+        watcher["retries"][name] = (count, key, time.monotonic() + delay)
+
+def processed(watcher, name):
+    with watcher["lock"]:
+        watcher["retries"].pop(name, None)
+
+def has_pending(watcher):
+    with watcher["lock"]:
+        return bool(watcher["pending"])
+
+def wait(watcher, timeout):
+    # Until an event arrives or timeout seconds pass
+    watcher["wake"].wait(timeout)
+    watcher["wake"].clear()
@@ -0,0 +1,87 @@
+# WORKBOOK IO
+#STREAMING READ/WRITE OF THE ONE-SHEET-PER-DRAWING REVISION WORKBOOK
+
+from openpyxl import Workbook, load_workbook
+from shape_locator import decode_locator, encode_locator
+
+REV_HEADERS = ["RELEASE NUMBER", "REV LTR", "REVISION DESCRIPTION", "BY", "DATE", "APPD"]
+WORKBOOK_COLUMNS = REV_HEADERS + ["Balloon Text"]
+# Hidden sheet with one "Drawing | Locator" row per drawing
+LOCATOR_SHEET = "_locators"
+
+def write_revision_workbook(per_drawing, excel_target, locators=None):
+    # per_drawing maps drawing name -> rows in WORKBOOK_COLUMNS order.
+    # Write-only mode streams each row to the sheet XML instead of keeping
+    # a cell object for every value.
+    wb = Workbook(write_only=True)
+    for name, sheet_rows in per_drawing.items():
+        # Sheet name max 31 chars
+        ws = wb.create_sheet(title=str(name)[:31])
+        ws.append(WORKBOOK_COLUMNS)
+        for row in sheet_rows:
+            ws.append(row)
+    if locators:
+        ws = wb.create_sheet(title=LOCATOR_SHEET)
+        ws.sheet_state = "hidden"
+        ws.append(["Drawing", "Locator"])
+        for name, locator in locators.items():
+            ws.append([name, encode_locator(locator)])
+    wb.save(excel_target)
+
+def read_revision_workbook(excel_source, locators=None):
+    # One read-only pass over every sheet -> {sheet name: rows}. Rows come
+    # back in WORKBOOK_COLUMNS order whatever the column order in the sheet,
+    # empty cells are None and fully empty rows are dropped (like
+    # pd.read_excel + dropna(how='all')). A sheet lacking some of the
+    # columns (a renamed header) maps to a ValueError naming them instead of
+    # rows; revision_edits raises it, so that drawing is reported as failed
+    # rather than edited with a blank column. A sheet with none of them has
+    # no rows. If a locators dict is given it is filled from the hidden
+    # locator sheet.
+    wb = load_workbook(excel_source, read_only=True, data_only=True)
+    per_drawing = {}
+    try:
+        for ws in wb.worksheets:
+            if ws.title == LOCATOR_SHEET:
+                if locators is not None:
+                    for values in ws.iter_rows(min_row=2, max_col=2, values_only=True):
+                        locator = decode_locator(values[1]) if len(values) > 1 else None
+                        if values[0] is not None and locator:
+                            locators[str(values[0])] = locator
+                continue
+            rows = ws.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                per_drawing[ws.title] = []
+                continue
+            positions = {str(h).strip(): i for i, h in enumerate(header) if h is not None}
+            columns = [positions.get(c) for c in WORKBOOK_COLUMNS]
+            missing = [c for c, i in zip(WORKBOOK_COLUMNS, columns) if i is None]
+            if missing and len(missing) < len(WORKBOOK_COLUMNS):
+                per_drawing[ws.title] = ValueError(f"Sheet '{ws.title}' has no {', '.join(repr(c) for c in missing)} column")
+                continue
+            sheet_rows = []
+            for values in rows:
+                row = [blank_to_none(values[i]) if i is not None and i < len(values) else None for i in columns]
+                if any(v is not None for v in row):
+                    sheet_rows.append(row)
+            per_drawing[ws.title] = sheet_rows
+    finally:
+        wb.close()
+    return per_drawing
+
+def blank_to_none(value):
+    # pandas reads empty strings as NaN; keep that behaviour
+    if isinstance(value, str) and value == "":
+        return None
+    return value
+
+def revision_edits(sheet_rows):
+    # Split workbook rows into the table rows and the balloon letter Step 2
+    # applies: the last non-empty "Balloon Text" value, as a string
+    if isinstance(sheet_rows, ValueError):
+        raise sheet_rows
+    revision_data = [row[:len(REV_HEADERS)] for row in sheet_rows]
+    balloon_values = [row[len(REV_HEADERS)] for row in sheet_rows if row[len(REV_HEADERS)] is not None]
+    balloon_letter = str(balloon_values[-1]) if balloon_values else ""
+    return revision_data, balloon_letter